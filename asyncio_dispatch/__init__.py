@@ -1 +1,6 @@
-from .dispatcher import Signal  # NOQA
+from .dispatcher import Signal, Delivery, SignalFull  # NOQA
+from .executors import ThreadPool, ProcessPool  # NOQA
+from .sharded import ShardedSignal  # NOQA
+from .bridge import UnixBus, TcpBridge  # NOQA
+from .shm import RingPublisher, RingSubscriber  # NOQA
+from .exporter import SignalRegistry, MetricsServer  # NOQA
@@ -0,0 +1,459 @@
+'''
+Bridges that carry the events of a :class:`asyncio_dispatch.Signal` to other processes
+
+Bridges form a star: one bridge serves, the others connect to it. The serving bridge relays
+events between the bridges connected to it, so every process sees the events sent in every
+other process.
+
+Every bridge tells its peers which keys its process has callbacks connected to and whether any
+callback is connected without filters. An event is only sent to a peer that has a callback for
+one of its keys, or a callback without filters. ``senders`` identify objects in the memory of
+one process, so they are not carried: a remote event reaches the callbacks connected to its
+``keys`` and the callbacks connected without filters.
+
+Messages queued for a peer are written as one frame when the event loop gets to run again,
+or after ``flush_interval`` seconds, whichever the bridge is configured for, and as soon as
+``max_batch`` messages are queued. Events for a peer whose write buffer holds more than
+``max_buffer`` bytes are dropped and counted; :meth:`asyncio_dispatch.bridge.Bridge.drain`
+waits for the buffers to empty.
+
+Messages are pickled one by one as they are queued. A message that can not be pickled is
+dropped, counted and passed to the exception handler of the loop, the other messages of the
+frame are still sent. Frames larger than ``max_frame`` bytes are refused before they are
+read, and messages that would not fit in one are dropped.
+
+Unpickling runs code chosen by the peer, so only connect bridges of processes that trust each
+other. A :class:`asyncio_dispatch.bridge.TcpBridge` only accepts peers that prove they know its
+shared secret, before it reads any frame from them.
+'''
+import asyncio
+import hashlib
+import hmac
+import os
+import pickle
+import struct
+
+
+_HEADER = struct.Struct('!I')
+
+# the handshake of a TcpBridge: a magic value and a nonce, then the HMAC of the nonce of the peer
+_MAGIC = b'ADB1'
+_NONCE_SIZE = 32
+
+_INTEREST = 0
+_EVENT = 1
+
+
+class _Link:
+    # One connection to a peer bridge. Messages queued during an iteration of the event loop
+    # are written as a single length prefixed frame.
+
+    def __init__(self, bridge, reader, writer):
+        self.bridge = bridge
+        self.reader = reader
+        self.writer = writer
+        self.all = False
+        self.keys = frozenset()
+        self.advertised = None
+        self.frames_sent = 0
+        self.messages_sent = 0
+        self.dropped = 0
+        self._pending = []
+        self._pending_size = 0
+        self._flush_handle = None
+        # drain() returns once the buffer is below max_buffer
+        writer.transport.set_write_buffer_limits(high=bridge.max_buffer)
+
+    def wants(self, keys):
+        return self.all or not self.keys.isdisjoint(keys)
+
+    def forward(self, message):
+        # events are dropped while the peer does not keep up, interest is always sent
+        if self.writer.transport.get_write_buffer_size() > self.bridge.max_buffer:
+            self.dropped += 1
+        else:
+            self.send(message)
+
+    def advertise(self, interest):
+        if interest != self.advertised:
+            self.advertised = interest
+            self.send((_INTEREST,) + interest)
+
+    def send(self, message):
+        try:
+            data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        except Exception as exc:
+            self.dropped += 1
+            self.bridge._loop.call_exception_handler({
+                'message': 'Bridge message could not be pickled',
+                'exception': exc,
+            })
+            return
+
+        size = _HEADER.size + len(data)
+        if size > self.bridge.max_frame:
+            self.dropped += 1
+            self.bridge._loop.call_exception_handler({
+                'message': 'Bridge message of {} bytes exceeds max_frame'.format(len(data)),
+            })
+            return
+        if self._pending_size + size > self.bridge.max_frame:
+            self.flush()
+
+        self._pending.append(_HEADER.pack(len(data)) + data)
+        self._pending_size += size
+        if len(self._pending) >= self.bridge.max_batch:
+            self.flush()
+        elif self._flush_handle is None:
+            if self.bridge.flush_interval:
+                self._flush_handle = self.bridge._loop.call_later(self.bridge.flush_interval,
+                                                                  self.flush)
+            else:
+                self._flush_handle = self.bridge._loop.call_soon(self.flush)
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending or self.writer.is_closing():
+            return
+
+        # a frame is a sequence of length prefixed messages
+        messages, self._pending = self._pending, []
+        self._pending_size = 0
+        frame = b''.join(messages)
+        self.writer.write(_HEADER.pack(len(frame)) + frame)
+        self.frames_sent += 1
+        self.messages_sent += len(messages)
+
+    async def run(self):
+        try:
+            while True:
+                header = await self.reader.readexactly(_HEADER.size)
+                size, = _HEADER.unpack(header)
+                if size > self.bridge.max_frame:
+                    raise ValueError('Frame of {} bytes exceeds max_frame'.format(size))
+                frame = await self.reader.readexactly(size)
+                offset = 0
+                while offset < len(frame):
+                    length, = _HEADER.unpack_from(frame, offset)
+                    offset += _HEADER.size
+                    message = pickle.loads(frame[offset:offset + length])
+                    offset += length
+                    self.bridge._on_message(self, message)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # the peer went away
+            pass
+        except Exception as exc:
+            self.bridge._loop.call_exception_handler({
+                'message': 'Bridge link failed',
+                'exception': exc,
+            })
+        finally:
+            self.close()
+            self.bridge._on_link_closed(self)
+
+    def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self.writer.close()
+
+
+class Bridge:
+    '''
+    The transport independent part of a bridge. Use one of its subclasses, such as
+    :class:`asyncio_dispatch.bridge.UnixBus`.
+    '''
+
+    def __init__(self, signal, flush_interval=0, max_batch=1024, max_buffer=1 << 20,
+                 max_frame=16 << 20):
+        '''
+        :param asyncio_dispatch.Signal signal: the signal whose events are bridged. Events sent
+            with it are forwarded to peers and events received from peers are dispatched to
+            its callbacks.
+        :param float flush_interval: the number of seconds messages are held back to be written
+            together. ``0`` writes them when the event loop gets to run again.
+        :param int max_batch: the number of queued messages that are written right away
+        :param int max_buffer: the number of bytes the write buffer of a peer may hold before
+            events for it are dropped
+        :param int max_frame: the largest frame in bytes that is sent or accepted. A peer that
+            sends a larger one is disconnected.
+        '''
+        self.signal = signal
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_buffer = max_buffer
+        self.max_frame = max_frame
+        self.rejected = 0
+        self._loop = signal._loop
+        self._links = []
+        self._servers = []
+        self._tasks = set()
+        self._closed = False
+        signal.add_tap(self._on_send)
+        signal.add_listener(self._on_change)
+
+    @property
+    def peers(self):
+        '''
+        The number of connected peer bridges
+        '''
+        return len(self._links)
+
+    @property
+    def dropped(self):
+        '''
+        The number of events that were not forwarded to connected peers because their write
+        buffers were full
+        '''
+        return sum(link.dropped for link in self._links)
+
+    async def drain(self):
+        '''
+        *This method is a coroutine.*
+
+        Waits until the write buffers of all peers are below ``max_buffer``. Producers can call
+        it between sends to slow down to the pace of the slowest peer instead of having events
+        dropped.
+        '''
+        for link in list(self._links):
+            link.flush()
+            try:
+                await link.writer.drain()
+            except ConnectionError:
+                pass
+
+    async def close(self):
+        '''
+        *This method is a coroutine.*
+
+        Stops serving, disconnects from all peers and detaches from the signal.
+        '''
+        if self._closed:
+            return
+        self._closed = True
+        self.signal.remove_tap(self._on_send)
+        self.signal.remove_listener(self._on_change)
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        for link in list(self._links):
+            link.flush()
+            link.close()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _add_link(self, reader, writer):
+        link = _Link(self, reader, writer)
+        self._links.append(link)
+        link.advertise(self._interest_for(link))
+        return link
+
+    def _run_link(self, link):
+        task = self._loop.create_task(link.run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _serve_link(self, reader, writer):
+        try:
+            await self._authenticate(reader, writer, True)
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError):
+            # asyncio.IncompleteReadError is an EOFError
+            self.rejected += 1
+            writer.close()
+            return
+        await self._run_link(self._add_link(reader, writer))
+
+    async def _authenticate(self, reader, writer, server_side):
+        # raises unless the peer may send frames, see TcpBridge
+        pass
+
+    def _interest_for(self, link):
+        # what a peer has to send to us: our own interest and that of the other peers we relay to
+        all_, keys = self.signal.interest()
+        for other in self._links:
+            if other is not link:
+                all_ = all_ or other.all
+                keys = keys | other.keys
+        return all_, keys
+
+    def _advertise(self, exclude=None):
+        for link in self._links:
+            if link is not exclude:
+                link.advertise(self._interest_for(link))
+
+    def _on_change(self, signal):
+        self._advertise()
+
+    def _on_send(self, senders, keys, kwargs):
+        for link in self._links:
+            if link.wants(keys):
+                link.forward((_EVENT, keys, kwargs))
+
+    def _on_message(self, link, message):
+        if message[0] == _INTEREST:
+            link.all, link.keys = message[1], message[2]
+            self._advertise(exclude=link)
+            return
+
+        keys = message[1]
+        self.signal._receive(keys, message[2])
+        for other in self._links:
+            if other is not link and other.wants(keys):
+                other.forward(message)
+
+    def _on_link_closed(self, link):
+        if link in self._links:
+            self._links.remove(link)
+            self._advertise()
+
+
+class UnixBus(Bridge):
+    '''
+    Bridges a :class:`asyncio_dispatch.Signal` across the processes of one machine over Unix
+    domain sockets. One process calls :meth:`asyncio_dispatch.bridge.UnixBus.serve`, the others
+    :meth:`asyncio_dispatch.bridge.UnixBus.connect` with the same path.
+    '''
+
+    def __init__(self, signal, **kwargs):
+        super().__init__(signal, **kwargs)
+        self._paths = []
+
+    async def serve(self, path):
+        '''
+        *This method is a coroutine.*
+
+        Accepts peer bridges on the Unix socket ``path``.
+        '''
+        self._servers.append(await asyncio.start_unix_server(self._serve_link, path=path))
+        self._paths.append(path)
+
+    async def connect(self, path):
+        '''
+        *This method is a coroutine.*
+
+        Connects to the bridge serving on the Unix socket ``path``.
+        '''
+        reader, writer = await asyncio.open_unix_connection(path)
+        self._run_link(self._add_link(reader, writer))
+
+    async def close(self):
+        await super().close()
+        for path in self._paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self._paths = []
+
+
+class TcpBridge(Bridge):
+    '''
+    Bridges a :class:`asyncio_dispatch.Signal` across hosts over TCP. One process calls
+    :meth:`asyncio_dispatch.bridge.TcpBridge.serve`, the others
+    :meth:`asyncio_dispatch.bridge.TcpBridge.connect`. A connecting bridge reconnects when the
+    connection is lost and sends its interest again, so the serving bridge does not have to keep
+    any state for it in the meantime.
+
+    Both ends of a connection prove that they know the same ``secret`` with an HMAC challenge
+    response before any frame is exchanged. Connections that fail to do so within
+    ``handshake_timeout`` seconds are closed and counted in ``rejected``. The secret does not
+    encrypt the traffic, use a private network or a tunnel between hosts.
+    '''
+
+    def __init__(self, signal, secret, retry_interval=1.0, handshake_timeout=10.0, **kwargs):
+        '''
+        :param asyncio_dispatch.Signal signal: see :class:`asyncio_dispatch.bridge.Bridge`
+        :param bytes secret: the secret shared by all bridges of the star. A :class:`str` is
+            encoded as UTF-8.
+        :param float retry_interval: the number of seconds between attempts to reconnect
+        :param float handshake_timeout: the number of seconds a peer has to authenticate
+        :param kwargs: ``flush_interval``, ``max_batch``, ``max_buffer`` and ``max_frame``, see
+            :class:`asyncio_dispatch.bridge.Bridge`
+        '''
+        if isinstance(secret, str):
+            secret = secret.encode('utf-8')
+        if not secret:
+            raise ValueError('TcpBridge requires a secret')
+        super().__init__(signal, **kwargs)
+        self.retry_interval = retry_interval
+        self.handshake_timeout = handshake_timeout
+        self.reconnects = 0
+        self._secret = secret
+        self._clients = set()
+
+    async def serve(self, host='127.0.0.1', port=0):
+        '''
+        *This method is a coroutine.*
+
+        Accepts peer bridges on ``host`` and ``port``. Only the loopback interface is served
+        unless another ``host`` is passed, ``None`` serves all interfaces.
+
+        :Returns: the addresses the bridge listens on, which tells the port if ``0`` was passed
+        '''
+        server = await asyncio.start_server(self._serve_link, host=host, port=port)
+        self._servers.append(server)
+        return [sock.getsockname() for sock in server.sockets]
+
+    async def connect(self, host, port):
+        '''
+        *This method is a coroutine.*
+
+        Connects to the bridge serving on ``host`` and ``port``. Errors of the first attempt,
+        including a failed handshake, are raised, after that the bridge keeps reconnecting until
+        it is closed.
+        '''
+        reader, writer = await self._open(host, port)
+        task = self._loop.create_task(self._keep_connected(host, port, reader, writer))
+        self._clients.add(task)
+        task.add_done_callback(self._clients.discard)
+
+    async def close(self):
+        for task in list(self._clients):
+            task.cancel()
+        if self._clients:
+            await asyncio.gather(*self._clients, return_exceptions=True)
+        await super().close()
+
+    async def _open(self, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            await self._authenticate(reader, writer, False)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def _authenticate(self, reader, writer, server_side):
+        await asyncio.wait_for(self._handshake(reader, writer, server_side),
+                               self.handshake_timeout)
+
+    async def _handshake(self, reader, writer, server_side):
+        # the roles are part of the digests, so a peer can not reflect our challenge back to us
+        ours, theirs = (b'server', b'client') if server_side else (b'client', b'server')
+        nonce = os.urandom(_NONCE_SIZE)
+        writer.write(_MAGIC + nonce)
+        hello = await reader.readexactly(len(_MAGIC) + _NONCE_SIZE)
+        if hello[:len(_MAGIC)] != _MAGIC:
+            raise ValueError('Peer is not a TcpBridge')
+
+        writer.write(hmac.new(self._secret, ours + hello[len(_MAGIC):], hashlib.sha256).digest())
+        expected = hmac.new(self._secret, theirs + nonce, hashlib.sha256).digest()
+        if not hmac.compare_digest(await reader.readexactly(len(expected)), expected):
+            raise ValueError('Peer does not know the secret')
+
+    async def _keep_connected(self, host, port, reader, writer):
+        while True:
+            # a new link advertises the current interest, which resyncs the peer
+            await self._add_link(reader, writer).run()
+            while True:
+                await asyncio.sleep(self.retry_interval)
+                try:
+                    reader, writer = await self._open(host, port)
+                except (OSError, EOFError, ValueError, asyncio.TimeoutError):
+                    continue
+                self.reconnects += 1
+                break
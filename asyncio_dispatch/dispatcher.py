@@ -2,17 +2,162 @@
 A Signal dispatcher for :mod:`asyncio`
 '''
 import asyncio
+import collections
 import weakref
 import functools
-import sys
+import heapq
+import itertools
+import pickle
+import threading
 
+from .executors import ProcessPool
+from .filters import Filter, FilterIndex
+from .metrics import SignalMetrics
+from .topics import TopicTrie
 
-# python 3.4 compat
-if sys.version_info < (3, 5):  # pragma: no cover
-    def iscoroutinefunction(func):
-        return hasattr(func, '_is_coroutine') and (func._is_coroutine is True)
-else:  # pragma: no cover
-    iscoroutinefunction = asyncio.iscoroutinefunction
+
+iscoroutinefunction = asyncio.iscoroutinefunction
+
+_EMPTY = ()
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+OVERFLOW_POLICIES = ('wait', 'drop', 'raise')
+
+
+class SignalFull(Exception):
+    '''
+    Raised when a send would exceed the ``max_in_flight`` limit of a
+    :class:`asyncio_dispatch.Signal` or of one of its callbacks.
+    '''
+
+
+class _Rate:
+    '''
+    The debounce or throttle state of a receiver. ``pending`` holds the arguments of the
+    latest event that has not been delivered yet.
+    '''
+    __slots__ = ('debounce', 'interval', 'leading', 'trailing', 'pending', 'deadline', 'armed')
+
+    def __init__(self, debounce, interval, leading, trailing):
+        self.debounce = debounce
+        self.interval = interval
+        self.leading = leading
+        self.trailing = trailing
+        self.pending = None
+        self.deadline = None
+        self.armed = False
+
+
+class _Receiver:
+    '''
+    A connected callback and a reverse index of every subscription it holds, so it can be
+    removed from the registry without searching it.
+    '''
+    __slots__ = ('ref', 'weak', 'coroutine', 'all', 'sender_ids', 'keys', 'patterns',
+                 'max_in_flight',
+                 'in_flight', 'executor', 'bounded', 'remote', 'rate', 'coalesced', 'deferred',
+                 'priority', 'inline', 'where')
+
+    def __init__(self, ref, weak, coroutine):
+        self.ref = ref
+        self.weak = weak
+        self.coroutine = coroutine
+        self.all = False
+        self.sender_ids = set()
+        self.keys = set()
+        self.patterns = set()
+        self.max_in_flight = None
+        self.in_flight = 0
+        self.executor = None
+        self.bounded = False
+        self.remote = False
+        self.rate = None
+        self.coalesced = None
+        # debounced, throttled and coalesced receivers bypass the regular scheduling
+        self.deferred = False
+        self.priority = 0
+        self.inline = False
+        self.where = None
+
+    def set_executor(self, executor):
+        self.executor = executor
+        self.bounded = getattr(executor, 'max_queue', None) is not None
+        self.remote = isinstance(executor, ProcessPool)
+
+    def is_connected(self):
+        return self.all or bool(self.sender_ids) or bool(self.keys) or bool(self.patterns)
+
+
+class Delivery:
+    '''
+    A handle on the callbacks scheduled by :meth:`asyncio_dispatch.Signal.deliver`.
+
+    Awaiting the handle waits for every callback to finish and returns their results, the same
+    as awaiting :meth:`asyncio_dispatch.Delivery.wait` without a timeout.
+    '''
+
+    def __init__(self, callbacks, futures):
+        self.callbacks = tuple(callbacks)
+        self._futures = tuple(futures)
+
+    def __len__(self):
+        return len(self._futures)
+
+    def __await__(self):
+        return self.wait().__await__()
+
+    def done(self):
+        '''
+        :Returns: ``True`` once every callback has finished or was cancelled
+        '''
+        return all(future.done() for future in self._futures)
+
+    async def wait(self, timeout=None, cancel=True):
+        '''
+        *This method is a coroutine.*
+
+        Waits for every callback to finish.
+
+        :param float timeout: the maximum number of seconds to wait. ``None`` waits forever.
+        :param bool cancel: if ``True``, callbacks that are still outstanding when the timeout
+            expires are cancelled.
+        :raises asyncio.TimeoutError: if the callbacks did not finish in time
+        :Returns: see :meth:`asyncio_dispatch.Delivery.results`
+        '''
+        if self._futures:
+            done, pending = await asyncio.wait(self._futures, timeout=timeout)
+            if pending:
+                if cancel:
+                    self.cancel()
+                raise asyncio.TimeoutError()
+        return self.results()
+
+    def results(self):
+        '''
+        :raises asyncio.InvalidStateError: if a callback has not finished yet
+        :Returns: a list with the return value of each callback in the order of
+            :attr:`callbacks`. A callback that raised is represented by its exception, and a
+            cancelled callback by an :exc:`asyncio.CancelledError`.
+        '''
+        results = []
+        for future in self._futures:
+            if future.cancelled():
+                results.append(asyncio.CancelledError())
+            elif future.exception() is not None:
+                results.append(future.exception())
+            else:
+                results.append(future.result())
+        return results
+
+    def cancel(self):
+        '''
+        Cancels every callback that has not finished yet. Synchronous callbacks that have not
+        started are skipped, coroutines are cancelled like any other :class:`asyncio.Task`.
+
+        :Returns: the number of callbacks that were cancelled
+        '''
+        return sum(1 for future in self._futures if future.cancel())
 
 
 class Signal:
@@ -21,13 +166,48 @@ class Signal:
     :meth:`asyncio_dispatch.Signal.connect`. Those callbacks can then be scheduled to run
     in the eventloop with :meth:`asyncio_dispatch.Signal.send()`.
     To disconnect a callback from the signal use :meth:`asyncio_dispatch.Signal.disconnect()`
+
+    The registry of connected callbacks is copy-on-write: ``_all`` and every entry of
+    ``_by_senders`` and ``_by_keys`` is a :class:`tuple` of receivers that is replaced, never
+    mutated. A send therefore reads a consistent snapshot without taking any locks. Each receiver
+    also records the senders and keys it is connected to, so disconnecting it only touches
+    those entries. The tuples, like the receivers of every topic pattern, are kept in order of
+    priority when they are built, so resolving a send merges them and never sorts.
+
+    Weakly referenced callbacks are removed from the registry by a weak reference callback as
+    soon as they are garbage collected, so resolving the callbacks of a send never has to
+    write to the registry.
+
+    The callbacks resolved for a combination of ``senders`` and ``keys`` are memoized in a
+    least recently used cache. Every change to the registry increments a generation counter,
+    which invalidates all cached resolutions at once.
     '''
-    restricted_keywords = ('callback', 'sender', 'senders', 'key', 'keys', 'weak')
+    restricted_keywords = ('callback', 'sender', 'senders', 'key', 'keys', 'weak',
+                           'max_in_flight', 'executor', 'debounce', 'throttle', 'leading',
+                           'trailing', 'coalesce', 'priority', 'inline', 'pattern', 'patterns',
+                           'where')
 
-    def __init__(self, loop=None, **kwargs):
+    def __init__(self, loop=None, cache_size=128, max_in_flight=None, overflow='wait',
+                 executor=None, metrics=False, **kwargs):
         '''
         :param asyncio.BaseEventLoop loop: the event loop to schedule callbacks to run on.
             If ``None``, the return value of ``asyncio.get_event_loop()`` is used.
+        :param int cache_size: the number of distinct ``senders`` and ``keys`` combinations whose
+            resolved callbacks are cached. ``0`` disables the cache.
+        :param int max_in_flight: the maximum number of scheduled callbacks that may not have
+            finished yet. ``None`` means unlimited.
+        :param str overflow: what a send does when a ``max_in_flight`` limit, of the signal or
+            of a callback, is reached. ``'wait'`` suspends
+            :meth:`asyncio_dispatch.Signal.send` until there is room, ``'drop'`` skips the
+            callbacks that are at their limit and ``'raise'`` raises
+            :exc:`asyncio_dispatch.SignalFull` without scheduling anything. Methods that can
+            not suspend raise :exc:`asyncio_dispatch.SignalFull` under ``'wait'``.
+        :param concurrent.futures.Executor executor: the executor synchronous callbacks are run
+            in by default. If ``None``, they run on the event loop. The queue of an
+            :class:`asyncio_dispatch.ThreadPool` counts as a limit for ``overflow``.
+        :param int metrics: collect dispatch metrics, see
+            :attr:`asyncio_dispatch.Signal.metrics`. ``True`` times every callback, an integer
+            ``n`` times one callback out of ``n``.
         :param dict kwargs: Keyword arguments and their default values. Any connected signal will
             be called with these kwargs. The value of the keyword arguments can be changed when
             calling :meth:`asyncio_dispatch.Signal.send`, but keywords themselves can not be
@@ -36,6 +216,10 @@ class Signal:
         for key in self.restricted_keywords:
             if key in kwargs:
                 raise ValueError('Keyword "{}" is restricted'.format(key))
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError('max_in_flight must be at least 1')
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('overflow must be one of {}'.format(OVERFLOW_POLICIES))
 
         if loop is None:
             self._loop = asyncio.get_event_loop()
@@ -44,15 +228,45 @@ class Signal:
         self._default_kwargs = kwargs
         self._by_senders = {}
         self._by_keys = {}
-        self._all = set()
-        self._locks_senders = {}
-        self._locks_keys = {}
-        self._lock_all = asyncio.Lock()
-        self._lock_by_senders = asyncio.Lock()
-        self._lock_by_keys = asyncio.Lock()
+        self._topics = TopicTrie(key=_by_priority)
+        self._filters = FilterIndex()
+        self._all = _EMPTY
+        self._receivers = {}
+        self._generation = 0
+        self._cache_size = cache_size
+        self._plans = collections.OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._dead = collections.deque()
+        self._prune_scheduled = False
+        self._on_dead = _make_dead_callback(self)
+        self._max_in_flight = max_in_flight
+        self._overflow = overflow
+        self._in_flight = 0
+        self._dropped = 0
+        self._capacity_waiters = []
+        # Tasks are only weakly referenced by the loop, keep them alive until they finish
+        self._tasks = set()
+        self._executor = executor
+        # events queued by send_threadsafe() until the loop drains them
+        self._threadsafe_lock = threading.Lock()
+        self._threadsafe_events = []
+        self._drain_scheduled = False
+        self._taps = []
+        self._listeners = []
+        self._notify_scheduled = False
+        # a single loop timer serves the debounced and throttled receivers of the signal
+        self._timers = []
+        self._timer_handle = None
+        self._timer_counter = itertools.count()
+        # set once a callback is connected with a priority, sends keep their order from then on
+        self._prioritized = False
+        self._metrics = SignalMetrics(self, int(metrics)) if metrics else None
 
-    @asyncio.coroutine
-    def connect(self, callback, sender=None, senders=None, key=None, keys=None, weak=True):
+    async def connect(self, callback, sender=None, senders=None, key=None, keys=None, weak=True,
+                      max_in_flight=None, executor=None, debounce=None, throttle=None,
+                      leading=None, trailing=True, coalesce=False, priority=0, inline=False,
+                      pattern=None, patterns=None, where=None):
         '''
         *This method is a coroutine.*
 
@@ -78,81 +292,294 @@ class Signal:
             ``keys``.
         :param weak: If ``True``, the callback will be stored as a weakreference. If a long-lived
             reference is required, use ``False``.
+        :param str pattern: A topic pattern, see :mod:`asyncio_dispatch.topics`. Connects the
+            callback against every string ``key`` the pattern matches, such as
+            ``'orders.eu.*'``.
+        :param list patterns: An iterable of topic patterns.
+        :param int max_in_flight: the maximum number of scheduled calls of this callback that
+            may not have finished yet. The ``overflow`` policy of the signal applies when it
+            is reached.
+        :param concurrent.futures.Executor executor: run this synchronous callback in
+            ``executor`` instead of the executor of the signal. Callbacks run in an
+            :class:`asyncio_dispatch.ProcessPool` must be picklable.
+        :param float debounce: deliver only once the signal has been quiet for this callback for
+            ``debounce`` seconds, with the arguments of the latest send.
+        :param float throttle: deliver at most once every ``throttle`` seconds. Sends in between
+            are collapsed into the latest one.
+        :param bool leading: deliver the first send of a burst right away. Defaults to ``True``
+            for ``throttle`` and ``False`` for ``debounce``.
+        :param bool trailing: deliver the latest send of a burst once the burst is over.
+        :param bool coalesce: keep at most one pending delivery per combination of ``keys`` of
+            the sends. A send that finds one pending replaces its arguments, so the callback
+            only ever sees the latest value of each key and calls for the same keys never run
+            concurrently. Coalesced callbacks are not subject to ``max_in_flight``, they are
+            bounded by the number of distinct keys.
+        :param int priority: callbacks with a higher priority are scheduled before those with a
+            lower one. The registry keeps callbacks in order of priority as they are connected
+            and a send merges the ordered callbacks of its ``senders`` and ``keys``, so sends
+            do not sort.
+        :param bool inline: call this synchronous callback right away, from within the send,
+            before any callback of a lower priority is scheduled. Exceptions it raises are
+            passed to the exception handler of the loop.
+        :param dict where: only schedule the callback for sends whose keyword arguments meet
+            these conditions, such as ``{'symbol': {'AAPL', 'MSFT'}, 'qty': ('>', 100)}``. See
+            :mod:`asyncio_dispatch.filters`. Replaces the conditions the callback had.
+
+        Debounced, throttled and coalesced deliveries are not tracked by
+        :meth:`asyncio_dispatch.Signal.deliver`.
         '''
-        weak_callback = yield from self._get_ref(callback, weak)
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError('max_in_flight must be at least 1')
+        if debounce is not None and throttle is not None:
+            raise ValueError('A callback can not be both debounced and throttled')
+        interval = debounce if debounce is not None else throttle
+        if interval is not None and interval <= 0:
+            raise ValueError('debounce and throttle must be greater than 0')
+        if coalesce and interval is not None:
+            raise ValueError('A callback can not be coalesced and debounced or throttled')
+        if inline and (iscoroutinefunction(callback) or executor is not None or coalesce or
+                       interval is not None):
+            raise ValueError('Only synchronous callbacks that run on the loop can be inline')
+        if executor is not None and iscoroutinefunction(callback):
+            raise ValueError('Coroutine callbacks can not be run in an executor')
+        if isinstance(executor or self._executor, ProcessPool) \
+                and not iscoroutinefunction(callback):
+            try:
+                pickle.dumps(callback)
+            except Exception:
+                raise ValueError('{!r} can not be pickled to run in a process pool'.format(
+                    callback))
+        if where is not None:
+            where = Filter(where, self._default_kwargs)
+        if self._dead:
+            self._prune()
+
+        receiver = self._get_receiver(callback, weak)
+        if max_in_flight is not None:
+            receiver.max_in_flight = max_in_flight
+        if executor is not None:
+            receiver.set_executor(executor)
+        if interval is not None:
+            if leading is None:
+                leading = throttle is not None
+            rate = receiver.rate
+            if rate is None:
+                receiver.rate = _Rate(debounce is not None, interval, leading, trailing)
+            else:
+                # an armed timer and the pending event carry over to the new settings
+                rate.debounce = debounce is not None
+                rate.interval = interval
+                rate.leading = leading
+                rate.trailing = trailing
+            receiver.deferred = True
+        if coalesce:
+            if receiver.coalesced is None:
+                receiver.coalesced = {}
+            receiver.deferred = True
+        if priority or inline:
+            if receiver.priority != priority:
+                receiver.priority = priority
+                self._reorder(receiver)
+            receiver.inline = inline
+            self._prioritized = True
+        if where is not None:
+            receiver.where = where
+            self._filters.add(receiver, where)
+        self._changed()
 
         # dispatch
-        if (sender is None) and (senders is None) and (key is None) and (keys is None):
+        if (sender is None) and (senders is None) and (key is None) and (keys is None) and \
+                (pattern is None) and (patterns is None):
             # subscribe always activate the callback when the signal is sent
-            with (yield from self._lock_all):
-                self._all.add(weak_callback)
+            if not receiver.all:
+                receiver.all = True
+                self._all = _insert(self._all, receiver)
         else:
             if sender is not None:
-                yield from self._add_sender(sender, weak_callback)
+                self._add_sender(sender, receiver)
 
             if senders is not None:
                 for sender in senders:
-                    yield from self._add_sender(sender, weak_callback)
+                    self._add_sender(sender, receiver)
 
             if key is not None:
-                yield from self._add_key(key, weak_callback)
+                self._add_key(key, receiver)
 
             if keys is not None:
                 for key in keys:
-                    yield from self._add_key(key, weak_callback)
+                    self._add_key(key, receiver)
+
+            if pattern is not None:
+                self._add_pattern(pattern, receiver)
 
-    @asyncio.coroutine
-    def disconnect(self, callback=None, sender=None, senders=None, key=None, keys=None, weak=True):
+            if patterns is not None:
+                for pattern in patterns:
+                    self._add_pattern(pattern, receiver)
+
+    async def disconnect(self, callback=None, sender=None, senders=None, key=None, keys=None,
+                         weak=True, pattern=None, patterns=None):
         '''
         *This method is a coroutine.*
 
         Disconnects the callback from the signal. If no arguments are
-        supplied for ``sender``, ``senders``, ``key``, or ``keys`` -- the callback is
-        completely disconnected. Otherwise, only the supplied ``senders`` and ``keys``
-        are disconnected for the callback.
+        supplied for ``sender``, ``senders``, ``key``, ``keys``, ``pattern`` or ``patterns`` --
+        the callback is completely disconnected. Otherwise, only the supplied ``senders``,
+        ``keys`` and ``patterns`` are disconnected for the callback.
 
         .. Note::
 
             the argument ``weak`` must be the same as when the callback was
             connected to the signal.
         '''
-        weak_callback = yield from self._get_ref(callback, weak)
-
-        if (sender is None) and (senders is None) and (key is None) and (keys is None):
-            # removing from _all signals
-            # need a lock because we are changing the size of the dict
-            if weak_callback in self._all:
-                with (yield from self._lock_all):
-                    self._all.remove(weak_callback)
+        if self._dead:
+            self._prune()
 
-            with (yield from self._lock_by_senders):
-                sender_keys = list(self._by_senders.keys())
-            for sender in sender_keys:
-                yield from self._disconnect_from_sender(weak_callback, sender, is_id=True)
+        receiver = self._receivers.get(self._get_ref(callback, weak))
+        if receiver is None:
+            return
+        self._changed()
 
-            with (yield from self._lock_by_keys):
-                key_keys = list(self._by_keys.keys())
-            for key in key_keys:
-                yield from self._disconnect_from_key(weak_callback, key)
+        if (sender is None) and (senders is None) and (key is None) and (keys is None) and \
+                (pattern is None) and (patterns is None):
+            self._remove_receiver(receiver)
 
         else:
             # only disconnect from specific senders/keys
             if sender is not None:
-                yield from self._disconnect_from_sender(weak_callback, sender)
+                self._disconnect_from_sender(receiver, sender)
 
             if senders is not None:
                 for sender in senders:
-                    yield from self._disconnect_from_sender(weak_callback, sender)
+                    self._disconnect_from_sender(receiver, sender)
 
             if key is not None:
-                yield from self._disconnect_from_key(weak_callback, key)
+                self._disconnect_from_key(receiver, key)
 
             if keys is not None:
                 for key in keys:
-                    yield from self._disconnect_from_key(weak_callback, key)
+                    self._disconnect_from_key(receiver, key)
+
+            if pattern is not None:
+                self._disconnect_from_pattern(receiver, pattern)
+
+            if patterns is not None:
+                for pattern in patterns:
+                    self._disconnect_from_pattern(receiver, pattern)
+
+            if not receiver.is_connected():
+                self._forget(receiver)
+
+    async def connect_many(self, specs, weak=True):
+        '''
+        *This method is a coroutine.*
+
+        Connects many callbacks in a single registry update. This is equivalent to calling
+        :meth:`asyncio_dispatch.Signal.connect` once per spec, but every ``sender`` and ``key``
+        entry of the registry is replaced at most once and a callback appearing in several specs
+        shares a single weak reference.
+
+        :param list specs: An iterable of ``(callback, senders, keys)`` tuples. ``senders`` and
+            ``keys`` are iterables or ``None``. If both are ``None`` the callback is called any
+            time the signal is sent.
+        :param weak: If ``True``, the callbacks will be stored as weakreferences.
+        '''
+        if self._dead:
+            self._prune()
+
+        all_added = []
+        senders_added = collections.defaultdict(list)
+        keys_added = collections.defaultdict(list)
+
+        for callback, senders, keys in specs:
+            receiver = self._get_receiver(callback, weak)
+
+            if (senders is None) and (keys is None):
+                if not receiver.all:
+                    receiver.all = True
+                    all_added.append(receiver)
+                continue
+
+            for sender in (senders or ()):
+                id_ = self._make_id(sender)
+                if id_ not in receiver.sender_ids:
+                    receiver.sender_ids.add(id_)
+                    senders_added[id_].append(receiver)
+
+            for key in (keys or ()):
+                if key not in receiver.keys:
+                    receiver.keys.add(key)
+                    keys_added[key].append(receiver)
+
+        self._changed()
+
+        if all_added:
+            self._all = _merge(self._all, all_added)
 
-    @asyncio.coroutine
-    def send(self, sender=None, senders=None, key=None, keys=None, **kwargs):
+        for map_, added in ((self._by_senders, senders_added), (self._by_keys, keys_added)):
+            for key, receivers in added.items():
+                map_[key] = _merge(map_.get(key, _EMPTY), receivers)
+
+    async def disconnect_many(self, specs, weak=True):
+        '''
+        *This method is a coroutine.*
+
+        Disconnects many callbacks in a single registry update. This is equivalent to calling
+        :meth:`asyncio_dispatch.Signal.disconnect` once per spec.
+
+        :param list specs: An iterable of ``(callback, senders, keys)`` tuples. If both
+            ``senders`` and ``keys`` are ``None`` the callback is completely disconnected.
+        :param weak: must be the same as when the callbacks were connected to the signal.
+        '''
+        if self._dead:
+            self._prune()
+
+        all_removed = []
+        senders_removed = collections.defaultdict(list)
+        keys_removed = collections.defaultdict(list)
+
+        for callback, senders, keys in specs:
+            receiver = self._receivers.get(self._get_ref(callback, weak))
+            if receiver is None:
+                continue
+
+            if (senders is None) and (keys is None):
+                sender_ids = list(receiver.sender_ids)
+                keys = list(receiver.keys)
+                if receiver.all:
+                    receiver.all = False
+                    all_removed.append(receiver)
+                self._forget(receiver)
+            else:
+                sender_ids = [self._make_id(sender) for sender in (senders or ())]
+                keys = keys or ()
+
+            for id_ in sender_ids:
+                if id_ in receiver.sender_ids:
+                    receiver.sender_ids.remove(id_)
+                    senders_removed[id_].append(receiver)
+
+            for key in keys:
+                if key in receiver.keys:
+                    receiver.keys.remove(key)
+                    keys_removed[key].append(receiver)
+
+            if not receiver.is_connected():
+                self._forget(receiver)
+
+        self._changed()
+
+        if all_removed:
+            self._all = _remove(self._all, all_removed)
+
+        for map_, removed in ((self._by_senders, senders_removed), (self._by_keys, keys_removed)):
+            for key, receivers in removed.items():
+                collection = _remove(map_[key], receivers)
+                if collection:
+                    map_[key] = collection
+                else:
+                    del(map_[key])
+
+    async def send(self, sender=None, senders=None, key=None, keys=None, **kwargs):
         '''
         *This method is a coroutine.*
 
@@ -164,7 +591,7 @@ class Signal:
             :signal: the signal that scheduled the execution of the callback
             :senders: a :class:`set` of ``senders``
             :keys: a :class:`set` of ``keys``
-            :\*\*kwargs: the additional kwargs supplied when the signal was created
+            :\\*\\*kwargs: the additional kwargs supplied when the signal was created
 
         :param kwargs: keyword pairs to send to the callbacks.
             these override the defaults set when the
@@ -173,14 +600,654 @@ class Signal:
 
         :Returns: the number of callbacks that received the signal
         '''
+        live, senders, keys, default_kwargs = self._prepare(sender, senders, key, keys, kwargs)
+
+        if self._overflow != 'wait' or not self._is_limited(live):
+            return self._dispatch(live, senders, keys, default_kwargs)
+
+        calls = []
+        for callback, receiver in live:
+            if receiver.deferred:
+                self._defer(receiver, senders, keys, default_kwargs, calls)
+                continue
+            if not self._has_capacity(receiver):
+                # let what is already scheduled start before suspending
+                self._flush(calls)
+                calls = []
+                while not self._has_capacity(receiver):
+                    waiter = self._loop.create_future()
+                    self._capacity_waiters.append(waiter)
+                    await waiter
+            self._schedule(callback, receiver, senders, keys, default_kwargs, calls)
+        self._flush(calls)
+
+        if self._metrics is not None:
+            self._metrics.sent(len(live))
+        return len(live)
+
+    def send_nowait(self, sender=None, senders=None, key=None, keys=None, **kwargs):
+        '''
+        Schedules connected callbacks for execution without suspending. This is the synchronous
+        counterpart of :meth:`asyncio_dispatch.Signal.send` for code that is not a coroutine,
+        such as :meth:`asyncio.Protocol.data_received`. Callbacks are scheduled on the loop
+        directly, so no intermediate :class:`asyncio.Task` is needed to run the send itself.
+
+        The arguments and the keyword arguments received by the callbacks are the same as for
+        :meth:`asyncio_dispatch.Signal.send`.
+
+        .. Note::
+
+            This method must be called from the thread running the signal's event loop.
+
+        :Returns: the number of callbacks that received the signal
+        '''
+        live, senders, keys, default_kwargs = self._prepare(sender, senders, key, keys, kwargs)
+        return self._dispatch(live, senders, keys, default_kwargs)
+
+    def send_threadsafe(self, sender=None, senders=None, key=None, keys=None, **kwargs):
+        '''
+        Sends the signal from any thread. The event is appended to a buffer and the event loop is
+        woken up only if it does not have a drain of that buffer pending already, so a thread
+        producing events faster than the loop runs them causes a single wakeup per loop
+        iteration instead of one per event. Events are dispatched in the order they were sent.
+
+        The arguments are the same as for :meth:`asyncio_dispatch.Signal.send`. Keyword
+        arguments are validated in the calling thread.
+
+        Nothing is returned because callbacks are resolved later, on the loop. If an event can
+        not be dispatched because a ``max_in_flight`` limit is reached and the ``overflow``
+        policy is not ``'drop'``, the loop's exception handler is called with the
+        :exc:`asyncio_dispatch.SignalFull` error.
+        '''
+        default_kwargs = self._get_kwargs(kwargs)
+
+        with self._threadsafe_lock:
+            self._threadsafe_events.append((sender, senders, key, keys, default_kwargs))
+            if self._drain_scheduled:
+                return
+            self._drain_scheduled = True
+
+        try:
+            _call_soon(self._loop, self._drain_threadsafe)
+        except RuntimeError:
+            # the loop is closed, nothing will ever drain the buffer
+            with self._threadsafe_lock:
+                self._threadsafe_events.clear()
+                self._drain_scheduled = False
+            raise
+
+    @property
+    def metrics(self):
+        '''
+        The :class:`asyncio_dispatch.metrics.SignalMetrics` of the signal, or ``None`` unless
+        it was created with ``metrics=True``
+        '''
+        return self._metrics
+
+    def cache_info(self):
+        '''
+        Reports statistics of the resolution cache used by
+        :meth:`asyncio_dispatch.Signal.send`.
+
+        :Returns: a :class:`CacheInfo` named tuple of ``hits``, ``misses``, ``maxsize`` and
+            ``currsize``
+        '''
+        return CacheInfo(self._cache_hits, self._cache_misses, self._cache_size, len(self._plans))
+
+    def cache_clear(self):
+        '''
+        Empties the resolution cache and resets its statistics.
+        '''
+        self._plans.clear()
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    def interest(self):
+        '''
+        :Returns: a ``(all, keys)`` tuple. ``all`` is ``True`` if a callback is connected
+            without ``senders`` and ``keys``, or to a topic pattern, and ``keys`` is the
+            :class:`frozenset` of keys that callbacks are connected to.
+        '''
+        return bool(self._all) or bool(self._topics), frozenset(self._by_keys)
+
+    def add_tap(self, tap):
+        '''
+        Calls ``tap(senders, keys, kwargs)`` for every event sent with this signal, before its
+        callbacks are scheduled. ``kwargs`` includes the defaults of the signal. Events injected
+        by a bridge, see :mod:`asyncio_dispatch.bridge`, are not tapped. Exceptions raised by a
+        tap are passed to the exception handler of the loop and do not stop the send.
+        '''
+        self._taps.append(tap)
+
+    def remove_tap(self, tap):
+        '''
+        Removes a tap added with :meth:`asyncio_dispatch.Signal.add_tap`.
+        '''
+        self._taps.remove(tap)
+
+    def add_listener(self, listener):
+        '''
+        Calls ``listener(signal)`` soon after the connected callbacks change. Changes made
+        during the same iteration of the event loop are reported with a single call.
+        '''
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        '''
+        Removes a listener added with :meth:`asyncio_dispatch.Signal.add_listener`.
+        '''
+        self._listeners.remove(listener)
+
+    async def send_many(self, events):
+        '''
+        *This method is a coroutine.*
+
+        Sends a burst of events in one pass. Keyword arguments are validated once per distinct
+        set of keywords, receivers are resolved once per distinct combination of ``senders`` and
+        ``keys``, and all synchronous callbacks of the burst are scheduled as a single loop
+        callback. Callbacks run in the order of the events.
+
+        :param list events: An iterable of mappings. Each mapping holds the arguments of one
+            :meth:`asyncio_dispatch.Signal.send` call, i.e. optional ``sender``, ``senders``,
+            ``key`` and ``keys`` entries and any of the signal's keyword arguments.
+
+        :Returns: a list with the number of callbacks that received each event
+        '''
+        return self._send_many(events)
+
+    def deliver(self, sender=None, senders=None, key=None, keys=None, **kwargs):
+        '''
+        Schedules connected callbacks like :meth:`asyncio_dispatch.Signal.send_nowait` but
+        keeps track of them. The returned :class:`asyncio_dispatch.Delivery` can be awaited for
+        the callbacks to finish, to collect their return values and exceptions, to wait with a
+        timeout, or to cancel callbacks that are still outstanding. This lets a producer apply
+        backpressure based on when its events were actually processed.
+
+        The arguments are the same as for :meth:`asyncio_dispatch.Signal.send`.
+
+        .. Note::
+
+            This method must be called from the thread running the signal's event loop.
+
+        :Returns: a :class:`asyncio_dispatch.Delivery`
+        '''
+        live, senders, keys, default_kwargs = self._prepare(sender, senders, key, keys, kwargs)
+
+        # (callback, future) of every callback scheduled, callbacks skipped by
+        # overflow='drop' or a filter have no future
+        futures = []
+        self._dispatch(live, senders, keys, default_kwargs, futures)
+
+        return Delivery([callback for callback, future in futures],
+                        [future for callback, future in futures])
+
+    def _prepare(self, sender, senders, key, keys, kwargs):
+        default_kwargs = self._get_kwargs(kwargs)
+        senders, keys = self._get_filters(sender, senders, key, keys)
+        if self._taps:
+            self._tap(senders, keys, default_kwargs)
+        live = self._get_plan(self._get_signature(senders, keys))
+        if self._filters:
+            live = self._filter(live, default_kwargs)
+        return live, senders, keys, default_kwargs
+
+    def _tap(self, senders, keys, kwargs):
+        for tap in self._taps:
+            try:
+                tap(senders, keys, kwargs)
+            except Exception as exc:
+                self._loop.call_exception_handler({
+                    'message': 'Exception in tap {!r}'.format(tap),
+                    'exception': exc,
+                })
+
+    def _receive(self, keys, kwargs):
+        # dispatches an event that was sent on another signal without tapping it again
+        try:
+            default_kwargs = self._get_kwargs(kwargs)
+            senders, keys = self._get_filters(None, None, None, keys)
+            live = self._get_plan(self._get_signature(senders, keys))
+            if self._filters:
+                live = self._filter(live, default_kwargs)
+            return self._dispatch(live, senders, keys, default_kwargs)
+        except (ValueError, SignalFull) as exc:
+            self._loop.call_exception_handler({
+                'message': 'Received event could not be dispatched',
+                'exception': exc,
+            })
+            return 0
+
+    def _dispatch(self, live, senders, keys, kwargs, futures=None, calls=None):
+        # schedules the (callback, receiver) pairs of a single send without suspending
+        if self._is_limited(live) and self._overflow != 'drop':
+            self._check_capacity(live)
+
+        flush = calls is None
+        if flush:
+            calls = []
+
+        count = 0
+        for callback, receiver in live:
+            if receiver.deferred:
+                self._defer(receiver, senders, keys, kwargs, calls)
+                count += 1
+                continue
+            if self._overflow == 'drop' and not self._has_capacity(receiver):
+                self._dropped += 1
+                continue
+            self._schedule(callback, receiver, senders, keys, kwargs, calls, futures)
+            count += 1
+
+        if flush:
+            self._flush(calls)
+
+        if self._metrics is not None:
+            self._metrics.sent(count)
+        return count
+
+    def _schedule(self, callback, receiver, senders, keys, kwargs, calls, futures=None):
+        # Coroutines become tasks right away, synchronous callbacks are appended to ``calls``
+        # so that the caller can hand them to the loop in a single batch.
+        fn = functools.partial(callback, signal=self, senders=senders, keys=keys, **kwargs)
+        if self._metrics is not None and not receiver.remote:
+            fn = self._metrics.timed(fn, _kind(receiver))
+
+        if receiver.inline:
+            self._run_inline(callback, fn, futures)
+            return
+        if self._prioritized and calls and (receiver.coroutine or receiver.executor is not None):
+            # tasks are queued on the loop right away, the callbacks of a higher priority that
+            # were collected so far have to be queued before them
+            self._flush(calls[:])
+            del calls[:]
+
+        limited = self._max_in_flight is not None or receiver.max_in_flight is not None
+        if limited:
+            self._in_flight += 1
+            receiver.in_flight += 1
+
+        if receiver.coroutine:
+            task = self._loop.create_task(fn())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            future = task
+        elif receiver.executor is not None:
+            if receiver.remote:
+                # the signal can not be pickled, only the payload is shipped to the worker
+                future = receiver.executor.schedule(
+                    self._loop, callback, dict(kwargs, signal=None, senders=senders, keys=keys))
+            else:
+                future = self._loop.run_in_executor(receiver.executor, fn)
+            if receiver.bounded and not limited:
+                future.add_done_callback(self._wake_waiters)
+        elif futures is not None:
+            future = self._loop.create_future()
+            calls.append(functools.partial(_run_tracked, fn, future))
+        elif limited:
+            calls.append(functools.partial(self._run_limited, fn, receiver))
+            return
+        else:
+            calls.append(fn)
+            return
+
+        if limited:
+            future.add_done_callback(functools.partial(self._release, receiver))
+        if futures is not None:
+            futures.append((callback, future))
+
+    def _run_inline(self, callback, fn, futures):
+        if futures is not None:
+            future = self._loop.create_future()
+            _run_tracked(fn, future)
+            futures.append((callback, future))
+            return
+        try:
+            fn()
+        except (SystemExit, KeyboardInterrupt):
+            raise
+        except BaseException as exc:
+            self._loop.call_exception_handler({
+                'message': 'Exception in inline callback {!r}'.format(callback),
+                'exception': exc,
+            })
+
+    def _defer(self, receiver, senders, keys, kwargs, calls):
+        if receiver.rate is not None:
+            self._rate_limit(receiver, senders, keys, kwargs, calls)
+        else:
+            self._coalesce(receiver, senders, keys, kwargs, calls)
+
+    def _coalesce(self, receiver, senders, keys, kwargs, calls):
+        # receiver.coalesced maps the keys of a send to the arguments of the latest send that
+        # was not delivered yet, or to None while a delivery without newer arguments runs
+        slot = frozenset(keys)
+        active = slot in receiver.coalesced
+        receiver.coalesced[slot] = (senders, keys, kwargs)
+        if active:
+            return
+
+        if receiver.coroutine or receiver.executor is not None:
+            task = self._loop.create_task(self._drain_coalesced(receiver, slot))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            calls.append(functools.partial(self._run_coalesced, receiver, slot))
+
+    def _run_coalesced(self, receiver, slot):
+        try:
+            while True:
+                args = receiver.coalesced.get(slot)
+                callback = receiver.ref() if receiver.weak else receiver.ref
+                if args is None or callback is None:
+                    break
+                receiver.coalesced[slot] = None
+                senders, keys, kwargs = args
+                callback(signal=self, senders=senders, keys=keys, **kwargs)
+        finally:
+            receiver.coalesced.pop(slot, None)
+
+    async def _drain_coalesced(self, receiver, slot):
+        try:
+            while True:
+                args = receiver.coalesced.get(slot)
+                callback = receiver.ref() if receiver.weak else receiver.ref
+                if args is None or callback is None:
+                    break
+                receiver.coalesced[slot] = None
+                senders, keys, kwargs = args
+                try:
+                    if receiver.coroutine:
+                        await callback(signal=self, senders=senders, keys=keys, **kwargs)
+                    elif receiver.remote:
+                        await receiver.executor.schedule(
+                            self._loop, callback,
+                            dict(kwargs, signal=None, senders=senders, keys=keys))
+                    else:
+                        await self._loop.run_in_executor(
+                            receiver.executor, functools.partial(
+                                callback, signal=self, senders=senders, keys=keys, **kwargs))
+                except Exception as exc:
+                    # keep delivering the newer values
+                    self._loop.call_exception_handler({
+                        'message': 'Exception in coalesced callback {!r}'.format(callback),
+                        'exception': exc,
+                    })
+        finally:
+            receiver.coalesced.pop(slot, None)
+
+    def _rate_limit(self, receiver, senders, keys, kwargs, calls):
+        # debounce and throttle, see connect()
+        rate = receiver.rate
+        now = self._loop.time()
+        if rate.armed:
+            rate.pending = (senders, keys, kwargs)
+            if rate.debounce:
+                # the timer notices the later deadline when it fires
+                rate.deadline = now + rate.interval
+            return
+
+        if rate.leading:
+            self._run_rated(receiver, (senders, keys, kwargs), calls)
+        else:
+            rate.pending = (senders, keys, kwargs)
+        self._arm(receiver, now + rate.interval)
+
+    def _run_rated(self, receiver, args, calls):
+        callback = receiver.ref() if receiver.weak else receiver.ref
+        if callback is None or not receiver.is_connected():
+            return
+        if not self._has_capacity(receiver):
+            self._dropped += 1
+            return
+        senders, keys, kwargs = args
+        self._schedule(callback, receiver, senders, keys, kwargs, calls)
+
+    def _arm(self, receiver, deadline):
+        rate = receiver.rate
+        rate.armed = True
+        rate.deadline = deadline
+        heapq.heappush(self._timers, (deadline, next(self._timer_counter), receiver))
+        if self._timers[0][2] is receiver:
+            if self._timer_handle is not None:
+                self._timer_handle.cancel()
+            self._timer_handle = self._loop.call_at(deadline, self._run_timers)
+
+    def _run_timers(self):
+        self._timer_handle = None
+        now = self._loop.time()
+        calls = []
+        while self._timers and self._timers[0][0] <= now:
+            deadline, _, receiver = heapq.heappop(self._timers)
+            rate = receiver.rate
+            if not rate.armed:
+                continue
+            if rate.deadline > deadline:
+                # debounced again since the entry was pushed
+                heapq.heappush(self._timers, (rate.deadline, next(self._timer_counter),
+                                              receiver))
+                continue
+
+            rate.armed = False
+            if rate.pending is not None:
+                pending, rate.pending = rate.pending, None
+                if rate.trailing:
+                    self._run_rated(receiver, pending, calls)
+                    if not rate.debounce:
+                        # a throttled callback stays quiet for another interval
+                        rate.armed = True
+                        rate.deadline = now + rate.interval
+                        heapq.heappush(self._timers, (rate.deadline, next(self._timer_counter),
+                                                      receiver))
+
+        if self._timers:
+            self._timer_handle = self._loop.call_at(self._timers[0][0], self._run_timers)
+        self._flush(calls)
+
+    def _flush(self, calls):
+        if calls:
+            _call_soon(self._loop, self._run_calls, calls)
+
+    def _is_limited(self, live):
+        if self._max_in_flight is not None:
+            return True
+        for callback, receiver in live:
+            if receiver.max_in_flight is not None or receiver.bounded:
+                return True
+        return False
+
+    def _has_capacity(self, receiver):
+        if self._max_in_flight is not None and self._in_flight >= self._max_in_flight:
+            return False
+        if receiver.max_in_flight is not None and receiver.in_flight >= receiver.max_in_flight:
+            return False
+        if receiver.bounded and receiver.executor.full():
+            return False
+        return True
+
+    def _check_capacity(self, live):
+        # all or nothing, so a send that raises has not scheduled any callback
+        if self._max_in_flight is not None and self._in_flight + len(live) > self._max_in_flight:
+            raise SignalFull('Signal has {} callbacks in flight'.format(self._in_flight))
+        for callback, receiver in live:
+            if receiver.max_in_flight is not None and receiver.in_flight >= receiver.max_in_flight:
+                raise SignalFull('{!r} has {} calls in flight'.format(callback,
+                                                                      receiver.in_flight))
+            if receiver.bounded and receiver.executor.full():
+                raise SignalFull('The executor of {!r} is full'.format(callback))
+
+    def _run_limited(self, fn, receiver):
+        try:
+            fn()
+        finally:
+            self._release(receiver)
+
+    def _release(self, receiver, future=None):
+        self._in_flight -= 1
+        receiver.in_flight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self, future=None):
+        # every waiter checks again for the limit it is waiting on
+        waiters, self._capacity_waiters = self._capacity_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _send_many(self, events):
+        shapes = set()
+        plans = {}
+        calls = []
+        counts = []
+
+        for event in events:
+            kwargs = dict(event)
+            sender = kwargs.pop('sender', None)
+            senders = kwargs.pop('senders', None)
+            key = kwargs.pop('key', None)
+            keys = kwargs.pop('keys', None)
+
+            shape = frozenset(kwargs)
+            if shape not in shapes:
+                self._get_kwargs(kwargs)
+                shapes.add(shape)
+            default_kwargs = self._default_kwargs.copy()
+            default_kwargs.update(kwargs)
+
+            live, senders, keys = self._get_batch_plan(plans, sender, senders, key, keys)
+            if self._filters:
+                live = self._filter(live, default_kwargs)
+            if self._taps:
+                self._tap(senders, keys, default_kwargs)
+            try:
+                counts.append(self._dispatch(live, senders, keys, default_kwargs, calls=calls))
+            except SignalFull:
+                # events before this one stay scheduled
+                self._flush(calls)
+                raise
+
+        self._flush(calls)
+
+        return counts
+
+    def _drain_threadsafe(self):
+        with self._threadsafe_lock:
+            events, self._threadsafe_events = self._threadsafe_events, []
+            self._drain_scheduled = False
+
+        plans = {}
+        calls = []
+        for sender, senders, key, keys, kwargs in events:
+            live, senders, keys = self._get_batch_plan(plans, sender, senders, key, keys)
+            if self._filters:
+                live = self._filter(live, kwargs)
+            if self._taps:
+                self._tap(senders, keys, kwargs)
+            try:
+                self._dispatch(live, senders, keys, kwargs, calls=calls)
+            except SignalFull as exc:
+                self._loop.call_exception_handler({
+                    'message': 'Event sent with send_threadsafe() could not be dispatched',
+                    'exception': exc,
+                })
+
+        self._flush(calls)
+
+    def _get_batch_plan(self, plans, sender, senders, key, keys):
+        # resolves the receivers of one event of a burst, once per signature and burst
+        senders, keys = self._get_filters(sender, senders, key, keys)
+        signature = self._get_signature(senders, keys)
+        live = plans.get(signature)
+        if live is None:
+            live = plans[signature] = self._get_plan(signature)
+        return live, senders, keys
+
+    def _run_calls(self, calls):
+        # mirrors asyncio.Handle so one failing callback does not stop the rest of the batch
+        for fn in calls:
+            try:
+                fn()
+            except (SystemExit, KeyboardInterrupt):
+                raise
+            except BaseException as exc:
+                self._loop.call_exception_handler({
+                    'message': 'Exception in callback {!r}'.format(fn),
+                    'exception': exc,
+                })
+
+    def _get_signature(self, senders, keys):
+        return (frozenset([self._make_id(sender) for sender in senders]), frozenset(keys))
+
+    def _get_plan(self, signature):
+        plan = self._plans.get(signature)
+        if plan is not None and plan[0] == self._generation:
+            self._plans.move_to_end(signature)
+            self._cache_hits += 1
+            return self._get_plan_callbacks(plan[1])
+
+        self._cache_misses += 1
+        receivers, live = self._resolve(*signature)
+
+        if self._cache_size > 0:
+            self._plans[signature] = (self._generation, receivers)
+            self._plans.move_to_end(signature)
+            if len(self._plans) > self._cache_size:
+                self._plans.popitem(last=False)
+
+        return live
+
+    def _resolve(self, sender_ids, keys):
+        # callbacks connected to all send calls
+        collections_ = [self._all]
+
+        # collect sender filtered callbacks
+        for id_ in sender_ids:
+            collection = self._by_senders.get(id_)
+            if collection is not None:
+                collections_.append(collection)
+
+        # collect key filtered callbacks
+        for key in keys:
+            collection = self._by_keys.get(key)
+            if collection is not None:
+                collections_.append(collection)
+
+        # collect callbacks of matching topic patterns
+        if self._topics:
+            for key in keys:
+                if isinstance(key, str):
+                    collections_.extend(self._topics.match_groups(key))
+
+        if self._prioritized and len(collections_) > 1:
+            # every collection is in order of priority already, merging keeps the order of
+            # the registry among callbacks of the same priority
+            receivers = heapq.merge(*collections_, key=_by_priority)
+        else:
+            receivers = itertools.chain.from_iterable(collections_)
+
+        # maps each live callback to the receiver it was found through
+        live_callbacks = {}
+        self._get_callbacks(receivers, live_callbacks)
+
+        live = list(live_callbacks.items())
+        return tuple(receiver for callback, receiver in live), live
 
+    def _filter(self, live, kwargs):
+        # the plan is cached by senders and keys, the content filters are applied per send
+        matched = self._filters.match(kwargs)
+        return [(callback, receiver) for callback, receiver in live
+                if receiver.where is None or receiver in matched]
+
+    def _get_kwargs(self, kwargs):
         default_kwargs = self._default_kwargs.copy()
         for keyword in kwargs:
             if keyword not in default_kwargs:
                 raise ValueError('You can not add new kwargs to an existing signal.')
 
         default_kwargs.update(kwargs)
+        return default_kwargs
 
+    @staticmethod
+    def _get_filters(sender, senders, key, keys):
         if senders is not None:
             senders = set(senders)
         else:
@@ -195,126 +1262,70 @@ class Signal:
         if key is not None:
             keys.add(key)
 
-        live_callbacks = set()
-
-        # collect callbacks connected to all send calls
-        with (yield from self._lock_all):
-            all_callbacks = yield from self._get_callbacks(self._all)
-
-        live_callbacks = live_callbacks | all_callbacks
-
-        # collect sender filtered callbacks
-        sender_callbacks = set()
-        for sender in senders:
-            id_ = yield from self._make_id(sender)
-            if id_ in self._by_senders:
-                sender_lock = self._get_lock(self._locks_senders, id_)
-                with (yield from sender_lock):
-                    new_sender_callbacks = yield from self._get_callbacks(self._by_senders[id_])
-
-                    if not new_sender_callbacks:
-                        with (yield from self._lock_by_senders):
-                            # Do some pruning
-                            del(self._by_senders[id_])
-                            del(self._locks_senders[id_])
-                    else:
-                        sender_callbacks = sender_callbacks | new_sender_callbacks
-
-        live_callbacks = live_callbacks | sender_callbacks
-
-        # collect key filtered callbacks
-        key_callbacks = set()
-        for key in keys:
-            if key in self._by_keys:
-                key_lock = self._get_lock(self._locks_keys, key)
-                with (yield from key_lock):
-                    new_key_callbacks = yield from self._get_callbacks(self._by_keys[key])
-
-                    if not new_key_callbacks:
-                        # Do some pruning
-                        with (yield from self._lock_by_keys):
-                            del(self._by_keys[key])
-                            del(self._locks_keys[key])
-                    else:
-                        key_callbacks = key_callbacks | new_key_callbacks
-
-        live_callbacks = live_callbacks | key_callbacks
-
-        # schedule all collected callbacks
-
-        for callback in live_callbacks:
-            yield from self._call_callback(callback,
-                                           senders,
-                                           keys,
-                                           **default_kwargs)
-
-        return len(live_callbacks)
-
-    @asyncio.coroutine
-    def _call_callback(self, callback, senders, keys, **kwargs):
-        fn = functools.partial(callback, signal=self, senders=senders, keys=keys, **kwargs)
-        if iscoroutinefunction(callback):
-            self._loop.create_task(fn())
-        else:
-            self._loop.call_soon_threadsafe(fn)
+        return senders, keys
 
     @staticmethod
-    @asyncio.coroutine
-    def _get_callbacks(collection):
-        dead_callbacks = []
-        live_callbacks = set()
-
-        for ref in collection:
+    def _get_callbacks(collection, live_callbacks):
+        for receiver in collection:
             # Get the actual callback if it is a weak reference
-            if isinstance(ref, weakref.ref):
-                callback = ref()
+            if receiver.weak:
+                callback = receiver.ref()
             else:
-                callback = ref
+                callback = receiver.ref
 
-            if not callback:
-                dead_callbacks.append(ref)
-                continue
+            # dead callbacks are left for _prune()
+            if callback:
+                live_callbacks.setdefault(callback, receiver)
+
+    @staticmethod
+    def _get_plan_callbacks(receivers):
+        live = []
+
+        for receiver in receivers:
+            if receiver.weak:
+                callback = receiver.ref()
             else:
-                live_callbacks.add(callback)
+                callback = receiver.ref
 
-        # Prune the dead callbacks
-        if dead_callbacks:
-            for callback in dead_callbacks:
-                collection.remove(callback)
+            if callback:
+                live.append((callback, receiver))
 
-        return live_callbacks
+        return live
 
     @staticmethod
-    @asyncio.coroutine
     def _make_id(target):
         if hasattr(target, '__func__') and hasattr(target, '__self__'):
             return (id(target.__self__), id(target.__func__))
         return id(target)
 
-    @asyncio.coroutine
-    def _add_sender(self, sender, weak_callback):
-        id_ = yield from self._make_id(sender)
-        if id_ not in self._by_senders:
-            with (yield from self._lock_by_senders):
-                self._by_senders[id_] = set()
+    def _get_receiver(self, callback, weak):
+        receiver = self._receivers.get(self._get_ref(callback, weak))
+        if receiver is None:
+            receiver = _Receiver(self._get_ref(callback, weak, self._on_dead), weak,
+                                 iscoroutinefunction(callback))
+            if self._executor is not None and not receiver.coroutine:
+                receiver.set_executor(self._executor)
+            self._receivers[receiver.ref] = receiver
+        return receiver
 
-        sender_lock = self._get_lock(self._locks_senders, id_)
-        with (yield from sender_lock):
-            self._by_senders[id_].add(weak_callback)
+    def _add_sender(self, sender, receiver):
+        id_ = self._make_id(sender)
+        if id_ not in receiver.sender_ids:
+            receiver.sender_ids.add(id_)
+            self._by_senders[id_] = _insert(self._by_senders.get(id_, _EMPTY), receiver)
 
-    @asyncio.coroutine
-    def _add_key(self, key, weak_callback):
-        if key not in self._by_keys:
-            with (yield from self._lock_by_keys):
-                self._by_keys[key] = set()
+    def _add_pattern(self, pattern, receiver):
+        if pattern not in receiver.patterns:
+            receiver.patterns.add(pattern)
+            self._topics.add(pattern, receiver)
 
-        key_lock = self._get_lock(self._locks_keys, key)
-        with (yield from key_lock):
-            self._by_keys[key].add(weak_callback)
+    def _add_key(self, key, receiver):
+        if key not in receiver.keys:
+            receiver.keys.add(key)
+            self._by_keys[key] = _insert(self._by_keys.get(key, _EMPTY), receiver)
 
     @staticmethod
-    @asyncio.coroutine
-    def _get_ref(callback, weak=True):
+    def _get_ref(callback, weak=True, on_dead=None):
         if weak:
             # Check if callback is an instance method or not
             if hasattr(callback, '__func__') and hasattr(callback, '__self__'):
@@ -322,43 +1333,184 @@ class Signal:
             else:
                 ref = weakref.ref
 
-            weak_callback = ref(callback)
+            weak_callback = ref(callback, on_dead)
         else:
             weak_callback = callback
         return weak_callback
 
-    @asyncio.coroutine
-    def _disconnect_from_sender(self, weak_callback, sender, is_id=False):
-        if not is_id:
-            id_ = yield from self._make_id(sender)
-        else:
-            id_ = sender
-        if id_ in self._by_senders:
-            if weak_callback in self._by_senders[id_]:
-                sender_lock = self._get_lock(self._locks_senders, id_)
-                with (yield from sender_lock):
-                    self._by_senders[id_].remove(weak_callback)
-                    if len(self._by_senders[id_]) == 0:
-                        # We can do some cleanup
-                        with (yield from self._lock_by_senders):
-                            del(self._by_senders[id_])
-                            del(self._locks_senders[id_])
-
-    @asyncio.coroutine
-    def _disconnect_from_key(self, weak_callback, key):
-        if key in self._by_keys:
-            if weak_callback in self._by_keys[key]:
-                key_lock = self._get_lock(self._locks_keys, key)
-                with (yield from key_lock):
-                    self._by_keys[key].remove(weak_callback)
-                    if len(self._by_keys[key]) == 0:
-                        # We can do some cleanup
-                        with (yield from self._lock_by_keys):
-                            del(self._by_keys[key])
-                            del(self._locks_keys[key])
+    def _disconnect_from_sender(self, receiver, sender):
+        id_ = self._make_id(sender)
+        if id_ in receiver.sender_ids:
+            receiver.sender_ids.remove(id_)
+            self._discard(self._by_senders, id_, receiver)
+
+    def _disconnect_from_pattern(self, receiver, pattern):
+        if pattern in receiver.patterns:
+            receiver.patterns.discard(pattern)
+            self._topics.discard(pattern, receiver)
+
+    def _disconnect_from_key(self, receiver, key):
+        if key in receiver.keys:
+            receiver.keys.remove(key)
+            self._discard(self._by_keys, key, receiver)
+
+    def _remove_receiver(self, receiver):
+        if receiver.all:
+            receiver.all = False
+            self._all = _remove(self._all, (receiver,))
+
+        for id_ in receiver.sender_ids:
+            self._discard(self._by_senders, id_, receiver)
+        receiver.sender_ids.clear()
+
+        for key in receiver.keys:
+            self._discard(self._by_keys, key, receiver)
+        receiver.keys.clear()
+
+        self._forget(receiver)
+
+    def _reorder(self, receiver):
+        # moves a receiver whose priority changed to its place in every collection it is in
+        if receiver.all:
+            self._all = _insert(_remove(self._all, (receiver,)), receiver)
+
+        for map_, keys in ((self._by_senders, receiver.sender_ids),
+                           (self._by_keys, receiver.keys)):
+            for key in keys:
+                map_[key] = _insert(_remove(map_[key], (receiver,)), receiver)
+
+        for pattern in receiver.patterns:
+            self._topics.discard(pattern, receiver)
+            self._topics.add(pattern, receiver)
+
+    def _forget(self, receiver):
+        # unregisters a receiver whose senders, keys and all flag are cleared already, along
+        # with its patterns and filter
+        self._receivers.pop(receiver.ref, None)
+
+        for pattern in receiver.patterns:
+            self._topics.discard(pattern, receiver)
+        receiver.patterns.clear()
+
+        if receiver.where is not None:
+            self._filters.discard(receiver)
+            receiver.where = None
+
+    def _changed(self):
+        # every change to the registry goes through here
+        self._generation += 1
+        if self._listeners and not self._notify_scheduled:
+            self._notify_scheduled = True
+            _call_soon(self._loop, self._notify_listeners)
+
+    def _notify_listeners(self):
+        self._notify_scheduled = False
+        for listener in list(self._listeners):
+            listener(self)
+
+    def _schedule_prune(self, ref):
+        # Called from weak reference callbacks, which run wherever the garbage collector does.
+        # At most one prune is queued on the loop no matter how many callbacks die before it runs.
+        self._dead.append(ref)
+        if self._prune_scheduled:
+            return
+
+        self._prune_scheduled = True
+        try:
+            _call_soon(self._loop, self._run_scheduled_prune)
+        except RuntimeError:
+            # the loop is closed, connect() and disconnect() will prune instead
+            self._prune_scheduled = False
+
+    def _run_scheduled_prune(self):
+        self._prune_scheduled = False
+        self._prune()
+
+    def _prune(self):
+        while self._dead:
+            ref = self._dead.popleft()
+            receiver = self._receivers.get(ref)
+            # a dead reference only compares equal to itself
+            if receiver is not None:
+                self._changed()
+                self._remove_receiver(receiver)
+                if self._metrics is not None:
+                    self._metrics.pruned += 1
 
     @staticmethod
-    def _get_lock(map_, key):
-        if key not in map_:
-            map_[key] = asyncio.Lock()
-        return map_[key]
+    def _discard(map_, key, receiver):
+        collection = _remove(map_[key], (receiver,))
+        if collection:
+            map_[key] = collection
+        else:
+            # We can do some cleanup
+            del(map_[key])
+
+
+def _call_soon(loop, callback, *args):
+    # call_soon_threadsafe() writes to the self-pipe of the loop to wake it up, a system call
+    # that is wasted when the caller is the running loop itself
+    if asyncio._get_running_loop() is loop:
+        return loop.call_soon(callback, *args)
+    return loop.call_soon_threadsafe(callback, *args)
+
+
+def _kind(receiver):
+    # the latency and duration histograms a callback is timed in
+    if receiver.coroutine:
+        return 'coroutine'
+    if receiver.executor is not None:
+        return 'executor'
+    return 'sync'
+
+
+def _by_priority(receiver):
+    return -receiver.priority
+
+
+def _insert(collection, receiver):
+    # a copy of an ordered registry collection with ``receiver`` after the receivers of the
+    # same or a higher priority
+    index = len(collection)
+    while index and collection[index - 1].priority < receiver.priority:
+        index -= 1
+    return collection[:index] + (receiver,) + collection[index:]
+
+
+def _merge(collection, receivers):
+    # a copy of an ordered registry collection with many ``receivers`` added
+    if len(receivers) == 1:
+        return _insert(collection, receivers[0])
+    return tuple(heapq.merge(collection, sorted(receivers, key=_by_priority), key=_by_priority))
+
+
+def _remove(collection, receivers):
+    # a copy of an ordered registry collection without ``receivers``
+    receivers = set(receivers)
+    return tuple(receiver for receiver in collection if receiver not in receivers)
+
+
+def _make_dead_callback(signal):
+    # The weak reference callback must not keep the signal itself alive
+    signal_ref = weakref.ref(signal)
+
+    def on_dead(ref):
+        signal = signal_ref()
+        if signal is not None:
+            signal._schedule_prune(ref)
+
+    return on_dead
+
+
+def _run_tracked(fn, future):
+    # runs a synchronous callback of a Delivery unless it was cancelled before it started
+    if future.cancelled():
+        return
+    try:
+        result = fn()
+    except (SystemExit, KeyboardInterrupt):
+        raise
+    except BaseException as exc:
+        future.set_exception(exc)
+    else:
+        future.set_result(result)
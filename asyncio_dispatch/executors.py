@@ -0,0 +1,260 @@
+'''
+Executors that synchronous callbacks of a :class:`asyncio_dispatch.Signal` can be run in
+'''
+import collections
+import concurrent.futures
+import pickle
+import threading
+import time
+
+
+PoolInfo = collections.namedtuple('PoolInfo', ['workers', 'submitted', 'completed',
+                                               'queue_depth', 'peak_queue_depth', 'max_queue',
+                                               'wait_time', 'run_time'])
+
+
+class ThreadPool(concurrent.futures.ThreadPoolExecutor):
+    '''
+    A :class:`concurrent.futures.ThreadPoolExecutor` with a bounded queue that keeps track of
+    how long calls wait for a worker and how long they run.
+
+    Pass it as ``executor`` to :class:`asyncio_dispatch.Signal` or
+    :meth:`asyncio_dispatch.Signal.connect` to keep blocking callbacks off the event loop.
+    When the queue is full, the ``overflow`` policy of the signal applies just like it does for
+    ``max_in_flight``.
+    '''
+
+    def __init__(self, max_workers=None, max_queue=None, thread_name_prefix='asyncio_dispatch'):
+        '''
+        :param int max_workers: the number of worker threads. If ``None``, the default of
+            :class:`concurrent.futures.ThreadPoolExecutor` is used.
+        :param int max_queue: the maximum number of submitted calls that have not been picked
+            up by a worker yet. ``None`` means unlimited.
+        :param str thread_name_prefix: the name prefix of the worker threads
+        '''
+        if max_queue is not None and max_queue < 1:
+            raise ValueError('max_queue must be at least 1')
+        super().__init__(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self.max_queue = max_queue
+        self._stats_lock = threading.Lock()
+        self._submitted = 0
+        self._completed = 0
+        self._queue_depth = 0
+        self._peak_queue_depth = 0
+        self._wait_time = 0.0
+        self._run_time = 0.0
+
+    def submit(self, fn, *args, **kwargs):
+        with self._stats_lock:
+            self._submitted += 1
+            self._queue_depth += 1
+            if self._queue_depth > self._peak_queue_depth:
+                self._peak_queue_depth = self._queue_depth
+        try:
+            return super().submit(self._run, time.perf_counter(), fn, args, kwargs)
+        except BaseException:
+            with self._stats_lock:
+                self._submitted -= 1
+                self._queue_depth -= 1
+            raise
+
+    def full(self):
+        '''
+        :Returns: ``True`` if the queue holds ``max_queue`` calls that are waiting for a worker
+        '''
+        return self.max_queue is not None and self._queue_depth >= self.max_queue
+
+    @property
+    def queue_depth(self):
+        '''
+        The number of submitted calls that are waiting for a worker
+        '''
+        return self._queue_depth
+
+    def pool_info(self):
+        '''
+        :Returns: a :class:`PoolInfo` named tuple. ``wait_time`` is the total number of seconds
+            calls spent queued and ``run_time`` the total number of seconds they spent running.
+        '''
+        with self._stats_lock:
+            return PoolInfo(self._max_workers, self._submitted, self._completed,
+                            self._queue_depth, self._peak_queue_depth, self.max_queue,
+                            self._wait_time, self._run_time)
+
+    def _run(self, submitted_at, fn, args, kwargs):
+        started_at = time.perf_counter()
+        with self._stats_lock:
+            self._queue_depth -= 1
+            self._wait_time += started_at - submitted_at
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._stats_lock:
+                self._completed += 1
+                self._run_time += time.perf_counter() - started_at
+
+
+class ProcessPool(concurrent.futures.ProcessPoolExecutor):
+    '''
+    A :class:`concurrent.futures.ProcessPoolExecutor` for CPU bound callbacks.
+
+    Calls scheduled by a :class:`asyncio_dispatch.Signal` are collected in batches of up to
+    ``batch_size`` calls and every batch is shipped to a worker process as a single task, so the
+    cost of inter process communication is paid per batch instead of per call. A batch is
+    submitted as soon as it is full or when the event loop gets to run again.
+
+    Callbacks must be picklable, which in practice means module level functions, and so must the
+    keyword arguments of the signal, the ``senders`` and ``keys`` of a send and the return value.
+    Every call and every result is pickled on its own, so one that can not be pickled only fails
+    its own future. Callbacks are called with ``signal=None``, since the signal itself stays in
+    the parent process.
+    '''
+
+    def __init__(self, max_workers=None, batch_size=64, max_queue=None, mp_context=None):
+        '''
+        :param int max_workers: the number of worker processes. If ``None``, the default of
+            :class:`concurrent.futures.ProcessPoolExecutor` is used.
+        :param int batch_size: the maximum number of calls shipped to a worker at once
+        :param int max_queue: the maximum number of scheduled calls that have not finished yet.
+            ``None`` means unlimited.
+        :param mp_context: the :mod:`multiprocessing` context used to start the workers
+        '''
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        if max_queue is not None and max_queue < 1:
+            raise ValueError('max_queue must be at least 1')
+        super().__init__(max_workers=max_workers, mp_context=mp_context)
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.batches = 0
+        self._pending = []
+        self._flush_handle = None
+        self._submitted = 0
+        self._completed = 0
+        self._queue_depth = 0
+        self._peak_queue_depth = 0
+        self._wait_time = 0.0
+        self._run_time = 0.0
+
+    def schedule(self, loop, fn, kwargs):
+        '''
+        Schedule ``fn(**kwargs)`` to run in a worker process. Must be called from the thread
+        running ``loop``.
+
+        :Returns: an :class:`asyncio.Future` for the result of the call
+        '''
+        future = loop.create_future()
+        try:
+            call = pickle.dumps((fn, kwargs), pickle.HIGHEST_PROTOCOL)
+        except Exception as exc:
+            # the calls shipped in the same batch are not affected
+            future.set_exception(exc)
+            return future
+        self._pending.append((call, future, time.perf_counter()))
+        self._submitted += 1
+        self._queue_depth += 1
+        if self._queue_depth > self._peak_queue_depth:
+            self._peak_queue_depth = self._queue_depth
+
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_soon(self.flush)
+        return future
+
+    def flush(self):
+        '''
+        Submit the calls that have been scheduled but not shipped to a worker yet.
+        '''
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        self.batches += 1
+        loop = pending[0][1].get_loop()
+        try:
+            batch = self.submit(_run_batch, [call for call, _, _ in pending])
+        except Exception as exc:
+            self._finish(pending, exc)
+            return
+        batch.add_done_callback(
+            lambda batch: loop.call_soon_threadsafe(self._finish, pending, batch))
+
+    def full(self):
+        '''
+        :Returns: ``True`` if ``max_queue`` scheduled calls have not finished yet
+        '''
+        return self.max_queue is not None and self._queue_depth >= self.max_queue
+
+    @property
+    def queue_depth(self):
+        '''
+        The number of scheduled calls that have not finished yet
+        '''
+        return self._queue_depth
+
+    def pool_info(self):
+        '''
+        :Returns: a :class:`PoolInfo` named tuple. ``run_time`` is the total number of seconds
+            calls spent running in a worker and ``wait_time`` the remainder of the time between
+            scheduling them and receiving their results.
+        '''
+        return PoolInfo(self._max_workers, self._submitted, self._completed, self._queue_depth,
+                        self._peak_queue_depth, self.max_queue, self._wait_time, self._run_time)
+
+    def _finish(self, pending, batch):
+        if isinstance(batch, BaseException):
+            error, results = batch, None
+        elif batch.cancelled():
+            error, results = concurrent.futures.CancelledError(), None
+        else:
+            error, results = batch.exception(), None
+            if error is None:
+                results = batch.result()
+
+        finished_at = time.perf_counter()
+        for i, (call, future, scheduled_at) in enumerate(pending):
+            self._completed += 1
+            self._queue_depth -= 1
+            if results is None:
+                self._wait_time += finished_at - scheduled_at
+                if not future.done():
+                    future.set_exception(error)
+                continue
+
+            ok, value, run_time = results[i]
+            self._run_time += run_time
+            self._wait_time += finished_at - scheduled_at - run_time
+            if future.done():
+                continue
+            try:
+                value = pickle.loads(value)
+            except Exception as exc:
+                ok, value = False, exc
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+
+def _run_batch(calls):
+    # runs in the worker process, calls and results are pickled one by one so a failure to
+    # pickle one of them does not fail the batch
+    results = []
+    for call in calls:
+        started_at = time.perf_counter()
+        try:
+            fn, kwargs = pickle.loads(call)
+            ok, value = True, fn(**kwargs)
+        except Exception as exc:
+            ok, value = False, exc
+        run_time = time.perf_counter() - started_at
+        try:
+            value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception as exc:
+            ok, value = False, pickle.dumps(exc, pickle.HIGHEST_PROTOCOL)
+        results.append((ok, value, run_time))
+    return results
@@ -0,0 +1,236 @@
+'''
+Exports the metrics of named :class:`asyncio_dispatch.Signal` instances in the Prometheus text
+format
+
+Signals are registered under a name in a :class:`asyncio_dispatch.SignalRegistry`, by default
+:data:`asyncio_dispatch.exporter.default_registry`. A :class:`asyncio_dispatch.MetricsServer`
+answers ``GET /metrics`` with the metrics of every registered signal that is still alive,
+labelled with ``signal="<name>"``:
+
+* ``asyncio_dispatch_sends_total``, ``asyncio_dispatch_scheduled_total``,
+  ``asyncio_dispatch_dropped_total`` and ``asyncio_dispatch_pruned_total`` counters,
+* ``asyncio_dispatch_in_flight`` and ``asyncio_dispatch_registry_size`` gauges, the latter with
+  an ``index`` label,
+* the ``asyncio_dispatch_fan_out`` histogram and the ``asyncio_dispatch_latency_seconds`` and
+  ``asyncio_dispatch_duration_seconds`` histograms, with a ``kind`` label.
+
+Counters and histograms are only collected by signals created with ``metrics``, see
+:mod:`asyncio_dispatch.metrics`. The gauges are reported for every signal.
+'''
+import asyncio
+import weakref
+
+from .metrics import KINDS, registry_sizes
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_COUNTERS = (
+    ('sends', 'Signals sent'),
+    ('scheduled', 'Callbacks scheduled by sends'),
+    ('dropped', 'Callbacks dropped because a max_in_flight limit was reached'),
+    ('pruned', 'Dead weak references removed from the registry'),
+)
+
+_HISTOGRAMS = (
+    ('latency_seconds', 'latency', 'Time from scheduling a callback to its start'),
+    ('duration_seconds', 'duration', 'Time a callback ran'),
+)
+
+
+class SignalRegistry:
+    '''
+    Signals by name. Signals are weakly referenced and leave the registry when they are garbage
+    collected.
+    '''
+
+    def __init__(self):
+        self._signals = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self._signals)
+
+    def __contains__(self, name):
+        return name in self._signals
+
+    def __getitem__(self, name):
+        return self._signals[name]
+
+    def register(self, name, signal):
+        '''
+        Registers ``signal`` under ``name``.
+
+        :Returns: ``signal``
+        '''
+        current = self._signals.get(name)
+        if current is not None and current is not signal:
+            raise ValueError('A signal named "{}" is registered already'.format(name))
+        self._signals[name] = signal
+        return signal
+
+    def unregister(self, name):
+        '''
+        Removes the signal registered under ``name``, if any.
+        '''
+        self._signals.pop(name, None)
+
+    def items(self):
+        '''
+        :Returns: a list of ``(name, signal)`` tuples of the live signals, sorted by name
+        '''
+        return sorted(self._signals.items(), key=lambda item: item[0])
+
+
+# the registry used when none is passed
+default_registry = SignalRegistry()
+
+
+def render(registry=None):
+    '''
+    :param asyncio_dispatch.SignalRegistry registry: the signals to report. If ``None``,
+        :data:`asyncio_dispatch.exporter.default_registry`.
+
+    :Returns: the metrics of the registered signals in the Prometheus text format
+    '''
+    if registry is None:
+        registry = default_registry
+    signals = registry.items()
+    measured = [(name, signal.metrics) for name, signal in signals
+                if signal.metrics is not None]
+    lines = []
+
+    for attribute, help_ in _COUNTERS:
+        metric = 'asyncio_dispatch_{}_total'.format(attribute)
+        _header(lines, metric, help_, 'counter')
+        for name, metrics in measured:
+            lines.append('{}{} {}'.format(metric, _labels(signal=name),
+                                          getattr(metrics, attribute)))
+
+    _header(lines, 'asyncio_dispatch_in_flight',
+            'Callbacks scheduled and not finished, counted while a max_in_flight limit applies',
+            'gauge')
+    for name, signal in signals:
+        lines.append('asyncio_dispatch_in_flight{} {}'.format(_labels(signal=name),
+                                                              signal._in_flight))
+
+    _header(lines, 'asyncio_dispatch_registry_size', 'Entries of the registry of a signal',
+            'gauge')
+    for name, signal in signals:
+        for index, size in registry_sizes(signal).items():
+            lines.append('asyncio_dispatch_registry_size{} {}'.format(
+                _labels(signal=name, index=index), size))
+
+    _header(lines, 'asyncio_dispatch_fan_out', 'Callbacks scheduled per send', 'histogram')
+    for name, metrics in measured:
+        _histogram(lines, 'asyncio_dispatch_fan_out', metrics.fan_out, signal=name)
+
+    for suffix, attribute, help_ in _HISTOGRAMS:
+        metric = 'asyncio_dispatch_{}'.format(suffix)
+        _header(lines, metric, help_, 'histogram')
+        for name, metrics in measured:
+            for kind in KINDS:
+                _histogram(lines, metric, getattr(metrics, attribute)[kind], signal=name,
+                           kind=kind)
+
+    lines.append('')
+    return '\n'.join(lines)
+
+
+class MetricsServer:
+    '''
+    A minimal HTTP server that serves :func:`asyncio_dispatch.exporter.render` for Prometheus to
+    scrape. Every request is answered and the connection closed.
+    '''
+
+    def __init__(self, registry=None, path='/metrics'):
+        '''
+        :param asyncio_dispatch.SignalRegistry registry: the signals to report. If ``None``,
+            :data:`asyncio_dispatch.exporter.default_registry`.
+        :param str path: the path metrics are served on, other paths are answered with ``404``
+        '''
+        self.registry = registry
+        self.path = path.encode('ascii')
+        self.requests = 0
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        '''
+        *This method is a coroutine.*
+
+        Starts serving on ``host`` and ``port``.
+
+        :Returns: the addresses the server listens on, which tells the port if ``0`` was passed
+        '''
+        if self._server is not None:
+            raise ValueError('The server is started already')
+        self._server = await asyncio.start_server(self._handle, host=host, port=port)
+        return [sock.getsockname() for sock in self._server.sockets]
+
+    async def close(self):
+        '''
+        *This method is a coroutine.*
+
+        Stops serving.
+        '''
+        if self._server is None:
+            return
+        server, self._server = self._server, None
+        server.close()
+        await server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            request = (await reader.readline()).split()
+            # the headers are not needed
+            while (await reader.readline()).strip():
+                pass
+
+            body = b''
+            if len(request) < 2 or request[0] not in (b'GET', b'HEAD'):
+                status = '405 Method Not Allowed'
+            elif request[1].split(b'?')[0] != self.path:
+                status = '404 Not Found'
+            else:
+                status = '200 OK'
+                body = render(self.registry).encode('utf-8')
+            self.requests += 1
+
+            head = 'HTTP/1.1 {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n' \
+                   'Connection: close\r\n\r\n'.format(status, CONTENT_TYPE, len(body))
+            writer.write(head.encode('ascii'))
+            if request and request[0] != b'HEAD':
+                writer.write(body)
+            await writer.drain()
+        except (ConnectionError, ValueError):
+            # the client went away or sent a line longer than the limit of the reader
+            pass
+        finally:
+            writer.close()
+
+
+def _header(lines, metric, help_, type_):
+    lines.append('# HELP {} {}'.format(metric, help_))
+    lines.append('# TYPE {} {}'.format(metric, type_))
+
+
+def _histogram(lines, metric, histogram, **labels):
+    for bound, count in histogram.cumulative():
+        lines.append('{}_bucket{} {}'.format(metric, _labels(le=_number(bound), **labels),
+                                             count))
+    lines.append('{}_sum{} {}'.format(metric, _labels(**labels), _number(histogram.sum)))
+    lines.append('{}_count{} {}'.format(metric, _labels(**labels), histogram.count))
+
+
+def _labels(**labels):
+    return '{' + ','.join('{}="{}"'.format(label, _escape(value))
+                          for label, value in sorted(labels.items())) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
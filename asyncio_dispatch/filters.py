@@ -0,0 +1,190 @@
+'''
+Content filters for :class:`asyncio_dispatch.Signal`
+
+A filter is a mapping from keyword arguments of the signal to conditions on their values,
+passed as ``where`` to :meth:`asyncio_dispatch.Signal.connect`. A callback with a filter is only
+scheduled for sends whose keyword arguments meet every condition. A condition is one of
+
+* a :class:`set` or :class:`frozenset`: the value is one of its members,
+* a ``(operator, operand)`` tuple, where ``operator`` is one of ``'=='``, ``'!='``, ``'<'``,
+  ``'<='``, ``'>'``, ``'>='``, ``'in'`` and ``'not in'``,
+* any other value: the value is equal to it.
+
+``{'symbol': {'AAPL', 'MSFT'}, 'qty': ('>', 100)}`` matches sends of ``symbol='AAPL'`` with a
+``qty`` above ``100``. To compare a keyword argument with a tuple, use ``('==', (1, 2))``.
+
+Equality and membership conditions with hashable operands are indexed: a send only evaluates
+the filters indexed under the values it carries, plus the filters that have no such condition.
+'''
+import operator
+
+
+def _contains(value, operand):
+    return value in operand
+
+
+def _not_contains(value, operand):
+    return value not in operand
+
+
+# the operands of 'in' conditions that are indexed by their members
+_INDEXABLE = (set, frozenset, list, tuple)
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': _contains,
+    'not in': _not_contains,
+}
+
+
+class Filter:
+    '''
+    The compiled conditions of a ``where`` mapping
+    '''
+
+    def __init__(self, where, fields=None):
+        '''
+        :param dict where: maps keyword arguments to conditions, see
+            :mod:`asyncio_dispatch.filters`
+        :param fields: the keyword arguments that may be filtered on. If ``None``, any.
+        '''
+        self.conditions = []
+        # the field and values of the condition the filter is indexed by, if any
+        self.field = None
+        self.values = None
+
+        for field, condition in where.items():
+            if fields is not None and field not in fields:
+                raise ValueError('Can not filter on unknown keyword "{}"'.format(field))
+
+            if isinstance(condition, (set, frozenset)):
+                test, operand = _contains, frozenset(condition)
+                values = operand
+            elif isinstance(condition, tuple):
+                if len(condition) != 2 or condition[0] not in OPERATORS:
+                    raise ValueError('Conditions must be (operator, operand) with an operator '
+                                     'of {}'.format(tuple(OPERATORS)))
+                test, operand = OPERATORS[condition[0]], condition[1]
+                values = None
+                if condition[0] == '==':
+                    values = _hashable((operand,))
+                elif condition[0] == 'in' and isinstance(operand, _INDEXABLE):
+                    # strings and mappings test substrings and keys, which are not their
+                    # members as a set
+                    values = _hashable(operand)
+            else:
+                test, operand = operator.eq, condition
+                values = _hashable((operand,))
+
+            if values is not None and self.values is None:
+                self.field, self.values = field, values
+            else:
+                self.conditions.append((field, test, operand))
+
+    def __call__(self, kwargs):
+        '''
+        :Returns: ``True`` if ``kwargs`` meet every condition
+        '''
+        if self.field is not None:
+            try:
+                if kwargs[self.field] not in self.values:
+                    return False
+            except (TypeError, KeyError):
+                return False
+        return self.matches_rest(kwargs)
+
+    def matches_rest(self, kwargs):
+        '''
+        :Returns: ``True`` if ``kwargs`` meet every condition but the indexed one
+        '''
+        for field, test, operand in self.conditions:
+            try:
+                if not test(kwargs[field], operand):
+                    return False
+            except (TypeError, KeyError):
+                # values that can not be compared do not match
+                return False
+        return True
+
+
+class FilterIndex:
+    '''
+    The filters of the callbacks of a signal, indexed by the values of their equality and
+    membership conditions.
+    '''
+
+    def __init__(self):
+        self._filters = {}
+        # field -> value -> receivers whose filter is indexed under that value
+        self._by_value = {}
+        self._unindexed = set()
+
+    def __len__(self):
+        '''
+        The number of filtered receivers
+        '''
+        return len(self._filters)
+
+    def add(self, receiver, filter_):
+        '''
+        Sets the filter of ``receiver``, replacing the one it had.
+        '''
+        self.discard(receiver)
+        self._filters[receiver] = filter_
+        if filter_.field is None:
+            self._unindexed.add(receiver)
+            return
+        by_value = self._by_value.setdefault(filter_.field, {})
+        for value in filter_.values:
+            by_value.setdefault(value, set()).add(receiver)
+
+    def discard(self, receiver):
+        '''
+        Removes the filter of ``receiver``, if it has one.
+        '''
+        filter_ = self._filters.pop(receiver, None)
+        if filter_ is None:
+            return
+        if filter_.field is None:
+            self._unindexed.discard(receiver)
+            return
+        by_value = self._by_value[filter_.field]
+        for value in filter_.values:
+            receivers = by_value[value]
+            receivers.discard(receiver)
+            if not receivers:
+                del by_value[value]
+        if not by_value:
+            del self._by_value[filter_.field]
+
+    def match(self, kwargs):
+        '''
+        :Returns: the :class:`set` of filtered receivers whose filter ``kwargs`` meet
+        '''
+        matched = set()
+        for field, by_value in self._by_value.items():
+            try:
+                receivers = by_value.get(kwargs[field])
+            except (TypeError, KeyError):
+                continue
+            if receivers:
+                for receiver in receivers:
+                    if self._filters[receiver].matches_rest(kwargs):
+                        matched.add(receiver)
+        for receiver in self._unindexed:
+            if self._filters[receiver](kwargs):
+                matched.add(receiver)
+        return matched
+
+
+def _hashable(values):
+    # the operands of an indexed condition, or None if they can not be indexed
+    try:
+        return frozenset(values)
+    except TypeError:
+        return None
@@ -0,0 +1,155 @@
+'''
+A signal that spreads its callbacks across several event loops
+'''
+import asyncio
+import os
+import threading
+
+from .dispatcher import Signal
+
+
+# Fibonacci hashing, see shard_of()
+_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK = (1 << 64) - 1
+
+
+class ShardedSignal:
+    '''
+    A :class:`asyncio_dispatch.ShardedSignal` owns one event loop per shard, each running in its
+    own thread, and one :class:`asyncio_dispatch.Signal` per loop. Every callback is pinned to a
+    shard when it is connected, so all of its calls run on the same loop and in the order the
+    events were sent. Sending hands the event to every shard with
+    :meth:`asyncio_dispatch.Signal.send_threadsafe`, so a burst of sends costs each shard a
+    single wakeup and its callbacks are resolved and scheduled in one batch.
+
+    Callbacks receive the :class:`asyncio_dispatch.Signal` of their shard as ``signal``.
+
+    Coroutine callbacks run concurrently with the other callbacks of their shard. Synchronous
+    callbacks of different shards run in different threads but, unless they release the GIL,
+    not in parallel; combine shards with an ``executor`` for those.
+    '''
+
+    def __init__(self, shards=None, cache_size=128, max_in_flight=None, overflow='wait',
+                 executor=None, **kwargs):
+        '''
+        :param int shards: the number of event loop threads. If ``None``, the number of CPUs is
+            used.
+        :param int cache_size: see :class:`asyncio_dispatch.Signal`. Applies to every shard.
+        :param int max_in_flight: see :class:`asyncio_dispatch.Signal`. Applies to every shard
+            separately.
+        :param str overflow: see :class:`asyncio_dispatch.Signal`
+        :param concurrent.futures.Executor executor: see :class:`asyncio_dispatch.Signal`
+        :param dict kwargs: Keyword arguments and their default values, as for
+            :class:`asyncio_dispatch.Signal`.
+        '''
+        if shards is None:
+            shards = os.cpu_count() or 1
+        if shards < 1:
+            raise ValueError('shards must be at least 1')
+
+        self._loops = []
+        self._threads = []
+        self._signals = []
+        for index in range(shards):
+            loop = asyncio.new_event_loop()
+            self._signals.append(Signal(loop=loop, cache_size=cache_size,
+                                        max_in_flight=max_in_flight, overflow=overflow,
+                                        executor=executor, **kwargs))
+            thread = threading.Thread(target=loop.run_forever, daemon=True,
+                                      name='asyncio_dispatch-shard-{}'.format(index))
+            thread.start()
+            self._loops.append(loop)
+            self._threads.append(thread)
+
+    def __len__(self):
+        return len(self._signals)
+
+    @property
+    def signals(self):
+        '''
+        The :class:`asyncio_dispatch.Signal` of every shard
+        '''
+        return list(self._signals)
+
+    def shard_of(self, callback):
+        '''
+        :Returns: the index of the shard ``callback`` is pinned to unless ``shard`` is passed
+            to :meth:`asyncio_dispatch.ShardedSignal.connect`
+        '''
+        # object ids are aligned to 16 bytes, their low bits are the same for every callback and
+        # a plain modulo would put all of them on the same shard
+        mixed = (hash(Signal._make_id(callback)) * _MULTIPLIER) & _MASK
+        return (mixed >> 32) % len(self._signals)
+
+    async def connect(self, callback, sender=None, senders=None, key=None, keys=None, weak=True,
+                      max_in_flight=None, executor=None, debounce=None, throttle=None,
+                      leading=None, trailing=True, coalesce=False, priority=0, inline=False,
+                      pattern=None, patterns=None, where=None, shard=None):
+        '''
+        *This method is a coroutine.*
+
+        Connects ``callback`` on the :class:`asyncio_dispatch.Signal` of its shard. The
+        arguments are the same as for :meth:`asyncio_dispatch.Signal.connect`. Debouncing,
+        throttling, coalescing and priorities apply among the sends seen by that shard, which
+        are all the sends of the sharded signal.
+
+        :param int shard: the index of the shard to pin ``callback`` to. If ``None``,
+            :meth:`asyncio_dispatch.ShardedSignal.shard_of` picks it.
+        '''
+        if shard is None:
+            shard = self.shard_of(callback)
+        await self._run(shard, self._signals[shard].connect(
+            callback, sender=sender, senders=senders, key=key, keys=keys, weak=weak,
+            max_in_flight=max_in_flight, executor=executor, debounce=debounce,
+            throttle=throttle, leading=leading, trailing=trailing, coalesce=coalesce,
+            priority=priority, inline=inline, pattern=pattern, patterns=patterns, where=where))
+
+    async def disconnect(self, callback=None, sender=None, senders=None, key=None, keys=None,
+                         weak=True, pattern=None, patterns=None):
+        '''
+        *This method is a coroutine.*
+
+        Disconnects callbacks from every shard. The arguments are the same as for
+        :meth:`asyncio_dispatch.Signal.disconnect`.
+        '''
+        await asyncio.gather(*[
+            self._run(shard, signal.disconnect(callback=callback, sender=sender,
+                                               senders=senders, key=key, keys=keys, weak=weak,
+                                               pattern=pattern, patterns=patterns))
+            for shard, signal in enumerate(self._signals)])
+
+    async def send(self, sender=None, senders=None, key=None, keys=None, **kwargs):
+        '''
+        *This method is a coroutine.*
+
+        Sends the signal to every shard. The arguments are the same as for
+        :meth:`asyncio_dispatch.Signal.send`. Callbacks are resolved by the shards, so the
+        number of callbacks is not known when this returns.
+        '''
+        self.send_threadsafe(sender=sender, senders=senders, key=key, keys=keys, **kwargs)
+
+    def send_threadsafe(self, sender=None, senders=None, key=None, keys=None, **kwargs):
+        '''
+        Sends the signal to every shard from any thread, see
+        :meth:`asyncio_dispatch.Signal.send_threadsafe`.
+        '''
+        for signal in self._signals:
+            signal.send_threadsafe(sender=sender, senders=senders, key=key, keys=keys,
+                                   **kwargs)
+
+    def close(self):
+        '''
+        Stops the event loops of the shards and waits for their threads to finish. Callbacks
+        that have not run yet are discarded.
+        '''
+        for loop in self._loops:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(loop.stop)
+        for thread in self._threads:
+            thread.join()
+        for loop in self._loops:
+            loop.close()
+
+    def _run(self, shard, coro):
+        # the registry of a shard may only be touched from the thread running its loop
+        return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loops[shard]))
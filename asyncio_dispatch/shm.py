@@ -0,0 +1,385 @@
+'''
+A shared memory transport that fans the events of a :class:`asyncio_dispatch.Signal` out to
+other processes on the same machine
+
+A :class:`asyncio_dispatch.shm.RingPublisher` appends every event sent with its signal to a ring
+buffer in :mod:`multiprocessing.shared_memory`. Any number of
+:class:`asyncio_dispatch.shm.RingSubscriber` instances, up to ``max_consumers``, read the ring
+in place and dispatch the events to the callbacks of their own signal, just like the events
+received by a bridge, see :mod:`asyncio_dispatch.bridge`: ``senders`` are not carried and a
+received event reaches the callbacks connected to its ``keys`` and the callbacks connected
+without filters.
+
+The publisher never waits for subscribers. A subscriber that falls so far behind that the
+publisher starts to overwrite the events it has not read skips to the newest event and counts
+an overrun. Before it writes an event the publisher announces the end of the bytes it is about
+to write, so a subscriber can tell that a record it read may have been overwritten meanwhile.
+
+A subscriber that has caught up sleeps until the publisher wakes it with a datagram on a Unix
+socket. The publisher only sends one if the subscriber announced that it is about to sleep, at
+most once per iteration of its event loop, and the subscriber polls every ``poll_interval``
+seconds in case a wakeup was missed.
+
+Events are pickled. An event sent with the signal that can not be pickled or does not fit in
+the ring is counted in :attr:`asyncio_dispatch.shm.RingPublisher.dropped` and passed to the
+exception handler of the loop, its local callbacks still run. Only share a ring between
+processes that trust each other.
+'''
+import os
+import pickle
+import socket
+import struct
+import tempfile
+from multiprocessing import shared_memory
+
+
+_MAGIC = 0x41445352
+
+# magic, max_consumers, capacity, write_pos, write_seq, write_end
+_HEADER = struct.Struct('=IIQQQQ')
+_HEADER_SIZE = 64
+_WRITE_POS = 16
+_WRITE_SEQ = 24
+_WRITE_END = 32
+
+# read_pos, read_seq, wait_seq, active
+_SLOT = struct.Struct('=QQQQ')
+_READ_POS = 0
+_READ_SEQ = 8
+_WAIT_SEQ = 16
+_ACTIVE = 24
+
+_U32 = struct.Struct('=I')
+_U64 = struct.Struct('=Q')
+_WRAP = 0xFFFFFFFF
+
+# the blocks created by publishers of this process
+_published = set()
+
+
+def _align(size):
+    return (size + 7) & ~7
+
+
+def _wakeup_path(name, consumer):
+    return os.path.join(tempfile.gettempdir(), '{}-{}.sock'.format(name.lstrip('/'), consumer))
+
+
+class _Ring:
+    # the layout shared by the publisher and the subscribers
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.buf = memory.buf
+        magic, self.max_consumers, self.capacity, _, _, _ = _HEADER.unpack_from(self.buf, 0)
+        if magic != _MAGIC:
+            raise ValueError('{!r} is not a ring buffer'.format(memory.name))
+        self.data = _HEADER_SIZE + _SLOT.size * self.max_consumers
+
+    def get(self, offset):
+        return _U64.unpack_from(self.buf, offset)[0]
+
+    def put(self, offset, value):
+        _U64.pack_into(self.buf, offset, value)
+
+    def slot(self, consumer):
+        if not 0 <= consumer < self.max_consumers:
+            raise ValueError('consumer must be between 0 and {}'.format(self.max_consumers - 1))
+        return _HEADER_SIZE + _SLOT.size * consumer
+
+
+class RingPublisher:
+    '''
+    Publishes the events sent with a :class:`asyncio_dispatch.Signal` into a shared memory ring
+    buffer.
+    '''
+
+    def __init__(self, signal, name=None, size=1 << 20, max_consumers=8):
+        '''
+        :param asyncio_dispatch.Signal signal: the signal whose events are published
+        :param str name: the name of the shared memory block. If ``None``, a unique name is
+            generated. Subscribers attach by this name, see
+            :attr:`asyncio_dispatch.shm.RingPublisher.name`.
+        :param int size: the number of bytes available for events
+        :param int max_consumers: the number of subscribers that can attach at the same time
+        '''
+        if size < 64 or size % 8:
+            raise ValueError('size must be a multiple of 8 and at least 64')
+        if max_consumers < 1:
+            raise ValueError('max_consumers must be at least 1')
+
+        memory = shared_memory.SharedMemory(
+            name=name, create=True, size=_HEADER_SIZE + _SLOT.size * max_consumers + size)
+        _published.add(memory._name)
+        _HEADER.pack_into(memory.buf, 0, _MAGIC, max_consumers, size, 0, 0, 0)
+        for consumer in range(max_consumers):
+            _SLOT.pack_into(memory.buf, _HEADER_SIZE + _SLOT.size * consumer, 0, 0, 0, 0)
+
+        self.signal = signal
+        self.dropped = 0
+        self._loop = signal._loop
+        self._ring = _Ring(memory)
+        self._write_pos = 0
+        self._write_seq = 0
+        self._woken = [0] * max_consumers
+        self._wakeup_scheduled = False
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        signal.add_tap(self._on_send)
+
+    @property
+    def name(self):
+        '''
+        The name of the shared memory block
+        '''
+        return self._ring.memory.name
+
+    def publish(self, keys, kwargs):
+        '''
+        Appends an event to the ring. Events sent with the signal are published automatically.
+
+        :param keys: the ``keys`` of the event
+        :param dict kwargs: the keyword arguments of the event
+        '''
+        payload = pickle.dumps((tuple(keys), kwargs), pickle.HIGHEST_PROTOCOL)
+        ring = self._ring
+        size = _align(_U32.size + len(payload))
+        if size > ring.capacity:
+            raise ValueError('Event of {} bytes does not fit in the ring'.format(len(payload)))
+
+        offset = self._write_pos % ring.capacity
+        end = self._write_pos + size
+        if offset + size > ring.capacity:
+            end += ring.capacity - offset
+        # subscribers distrust what they read up to a lap before write_end, so it is stored
+        # before any byte is written
+        ring.put(_WRITE_END, end)
+        if offset + size > ring.capacity:
+            # records never wrap, the rest of this lap is skipped
+            _U32.pack_into(ring.buf, ring.data + offset, _WRAP)
+            self._write_pos += ring.capacity - offset
+            offset = 0
+
+        start = ring.data + offset
+        _U32.pack_into(ring.buf, start, len(payload))
+        ring.buf[start + _U32.size:start + _U32.size + len(payload)] = payload
+        self._write_pos += size
+        self._write_seq += 1
+        # subscribers trust everything before write_pos, so it is stored last
+        ring.put(_WRITE_SEQ, self._write_seq)
+        ring.put(_WRITE_POS, self._write_pos)
+
+        if not self._wakeup_scheduled:
+            self._wakeup_scheduled = True
+            self._loop.call_soon(self._wake_subscribers)
+
+    def lags(self):
+        '''
+        :Returns: a dict that maps the index of every attached subscriber to the number of
+            published events it has not read yet
+        '''
+        ring = self._ring
+        lags = {}
+        for consumer in range(ring.max_consumers):
+            slot = ring.slot(consumer)
+            if ring.get(slot + _ACTIVE):
+                lags[consumer] = self._write_seq - ring.get(slot + _READ_SEQ)
+        return lags
+
+    def close(self):
+        '''
+        Stops publishing and destroys the shared memory block.
+        '''
+        if self._ring is None:
+            return
+        self.signal.remove_tap(self._on_send)
+        self._socket.close()
+        memory, self._ring = self._ring.memory, None
+        memory.close()
+        memory.unlink()
+        _published.discard(memory._name)
+
+    def _on_send(self, senders, keys, kwargs):
+        try:
+            self.publish(keys, kwargs)
+        except Exception as exc:
+            self.dropped += 1
+            self._loop.call_exception_handler({
+                'message': 'Event could not be published to {!r}'.format(self.name),
+                'exception': exc,
+            })
+
+    def _wake_subscribers(self):
+        self._wakeup_scheduled = False
+        ring = self._ring
+        if ring is None:
+            return
+        for consumer in range(ring.max_consumers):
+            slot = ring.slot(consumer)
+            if not ring.get(slot + _ACTIVE):
+                continue
+            wait_seq = ring.get(slot + _WAIT_SEQ)
+            if wait_seq == self._woken[consumer]:
+                continue
+            self._woken[consumer] = wait_seq
+            try:
+                self._socket.sendto(b'\0', _wakeup_path(self.name, consumer))
+            except OSError:
+                # the subscriber is gone or has wakeups pending already
+                pass
+
+
+class RingSubscriber:
+    '''
+    Reads the events of a :class:`asyncio_dispatch.shm.RingPublisher` and dispatches them to the
+    callbacks of a :class:`asyncio_dispatch.Signal`. Only events published after it attached
+    are read.
+    '''
+
+    def __init__(self, signal, name, consumer, poll_interval=0.1):
+        '''
+        :param asyncio_dispatch.Signal signal: the signal events are dispatched to
+        :param str name: the name of the publisher's shared memory block
+        :param int consumer: the slot of this subscriber, between ``0`` and ``max_consumers - 1``
+            of the publisher. Every attached subscriber needs its own slot.
+        :param float poll_interval: the number of seconds after which an idle subscriber checks
+            for events without being woken up
+        '''
+        try:
+            memory = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # before Python 3.13 every attached block is unlinked by the resource tracker when
+            # this process exits
+            from multiprocessing import resource_tracker
+            memory = shared_memory.SharedMemory(name=name)
+            if memory._name not in _published:
+                resource_tracker.unregister(memory._name, 'shared_memory')
+
+        self.signal = signal
+        self.consumer = consumer
+        self.overruns = 0
+        self._loop = signal._loop
+        self._ring = ring = _Ring(memory)
+        self._slot = ring.slot(consumer)
+        if ring.get(self._slot + _ACTIVE):
+            memory.close()
+            raise ValueError('consumer {} is attached already'.format(consumer))
+
+        self._read_pos = ring.get(_WRITE_POS)
+        self._read_seq = ring.get(_WRITE_SEQ)
+        self._wait_seq = ring.get(self._slot + _WAIT_SEQ)
+        ring.put(self._slot + _READ_POS, self._read_pos)
+        ring.put(self._slot + _READ_SEQ, self._read_seq)
+        ring.put(self._slot + _ACTIVE, 1)
+
+        self._path = _wakeup_path(name, consumer)
+        try:
+            os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self._path)
+        self._socket.setblocking(False)
+        self._poll_interval = poll_interval
+        self._loop.add_reader(self._socket.fileno(), self._on_wakeup)
+        self._poll_handle = self._loop.call_soon(self._poll)
+
+    @property
+    def lag(self):
+        '''
+        The number of published events this subscriber has not read yet
+        '''
+        return self._ring.get(_WRITE_SEQ) - self._read_seq
+
+    def read(self):
+        '''
+        Dispatches every event published since the last read. This happens automatically when
+        the publisher wakes the subscriber up or every ``poll_interval`` seconds.
+
+        :Returns: the number of events read
+        '''
+        ring = self._ring
+        count = 0
+        while True:
+            write_pos = ring.get(_WRITE_POS)
+            if self._lapped():
+                self._overrun(write_pos)
+                continue
+            if self._read_pos == write_pos:
+                return count
+
+            offset = self._read_pos % ring.capacity
+            start = ring.data + offset
+            length = _U32.unpack_from(ring.buf, start)[0]
+            keys = None
+            if length != _WRAP:
+                try:
+                    keys, kwargs = pickle.loads(
+                        ring.buf[start + _U32.size:start + _U32.size + length])
+                except Exception:
+                    pass
+            # the publisher may have started to overwrite the record while it was read
+            if self._lapped():
+                self._overrun(ring.get(_WRITE_POS))
+                continue
+            if length == _WRAP:
+                self._read_pos += ring.capacity - offset
+                continue
+            if keys is None:
+                raise ValueError('Corrupt record at {}'.format(self._read_pos))
+
+            self._read_pos += _align(_U32.size + length)
+            self._read_seq += 1
+            ring.put(self._slot + _READ_POS, self._read_pos)
+            ring.put(self._slot + _READ_SEQ, self._read_seq)
+            self.signal._receive(keys, kwargs)
+            count += 1
+
+    def close(self):
+        '''
+        Detaches from the ring buffer.
+        '''
+        if self._ring is None:
+            return
+        self._loop.remove_reader(self._socket.fileno())
+        self._poll_handle.cancel()
+        self._socket.close()
+        try:
+            os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+        ring, self._ring = self._ring, None
+        ring.put(self._slot + _ACTIVE, 0)
+        ring.memory.close()
+
+    def _lapped(self):
+        # whether the publisher has written, or is writing, over the record at read_pos
+        return self._ring.get(_WRITE_END) - self._read_pos > self._ring.capacity
+
+    def _overrun(self, write_pos):
+        self.overruns += 1
+        self._read_pos = write_pos
+        self._read_seq = self._ring.get(_WRITE_SEQ)
+
+    def _sleep(self):
+        # announce the sleep first, then look again so an event published in between is not
+        # missed
+        self._wait_seq += 1
+        self._ring.put(self._slot + _WAIT_SEQ, self._wait_seq)
+        return self.read()
+
+    def _on_wakeup(self):
+        try:
+            while True:
+                self._socket.recv(16)
+        except BlockingIOError:
+            pass
+        self.read()
+        while self._sleep():
+            pass
+
+    def _poll(self):
+        self.read()
+        while self._sleep():
+            pass
+        self._poll_handle = self._loop.call_later(self._poll_interval, self._poll)
@@ -0,0 +1,284 @@
+import unittest
+import asyncio
+import os
+import tempfile
+
+from .helpers import FunctionMock
+from ..bridge import UnixBus, TcpBridge
+from ..dispatcher import Signal
+
+
+class TestUnixBus(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'bus.sock')
+
+    def run_until(self, condition):
+        async def wait():
+            while not condition():
+                await asyncio.sleep(0.001)
+        self.loop.run_until_complete(asyncio.wait_for(wait(), 5))
+
+    def make_bus(self, serve=False):
+        signal = Signal(loop=self.loop, value=None)
+        bus = UnixBus(signal)
+        if serve:
+            self.loop.run_until_complete(bus.serve(self.path))
+        else:
+            self.loop.run_until_complete(bus.connect(self.path))
+        self.addCleanup(self.loop.run_until_complete, bus.close())
+        return signal, bus
+
+    def test_interest(self):
+        hub_signal, hub = self.make_bus(serve=True)
+        signal_x, bus_x = self.make_bus()
+        signal_y, bus_y = self.make_bus()
+        self.run_until(lambda: hub.peers == 2)
+
+        callback_x = FunctionMock()
+        callback_y = FunctionMock()
+        self.loop.run_until_complete(signal_x.connect(callback_x, key='x'))
+        self.loop.run_until_complete(signal_y.connect(callback_y, key='y'))
+        # x learns through the hub that y wants 'y'
+        self.run_until(lambda: bus_x._links[0].keys == {'y'})
+
+        self.loop.run_until_complete(hub_signal.send(key='x', value=1))
+        self.loop.run_until_complete(signal_x.send(key='y', value=2))
+        self.run_until(lambda: callback_x.called and callback_y.called)
+
+        _, kwargs = callback_x.call_args
+        self.assertEqual((kwargs['keys'], kwargs['value']), ({'x'}, 1))
+        _, kwargs = callback_y.call_args
+        self.assertEqual((kwargs['keys'], kwargs['value']), ({'y'}, 2))
+
+        # nothing wants 'z' or events without keys, so they never leave the process
+        sent = [link.messages_sent for link in hub._links]
+        self.loop.run_until_complete(hub_signal.send(key='z'))
+        self.loop.run_until_complete(hub_signal.send())
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertEqual([link.messages_sent for link in hub._links], sent)
+        self.assertEqual(callback_x.call_count, 1)
+        self.assertEqual(callback_y.call_count, 1)
+
+    def test_batched_frames(self):
+        hub_signal, hub = self.make_bus(serve=True)
+        signal, bus = self.make_bus()
+        self.run_until(lambda: hub.peers == 1)
+
+        values = []
+
+        def callback(**kwargs):
+            values.append(kwargs['value'])
+
+        self.loop.run_until_complete(signal.connect(callback))
+        self.run_until(lambda: hub._links[0].all)
+
+        link = hub._links[0]
+        frames = link.frames_sent
+
+        async def burst():
+            for value in range(100):
+                hub_signal.send_nowait(value=value)
+
+        self.loop.run_until_complete(burst())
+        self.run_until(lambda: len(values) == 100)
+        self.assertEqual(values, list(range(100)))
+        self.assertEqual(link.frames_sent, frames + 1)
+
+    def test_unpicklable(self):
+        hub_signal, hub = self.make_bus(serve=True)
+        signal, bus = self.make_bus()
+        errors = []
+        self.loop.set_exception_handler(lambda loop, context: errors.append(context))
+
+        values = []
+        local = []
+
+        def callback(**kwargs):
+            values.append(kwargs['value'])
+
+        def local_callback(**kwargs):
+            local.append(kwargs['value'])
+
+        self.loop.run_until_complete(signal.connect(callback))
+        self.loop.run_until_complete(hub_signal.connect(local_callback))
+        self.run_until(lambda: hub.peers == 1 and hub._links[0].all)
+
+        async def burst():
+            hub_signal.send_nowait(value=1)
+            hub_signal.send_nowait(value=lambda: None)
+            hub_signal.send_nowait(value=3)
+
+        self.loop.run_until_complete(burst())
+        self.run_until(lambda: len(values) == 2)
+        self.assertEqual(values, [1, 3])
+        self.assertEqual(len(local), 3)
+        self.assertEqual(hub.dropped, 1)
+        self.assertEqual(len(errors), 1)
+
+    def test_disconnect_withdraws_interest(self):
+        hub_signal, hub = self.make_bus(serve=True)
+        signal, bus = self.make_bus()
+        callback = FunctionMock()
+
+        self.loop.run_until_complete(signal.connect(callback, key='x'))
+        self.run_until(lambda: hub.peers == 1 and hub._links[0].keys == {'x'})
+
+        self.loop.run_until_complete(signal.disconnect(callback, key='x'))
+        self.run_until(lambda: hub._links[0].keys == frozenset())
+
+        self.loop.run_until_complete(bus.close())
+        self.run_until(lambda: hub.peers == 0)
+
+
+class TestTcpBridge(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def run_until(self, condition):
+        async def wait():
+            while not condition():
+                await asyncio.sleep(0.001)
+        self.loop.run_until_complete(asyncio.wait_for(wait(), 5))
+
+    def make_bridge(self, secret=b'secret', **kwargs):
+        signal = Signal(loop=self.loop, value=None)
+        bridge = TcpBridge(signal, secret, **kwargs)
+        self.addCleanup(self.loop.run_until_complete, bridge.close())
+        return signal, bridge
+
+    def serve(self, **kwargs):
+        signal, bridge = self.make_bridge(**kwargs)
+        addresses = self.loop.run_until_complete(bridge.serve('127.0.0.1', 0))
+        return signal, bridge, addresses[0][1]
+
+    def test_flush_interval(self):
+        hub_signal, hub, port = self.serve(flush_interval=0.05)
+        signal, bridge = self.make_bridge()
+        self.loop.run_until_complete(bridge.connect('127.0.0.1', port))
+
+        values = []
+
+        def callback(**kwargs):
+            values.append(kwargs['value'])
+
+        self.loop.run_until_complete(signal.connect(callback, key='key'))
+        self.run_until(lambda: hub.peers == 1 and hub._links[0].keys == {'key'})
+        link = hub._links[0]
+        link.flush()
+        frames = link.frames_sent
+
+        async def send():
+            # spread over several iterations of the loop, but within one flush interval
+            for value in range(10):
+                await hub_signal.send(key='key', value=value)
+                await asyncio.sleep(0)
+
+        self.loop.run_until_complete(send())
+        self.run_until(lambda: len(values) == 10)
+        self.assertEqual(values, list(range(10)))
+        self.assertEqual(link.frames_sent, frames + 1)
+
+    def test_reconnect(self):
+        hub_signal, hub, port = self.serve()
+        signal, bridge = self.make_bridge(retry_interval=0.01)
+        callback = FunctionMock()
+
+        self.loop.run_until_complete(signal.connect(callback, key='key'))
+        self.loop.run_until_complete(bridge.connect('127.0.0.1', port))
+        self.run_until(lambda: hub.peers == 1 and hub._links[0].keys == {'key'})
+
+        # the hub drops the connection and forgets the interest
+        hub._links[0].close()
+        self.run_until(lambda: bridge.reconnects == 1)
+        self.run_until(lambda: hub.peers == 1 and hub._links[0].keys == {'key'})
+
+        self.loop.run_until_complete(hub_signal.send(key='key', value=1))
+        self.run_until(lambda: callback.called)
+
+    def test_backpressure(self):
+        hub_signal, hub, port = self.serve(max_buffer=1024)
+        signal, bridge = self.make_bridge()
+        callback = FunctionMock()
+
+        self.loop.run_until_complete(signal.connect(callback))
+        self.loop.run_until_complete(bridge.connect('127.0.0.1', port))
+        self.run_until(lambda: hub.peers == 1 and hub._links[0].all)
+
+        transport = hub._links[0].writer.transport
+        transport.get_write_buffer_size = lambda: 2048
+        self.loop.run_until_complete(hub_signal.send(value=1))
+        self.assertEqual(hub.dropped, 1)
+
+        del transport.get_write_buffer_size
+        self.loop.run_until_complete(hub_signal.send(value=2))
+        self.loop.run_until_complete(hub.drain())
+        self.run_until(lambda: callback.called)
+        _, kwargs = callback.call_args
+        self.assertEqual(kwargs['value'], 2)
+        self.assertEqual(callback.call_count, 1)
+
+    def test_connect_refused(self):
+        signal, bridge = self.make_bridge()
+        _, hub, port = self.serve()
+        self.loop.run_until_complete(hub.close())
+        self.assertRaises(OSError, self.loop.run_until_complete, bridge.connect('127.0.0.1', port))
+
+    def test_default_host(self):
+        signal, bridge = self.make_bridge()
+        addresses = self.loop.run_until_complete(bridge.serve(port=0))
+        self.assertEqual([address[0] for address in addresses], ['127.0.0.1'])
+
+    def test_wrong_secret(self):
+        hub_signal, hub, port = self.serve()
+        signal, bridge = self.make_bridge(secret='other')
+        self.assertRaises(ValueError, self.loop.run_until_complete,
+                          bridge.connect('127.0.0.1', port))
+        self.run_until(lambda: hub.rejected == 1)
+        self.assertEqual(hub.peers, 0)
+        self.assertRaises(ValueError, TcpBridge, signal, b'')
+
+    def test_unauthenticated_frame(self):
+        hub_signal, hub, port = self.serve(handshake_timeout=0.05)
+
+        async def intrude():
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            # a frame instead of the handshake is never unpickled
+            writer.write(b'\x00\x00\x00\x04' + b'junk')
+            await reader.read()
+            writer.close()
+
+        self.loop.run_until_complete(asyncio.wait_for(intrude(), 5))
+        self.assertEqual(hub.rejected, 1)
+        self.assertEqual(hub.peers, 0)
+
+    def test_max_frame(self):
+        errors = []
+        self.loop.set_exception_handler(lambda loop, context: errors.append(context))
+        hub_signal, hub, port = self.serve(max_frame=1024)
+        signal, bridge = self.make_bridge(max_frame=1 << 20)
+        callback = FunctionMock()
+
+        self.loop.run_until_complete(signal.connect(callback, key='key'))
+        self.loop.run_until_complete(bridge.connect('127.0.0.1', port))
+        self.run_until(lambda: hub.peers == 1 and hub._links[0].keys == {'key'})
+
+        # too large to be sent by the hub
+        self.loop.run_until_complete(hub_signal.send(key='key', value='x' * 2048))
+        self.assertEqual(hub.dropped, 1)
+
+        # too large to be accepted by the hub, which disconnects the peer
+        hub_callback = FunctionMock()
+        self.loop.run_until_complete(hub_signal.connect(hub_callback))
+        self.run_until(lambda: bridge._links and bridge._links[0].all)
+        self.loop.run_until_complete(signal.send(value='x' * 2048))
+        self.run_until(lambda: hub.peers == 0)
+        self.assertFalse(hub_callback.called)
+        self.assertFalse(callback.called)
+        self.assertEqual(len(errors), 2)
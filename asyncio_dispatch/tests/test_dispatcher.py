@@ -7,6 +7,8 @@ import unittest
 from unittest.mock import Mock
 import asyncio
 import gc
+import threading
+import weakref
 
 from .helpers import FunctionMock, CoroutineMock
 from ..dispatcher import Signal
@@ -82,7 +84,7 @@ class TestSignal(unittest.TestCase):
             callback.assert_called_with(signal=signal, senders=set(), keys=set())
             self.assertEqual(callback.call_count, 1)
 
-        tasks = [signal.disconnect(callbacks[0])]
+        tasks = [self.loop.create_task(signal.disconnect(callbacks[0]))]
         self.loop.run_until_complete(asyncio.wait(tasks))
 
         # Order is important
@@ -116,7 +118,7 @@ class TestSignal(unittest.TestCase):
         del(fn1)
         gc.collect()
 
-        # cleanup happens during disconnect and send only.
+        # cleanup is scheduled on the loop when the callback is collected
         tasks = [self.loop.create_task(signal.send())]
         self.loop.run_until_complete(asyncio.wait(tasks))
 
@@ -547,7 +549,7 @@ class TestSignal(unittest.TestCase):
         del(callback)
         gc.collect()
 
-        # tasks are pruned during a send
+        # dead callbacks are pruned on the next loop iteration
 
         tasks = [self.loop.create_task(signal.send(senders=[sender, sender2]))]
 
@@ -556,7 +558,6 @@ class TestSignal(unittest.TestCase):
             task.result()
 
         self.assertEqual(len(signal._by_senders), 0)
-        self.assertEqual(len(signal._locks_senders), 0)
 
     def test_weakref_keys(self):
         callback = FunctionMock()
@@ -575,7 +576,7 @@ class TestSignal(unittest.TestCase):
         del(callback)
         gc.collect()
 
-        # tasks are pruned during a send
+        # dead callbacks are pruned on the next loop iteration
 
         tasks = [self.loop.create_task(signal.send(keys=[key, key2]))]
 
@@ -584,7 +585,6 @@ class TestSignal(unittest.TestCase):
             task.result()
 
         self.assertEqual(len(signal._by_keys), 0)
-        self.assertEqual(len(signal._locks_keys), 0)
 
     def test_send_method(self):
 
@@ -658,8 +658,7 @@ class TestSignal(unittest.TestCase):
         class Test:
             call_count = 0
 
-            @asyncio.coroutine
-            def method(self, *args, **kwargs):
+            async def method(self, *args, **kwargs):
                 self.call_count += 1
 
         instance = Test()
@@ -772,8 +771,7 @@ class TestSignal(unittest.TestCase):
 
         class Test:
             @staticmethod
-            @asyncio.coroutine
-            def method(*args, **kwargs):
+            async def method(*args, **kwargs):
                 nonlocal count
                 count += 1
 
@@ -828,8 +826,7 @@ class TestSignal(unittest.TestCase):
             count = 0
 
             @classmethod
-            @asyncio.coroutine
-            def method(cls, *args, **kwargs):
+            async def method(cls, *args, **kwargs):
                 cls.count += 1
 
         callback = Test.method
@@ -850,6 +847,1295 @@ class TestSignal(unittest.TestCase):
 
         self.assertEqual(Test.count, 1)
 
+    def test_disconnect_reverse_index(self):
+        callback1 = FunctionMock()
+        callback2 = FunctionMock()
+        sender = object()
+        keys = ['key{}'.format(i) for i in range(1000)]
+
+        signal = Signal(loop=self.loop)
+        tasks = [self.loop.create_task(signal.connect(callback1, sender=sender, key='key1')),
+                 self.loop.create_task(signal.connect(callback1)),
+                 self.loop.create_task(signal.connect(callback2, keys=keys))]
+        self.loop.run_until_complete(asyncio.wait(tasks))
+
+        receiver = signal._receivers[weakref.ref(callback1)]
+        self.assertTrue(receiver.all)
+        self.assertEqual(receiver.keys, {'key1'})
+        self.assertEqual(len(receiver.sender_ids), 1)
+
+        # only the entries held by callback1 are replaced
+        untouched = signal._by_keys['key2']
+        self.loop.run_until_complete(signal.disconnect(callback1))
+
+        self.assertIs(signal._by_keys['key2'], untouched)
+        self.assertEqual(len(signal._all), 0)
+        self.assertEqual(len(signal._by_senders), 0)
+        self.assertEqual(len(signal._by_keys), 1000)
+        self.assertEqual(len(signal._receivers), 1)
+
+        # removing the last subscription forgets the receiver
+        self.loop.run_until_complete(signal.disconnect(callback2, keys=keys))
+        self.assertEqual(len(signal._by_keys), 0)
+        self.assertEqual(len(signal._receivers), 0)
+
+        # disconnecting an unknown callback is a no-op
+        self.loop.run_until_complete(signal.disconnect(callback2))
+
+    def test_connect_many(self):
+        callback1 = FunctionMock()
+        callback2 = FunctionMock()
+        callback3 = FunctionMock()
+        sender = object()
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect_many([
+            (callback1, None, ['key1', 'key2']),
+            (callback1, [sender], ['key3']),
+            (callback2, [sender], None),
+            (callback3, None, None),
+        ]))
+
+        # one receiver per callback
+        self.assertEqual(len(signal._receivers), 3)
+        self.assertEqual(len(signal._all), 1)
+        self.assertEqual(len(signal._by_senders), 1)
+        self.assertEqual(len(signal._by_keys), 3)
+
+        self.assertEqual(signal.send_nowait(key='key1'), 2)
+        self.assertEqual(signal.send_nowait(sender=sender), 3)
+        self.assertEqual(signal.send_nowait(keys=['key2', 'key3']), 2)
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        self.assertEqual(callback1.call_count, 3)
+        self.assertEqual(callback2.call_count, 1)
+        self.assertEqual(callback3.call_count, 3)
+
+    def test_disconnect_many(self):
+        callback1 = FunctionMock()
+        callback2 = FunctionMock()
+        callback3 = FunctionMock()
+        sender = object()
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect_many([
+            (callback1, None, ['key1', 'key2']),
+            (callback2, [sender], ['key1']),
+            (callback3, None, None),
+        ]))
+
+        self.loop.run_until_complete(signal.disconnect_many([
+            (callback1, None, ['key1']),
+            (callback2, None, None),
+            (callback3, None, None),
+            # unknown callbacks are ignored
+            (FunctionMock(), None, None),
+        ]))
+
+        self.assertEqual(len(signal._receivers), 1)
+        self.assertEqual(len(signal._all), 0)
+        self.assertEqual(len(signal._by_senders), 0)
+        self.assertEqual(list(signal._by_keys), ['key2'])
+
+        self.assertEqual(signal.send_nowait(key='key1', sender=sender), 0)
+        self.assertEqual(signal.send_nowait(key='key2'), 1)
+
+    def test_send_many(self):
+        calls = []
+
+        def callback(signal, senders, keys, price):
+            calls.append((keys, price))
+
+        coro_callback = CoroutineMock()
+        sender = object()
+
+        signal = Signal(loop=self.loop, price=0)
+        self.loop.run_until_complete(signal.connect_many([
+            (callback, None, ['a', 'b']),
+            (coro_callback, [sender], None),
+        ]))
+
+        counts = self.loop.run_until_complete(signal.send_many([
+            {'key': 'a', 'price': 1},
+            {'key': 'b'},
+            {'keys': ['a', 'b'], 'sender': sender, 'price': 3},
+            {'key': 'c', 'price': 4},
+            {'key': 'a', 'price': 5},
+        ]))
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        self.assertEqual(counts, [1, 1, 2, 0, 1])
+        self.assertEqual(calls, [({'a'}, 1), ({'b'}, 0), ({'a', 'b'}, 3), ({'a'}, 5)])
+        coro_callback.assert_called_once_with(signal=signal, senders={sender},
+                                              keys={'a', 'b'}, price=3)
+
+        # the burst shares resolutions
+        self.assertEqual(signal.cache_info().misses, 4)
+
+    def test_send_many_with_args_wrong(self):
+        signal = Signal(loop=self.loop, price=0)
+
+        coro = signal.send_many([{'price': 1}, {'wrong_arg': 2}])
+        self.assertRaises(ValueError, self.loop.run_until_complete, coro)
+
+    def test_send_many_exception(self):
+        exception_handler = Mock()
+        self.loop.set_exception_handler(exception_handler)
+
+        callback1 = FunctionMock()
+        callback1.side_effect = Exception('BOOM!')
+        callback2 = FunctionMock()
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect_many([(callback1, None, ['a']),
+                                                          (callback2, None, ['b'])]))
+
+        self.loop.run_until_complete(signal.send_many([{'key': 'a'}, {'key': 'b'}]))
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        # a failing callback does not prevent the rest of the burst from running
+        self.assertTrue(exception_handler.called)
+        self.assertEqual(callback2.call_count, 1)
+
+        self.loop.set_exception_handler(None)
+
+    def test_deliver(self):
+        def callback(**kwargs):
+            return 'sync'
+
+        async def coro_callback(**kwargs):
+            await asyncio.sleep(0)
+            return 'coro'
+
+        def failing_callback(**kwargs):
+            raise ValueError('BOOM!')
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect_many([(callback, None, None),
+                                                          (coro_callback, None, None),
+                                                          (failing_callback, None, None)]))
+
+        delivery = signal.deliver()
+        self.assertEqual(len(delivery), 3)
+        self.assertFalse(delivery.done())
+
+        results = self.loop.run_until_complete(delivery)
+        self.assertTrue(delivery.done())
+
+        results = dict(zip(delivery.callbacks, results))
+        self.assertEqual(results[callback], 'sync')
+        self.assertEqual(results[coro_callback], 'coro')
+        self.assertIsInstance(results[failing_callback], ValueError)
+
+    def test_deliver_drop(self):
+        release = asyncio.Event()
+
+        async def limited(**kwargs):
+            await release.wait()
+            return 'limited'
+
+        def first(**kwargs):
+            return 'first'
+
+        def second(**kwargs):
+            return 'second'
+
+        signal = Signal(loop=self.loop, overflow='drop')
+        self.loop.run_until_complete(signal.connect(limited, max_in_flight=1))
+        self.loop.run_until_complete(signal.connect_many([(first, None, None),
+                                                          (second, None, None)]))
+
+        pending = signal.deliver()
+        self.assertEqual(len(pending), 3)
+
+        # limited is at its limit, so the second delivery skips it
+        delivery = signal.deliver()
+        self.assertEqual(len(delivery), 2)
+        self.assertNotIn(limited, delivery.callbacks)
+
+        results = self.loop.run_until_complete(delivery)
+        self.assertEqual(len(results), len(delivery.callbacks))
+        self.assertEqual(dict(zip(delivery.callbacks, results)),
+                         {first: 'first', second: 'second'})
+
+        release.set()
+        results = dict(zip(pending.callbacks, self.loop.run_until_complete(pending)))
+        self.assertEqual(results, {limited: 'limited', first: 'first', second: 'second'})
+
+    def test_deliver_timeout(self):
+        started = []
+        finished = []
+
+        async def slow_callback(**kwargs):
+            started.append(True)
+            await asyncio.sleep(10)
+            finished.append(True)
+
+        def callback(**kwargs):
+            return 1
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect_many([(slow_callback, None, None),
+                                                          (callback, None, None)]))
+
+        delivery = signal.deliver()
+        self.assertRaises(asyncio.TimeoutError, self.loop.run_until_complete,
+                          delivery.wait(timeout=0.01))
+
+        # outstanding callbacks were cancelled
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertTrue(delivery.done())
+        self.assertEqual(started, [True])
+        self.assertEqual(finished, [])
+
+        results = dict(zip(delivery.callbacks, delivery.results()))
+        self.assertIsInstance(results[slow_callback], asyncio.CancelledError)
+        self.assertEqual(results[callback], 1)
+
+    def test_deliver_cancel(self):
+        callback = FunctionMock()
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect(callback))
+
+        delivery = signal.deliver()
+        self.assertRaises(asyncio.InvalidStateError, delivery.results)
+        self.assertEqual(delivery.cancel(), 1)
+
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertFalse(callback.called)
+        self.assertEqual(delivery.cancel(), 0)
+
+    def test_deliver_no_callbacks(self):
+        signal = Signal(loop=self.loop)
+        delivery = signal.deliver()
+
+        self.assertTrue(delivery.done())
+        self.assertEqual(self.loop.run_until_complete(delivery.wait(timeout=0)), [])
+
+    def test_max_in_flight_drop(self):
+        release = asyncio.Event()
+        calls = []
+
+        async def callback(**kwargs):
+            calls.append(kwargs)
+            await release.wait()
+
+        signal = Signal(loop=self.loop, max_in_flight=2, overflow='drop')
+        self.loop.run_until_complete(signal.connect(callback))
+
+        counts = [signal.send_nowait() for _ in range(3)]
+        self.assertEqual(counts, [1, 1, 0])
+        self.assertEqual(signal._dropped, 1)
+        self.assertEqual(signal._in_flight, 2)
+
+        release.set()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(signal._in_flight, 0)
+        self.assertEqual(signal.send_nowait(), 1)
+
+    def test_max_in_flight_raise(self):
+        from ..dispatcher import SignalFull
+        release = asyncio.Event()
+
+        async def callback(**kwargs):
+            await release.wait()
+
+        callback2 = FunctionMock()
+
+        signal = Signal(loop=self.loop, max_in_flight=2, overflow='raise')
+        self.loop.run_until_complete(signal.connect_many([(callback, None, None),
+                                                          (callback2, None, None)]))
+
+        self.assertEqual(signal.send_nowait(), 2)
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(signal._in_flight, 1)
+
+        # all or nothing, the synchronous callback is not scheduled either
+        callback2.reset_mock()
+        self.assertRaises(SignalFull, signal.send_nowait)
+        self.assertRaises(SignalFull, self.loop.run_until_complete, signal.send())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertFalse(callback2.called)
+
+        release.set()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(signal._in_flight, 0)
+
+    def test_max_in_flight_wait(self):
+        from ..dispatcher import SignalFull
+        running = []
+        peak = []
+
+        async def callback(**kwargs):
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0)
+            running.pop()
+
+        signal = Signal(loop=self.loop, max_in_flight=2)
+        self.loop.run_until_complete(signal.connect(callback))
+
+        async def burst():
+            return [await signal.send() for _ in range(10)]
+
+        self.assertEqual(self.loop.run_until_complete(burst()), [1] * 10)
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertEqual(len(peak), 10)
+        self.assertLessEqual(max(peak), 2)
+        self.assertEqual(signal._in_flight, 0)
+
+        # methods that can not suspend raise instead
+        release = asyncio.Event()
+
+        async def blocking(**kwargs):
+            await release.wait()
+
+        signal = Signal(loop=self.loop, max_in_flight=1)
+        self.loop.run_until_complete(signal.connect(blocking))
+        self.assertEqual(signal.send_nowait(), 1)
+        self.assertRaises(SignalFull, signal.send_nowait)
+        release.set()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+    def test_max_in_flight_per_receiver(self):
+        release = asyncio.Event()
+
+        async def limited(**kwargs):
+            await release.wait()
+
+        callback = FunctionMock()
+
+        signal = Signal(loop=self.loop, overflow='drop')
+        self.loop.run_until_complete(signal.connect(limited, max_in_flight=1))
+        self.loop.run_until_complete(signal.connect(callback))
+
+        self.assertEqual(signal.send_nowait(), 2)
+        self.assertEqual(signal.send_nowait(), 1)
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(callback.call_count, 2)
+
+        release.set()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(signal._get_receiver(limited, True).in_flight, 0)
+
+    def test_max_in_flight_wrong(self):
+        self.assertRaises(ValueError, Signal, loop=self.loop, overflow='block')
+        self.assertRaises(ValueError, Signal, loop=self.loop, max_in_flight=0)
+
+        signal = Signal(loop=self.loop)
+        self.assertRaises(ValueError, self.loop.run_until_complete,
+                          signal.connect(FunctionMock(), max_in_flight=0))
+
+    def test_tasks_strongly_referenced(self):
+        finished = []
+
+        async def callback(**kwargs):
+            await asyncio.sleep(0.01)
+            finished.append(True)
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect(callback))
+        signal.send_nowait()
+
+        self.assertEqual(len(signal._tasks), 1)
+        gc.collect()
+        self.loop.run_until_complete(asyncio.sleep(0.02))
+        self.assertEqual(finished, [True])
+        self.assertEqual(len(signal._tasks), 0)
+
+    def test_executor(self):
+        from ..executors import ThreadPool
+        pool = ThreadPool(max_workers=2)
+        self.addCleanup(pool.shutdown)
+        threads = []
+
+        def callback(**kwargs):
+            threads.append(threading.current_thread())
+            return kwargs['senders']
+
+        async def coroutine_callback(**kwargs):
+            threads.append(threading.current_thread())
+
+        signal = Signal(loop=self.loop, executor=pool)
+        self.loop.run_until_complete(signal.connect(callback))
+        self.loop.run_until_complete(signal.connect(coroutine_callback))
+
+        delivery = signal.deliver()
+        self.loop.run_until_complete(delivery.wait(timeout=1))
+
+        # only the synchronous callback left the loop thread
+        results = dict(zip(delivery.callbacks, delivery.results()))
+        self.assertEqual(results[callback], set())
+        self.assertEqual(len(threads), 2)
+        self.assertIn(threading.current_thread(), threads)
+        self.assertEqual(pool.pool_info().completed, 1)
+
+    def test_executor_per_connect(self):
+        from ..executors import ThreadPool
+        pool = ThreadPool(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        threads = {}
+
+        def blocking(**kwargs):
+            threads['blocking'] = threading.current_thread()
+
+        def callback(**kwargs):
+            threads['callback'] = threading.current_thread()
+
+        async def coroutine_callback(**kwargs):
+            pass
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect(blocking, executor=pool))
+        self.loop.run_until_complete(signal.connect(callback))
+        self.assertRaises(ValueError, self.loop.run_until_complete,
+                          signal.connect(coroutine_callback, executor=pool))
+
+        self.loop.run_until_complete(signal.deliver().wait(timeout=1))
+        self.assertIs(threads['callback'], threading.current_thread())
+        self.assertIsNot(threads['blocking'], threading.current_thread())
+
+    def test_executor_queue_bound(self):
+        from ..executors import ThreadPool
+        from ..dispatcher import SignalFull
+        release = threading.Event()
+        pool = ThreadPool(max_workers=1, max_queue=1)
+        self.addCleanup(pool.shutdown)
+        self.addCleanup(release.set)
+        calls = []
+
+        def callback(**kwargs):
+            release.wait(1)
+            calls.append(True)
+
+        signal = Signal(loop=self.loop, executor=pool, overflow='drop')
+        self.loop.run_until_complete(signal.connect(callback))
+
+        self.assertEqual(signal.send_nowait(), 1)
+        while pool.queue_depth:
+            release.wait(0.001)
+        self.assertEqual(signal.send_nowait(), 1)
+        self.assertEqual(signal.send_nowait(), 0)
+
+        signal._overflow = 'raise'
+        self.assertRaises(SignalFull, signal.send_nowait)
+
+        # under 'wait', send resumes once the queue has room again
+        signal._overflow = 'wait'
+        send = self.loop.create_task(signal.send())
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertFalse(send.done())
+
+        release.set()
+        self.assertEqual(self.loop.run_until_complete(asyncio.wait_for(send, 1)), 1)
+        while pool.pool_info().completed < 3:
+            self.loop.run_until_complete(asyncio.sleep(0.001))
+        self.assertEqual(len(calls), 3)
+
+    def test_send_threadsafe(self):
+        received = []
+
+        def callback(**kwargs):
+            received.append((kwargs['producer'], kwargs['value']))
+
+        signal = Signal(loop=self.loop, producer=None, value=None)
+        self.loop.run_until_complete(signal.connect(callback))
+
+        drains = []
+        drain = signal._drain_threadsafe
+
+        def counting_drain():
+            # only this drain swaps the list out, so once it has run the list holds exactly
+            # the batch it dispatched, including events appended after it was looked up
+            events = signal._threadsafe_events
+            drain()
+            drains.append(len(events))
+
+        signal._drain_threadsafe = counting_drain
+
+        def produce(producer):
+            for value in range(5000):
+                signal.send_threadsafe(producer=producer, value=value)
+
+        async def run():
+            threads = [threading.Thread(target=produce, args=(producer,))
+                       for producer in range(4)]
+            for thread in threads:
+                thread.start()
+            while any(thread.is_alive() for thread in threads):
+                await asyncio.sleep(0.001)
+            # one more iteration for the last drain and one for the callbacks it scheduled
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+
+        self.loop.run_until_complete(run())
+
+        self.assertEqual(len(received), 20000)
+        self.assertEqual(sum(drains), 20000)
+        self.assertLess(len(drains), 20000)
+        for producer in range(4):
+            values = [value for p, value in received if p == producer]
+            self.assertEqual(values, list(range(5000)))
+
+    def test_send_threadsafe_coalesced(self):
+        callback = FunctionMock()
+
+        signal = Signal(loop=self.loop, value=None)
+        self.loop.run_until_complete(signal.connect(callback))
+
+        def produce():
+            for value in range(100):
+                signal.send_threadsafe(value=value)
+
+        thread = threading.Thread(target=produce)
+        thread.start()
+        thread.join()
+        self.assertTrue(signal._drain_scheduled)
+
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(callback.call_count, 100)
+        self.assertFalse(signal._drain_scheduled)
+
+    def test_send_threadsafe_with_args_wrong(self):
+        signal = Signal(loop=self.loop, value=None)
+        self.assertRaises(ValueError, signal.send_threadsafe, other=1)
+        self.assertEqual(signal._threadsafe_events, [])
+
+    def test_send_threadsafe_full(self):
+        from ..dispatcher import SignalFull
+        release = asyncio.Event()
+        errors = []
+
+        async def callback(**kwargs):
+            await release.wait()
+
+        signal = Signal(loop=self.loop, max_in_flight=1, overflow='raise')
+        self.loop.run_until_complete(signal.connect(callback))
+
+        self.loop.set_exception_handler(lambda loop, context: errors.append(context))
+        self.addCleanup(self.loop.set_exception_handler, None)
+        signal.send_threadsafe()
+        signal.send_threadsafe()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0]['exception'], SignalFull)
+        release.set()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+    def test_no_self_pipe_write_on_loop(self):
+        callbacks = [FunctionMock() for _ in range(10)]
+
+        signal = Signal(loop=self.loop)
+        for callback in callbacks:
+            self.loop.run_until_complete(signal.connect(callback))
+
+        writes = []
+        write_to_self = self.loop._write_to_self
+        self.loop._write_to_self = lambda: writes.append(True)
+        self.addCleanup(setattr, self.loop, '_write_to_self', write_to_self)
+
+        async def send():
+            for _ in range(10):
+                await signal.send()
+                signal.send_nowait()
+                signal.deliver()
+                signal.send_threadsafe()
+
+        self.loop.run_until_complete(send())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(writes, [])
+        for callback in callbacks:
+            self.assertEqual(callback.call_count, 40)
+
+        # other threads still wake the loop up
+        thread = threading.Thread(target=signal.send_threadsafe)
+        thread.start()
+        thread.join()
+        self.assertEqual(writes, [True])
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+    def test_taps_and_listeners(self):
+        callback = FunctionMock()
+        tapped = []
+        changes = []
+
+        signal = Signal(loop=self.loop, value=None)
+        signal.add_tap(lambda senders, keys, kwargs: tapped.append((keys, kwargs)))
+        signal.add_listener(lambda signal: changes.append(signal.interest()))
+
+        async def connect():
+            await signal.connect(callback, key='x')
+            await signal.connect(callback, key='y')
+
+        self.loop.run_until_complete(connect())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        # both changes are reported at once
+        self.assertEqual(changes, [(False, {'x', 'y'})])
+
+        signal.send_nowait(key='x', value=1)
+        self.loop.run_until_complete(signal.send_many([{'value': 2}]))
+        self.assertEqual(tapped, [({'x'}, {'value': 1}), (set(), {'value': 2})])
+
+        # received events are dispatched but not tapped again
+        self.assertEqual(signal._receive({'y'}, {'value': 3}), 1)
+        self.assertEqual(len(tapped), 2)
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(callback.call_count, 2)
+
+    def test_debounce(self):
+        values = []
+
+        def callback(**kwargs):
+            values.append(kwargs['value'])
+
+        signal = Signal(loop=self.loop, value=None)
+        self.loop.run_until_complete(signal.connect(callback, debounce=0.02))
+
+        async def burst():
+            for value in range(5):
+                await signal.send(value=value)
+                await asyncio.sleep(0.005)
+
+        self.loop.run_until_complete(burst())
+        self.assertEqual(values, [])
+        self.loop.run_until_complete(asyncio.sleep(0.03))
+        self.assertEqual(values, [4])
+
+        # leading edge only
+        values.clear()
+        self.loop.run_until_complete(signal.connect(callback, debounce=0.02, leading=True,
+                                                    trailing=False))
+        self.loop.run_until_complete(burst())
+        self.loop.run_until_complete(asyncio.sleep(0.03))
+        self.assertEqual(values, [0])
+
+    def test_throttle(self):
+        values = []
+
+        def callback(**kwargs):
+            values.append(kwargs['value'])
+
+        signal = Signal(loop=self.loop, value=None)
+        self.loop.run_until_complete(signal.connect(callback, throttle=0.05))
+
+        async def burst():
+            for value in range(20):
+                await signal.send(value=value)
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.06)
+
+        self.loop.run_until_complete(burst())
+        # the first send right away, then the latest one of every interval
+        self.assertEqual(values[0], 0)
+        self.assertEqual(values[-1], 19)
+        self.assertLess(len(values), 10)
+        self.assertEqual(values, sorted(values))
+
+    def test_throttle_single_timer(self):
+        callbacks = [FunctionMock() for _ in range(1000)]
+
+        signal = Signal(loop=self.loop)
+        for callback in callbacks:
+            self.loop.run_until_complete(signal.connect(callback, throttle=0.01))
+
+        scheduled = len(self.loop._scheduled)
+        self.assertEqual(signal.send_nowait(), 1000)
+        self.loop.run_until_complete(signal.send())
+        self.assertEqual(len(self.loop._scheduled), scheduled + 1)
+
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        for callback in callbacks:
+            self.assertEqual(callback.call_count, 2)
+        self.assertEqual(signal._timers, [])
+
+    def test_rate_reconnect_armed(self):
+        debounced = FunctionMock()
+        throttled = FunctionMock()
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect(debounced, key='a', debounce=0.01))
+        self.loop.run_until_complete(signal.connect(throttled, key='b', throttle=0.01))
+
+        self.assertEqual(signal.send_nowait(key='a'), 1)
+        # reconfigured while its timer is armed
+        self.loop.run_until_complete(signal.connect(debounced, key='a', throttle=0.02))
+
+        async def sends():
+            for _ in range(5):
+                signal.send_nowait(key='b')
+                await asyncio.sleep(0.015)
+            await asyncio.sleep(0.05)
+
+        self.loop.run_until_complete(sends())
+        # the pending event of the reconnected callback is still delivered
+        self.assertEqual(debounced.call_count, 1)
+        self.assertGreaterEqual(throttled.call_count, 5)
+        self.assertEqual(signal._timers, [])
+        self.assertIsNone(signal._timer_handle)
+
+    def test_rate_wrong(self):
+        signal = Signal(loop=self.loop)
+        callback = FunctionMock()
+        self.assertRaises(ValueError, self.loop.run_until_complete,
+                          signal.connect(callback, debounce=1, throttle=1))
+        self.assertRaises(ValueError, self.loop.run_until_complete,
+                          signal.connect(callback, throttle=0))
+
+    def test_coalesce(self):
+        values = []
+
+        def callback(**kwargs):
+            values.append((kwargs['keys'], kwargs['value']))
+
+        signal = Signal(loop=self.loop, value=None)
+        self.loop.run_until_complete(signal.connect(callback, coalesce=True))
+
+        async def burst():
+            for value in range(5):
+                signal.send_nowait(key='a', value=value)
+                signal.send_nowait(key='b', value=value)
+
+        self.loop.run_until_complete(burst())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(values, [({'a'}, 4), ({'b'}, 4)])
+        self.assertEqual(signal._get_receiver(callback, True).coalesced, {})
+
+    def test_coalesce_slow_coroutine(self):
+        values = []
+        running = []
+
+        async def callback(**kwargs):
+            running.append(kwargs['value'])
+            self.assertEqual(len(running), 1)
+            await asyncio.sleep(0.01)
+            values.append(kwargs['value'])
+            running.pop()
+
+        signal = Signal(loop=self.loop, value=None)
+        self.loop.run_until_complete(signal.connect(callback, key='a', coalesce=True))
+
+        async def burst():
+            for value in range(100):
+                await signal.send(key='a', value=value)
+                if value == 0:
+                    await asyncio.sleep(0)
+            await asyncio.sleep(0.05)
+
+        self.loop.run_until_complete(burst())
+        # the first send was running when the others arrived, only the latest one is left
+        self.assertEqual(values, [0, 99])
+        self.assertEqual(len(signal._tasks), 0)
+
+    def test_coalesce_wrong(self):
+        signal = Signal(loop=self.loop)
+        self.assertRaises(ValueError, self.loop.run_until_complete,
+                          signal.connect(FunctionMock(), coalesce=True, debounce=1))
+
+    def test_priority(self):
+        order = []
+
+        def make(name):
+            def callback(**kwargs):
+                order.append(name)
+            return callback
+
+        async def critical(**kwargs):
+            order.append('critical')
+
+        logging = [make('log-{}'.format(i)) for i in range(50)]
+        normal = make('normal')
+
+        signal = Signal(loop=self.loop)
+        for callback in logging:
+            self.loop.run_until_complete(signal.connect(callback, priority=-1))
+        self.loop.run_until_complete(signal.connect(normal))
+        self.loop.run_until_complete(signal.connect(critical, priority=10))
+
+        self.loop.run_until_complete(signal.send())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(order[:2], ['critical', 'normal'])
+        self.assertEqual(len(order), 52)
+
+        # a coroutine below synchronous callbacks still runs after them
+        order.clear()
+        self.loop.run_until_complete(signal.connect(critical, priority=-2))
+        self.loop.run_until_complete(signal.send())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(order[0], 'normal')
+        self.assertEqual(order[-1], 'critical')
+
+        # the order is cached with the resolved callbacks
+        self.assertEqual(signal.cache_info().hits, 0)
+        self.loop.run_until_complete(signal.send())
+        self.assertEqual(signal.cache_info().hits, 1)
+
+    def test_priority_order_precomputed(self):
+        order = []
+
+        def make(name):
+            def callback(**kwargs):
+                order.append(name)
+            return callback
+
+        low, normal, high, topic, many = (make(name) for name in
+                                          ('low', 'normal', 'high', 'topic', 'many'))
+
+        # without a cache every send resolves its callbacks again
+        signal = Signal(loop=self.loop, cache_size=0)
+        self.loop.run_until_complete(signal.connect(low, key='k', priority=-1))
+        self.loop.run_until_complete(signal.connect(normal))
+        self.loop.run_until_complete(signal.connect(high, key='k', priority=5))
+        self.loop.run_until_complete(signal.connect(topic, pattern='k', priority=1))
+        self.loop.run_until_complete(signal.connect_many([(many, None, ['k'])]))
+
+        # the registry is kept in order of priority as it is built
+        self.assertEqual([receiver.priority for receiver in signal._by_keys['k']], [5, 0, -1])
+
+        for _ in range(2):
+            order.clear()
+            self.loop.run_until_complete(signal.send(key='k'))
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.assertEqual(order[:2], ['high', 'topic'])
+            self.assertEqual(sorted(order[2:4]), ['many', 'normal'])
+            self.assertEqual(order[4:], ['low'])
+
+        # changing the priority of a connected callback moves it in the registry
+        self.loop.run_until_complete(signal.connect(low, priority=10))
+        self.loop.run_until_complete(signal.connect(topic, priority=-5))
+        order.clear()
+        self.loop.run_until_complete(signal.send(key='k'))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(order[:2], ['low', 'high'])
+        self.assertEqual(order[-1], 'topic')
+        self.assertEqual(signal.cache_info().hits, 0)
+
+    def test_priority_inline(self):
+        order = []
+
+        def risk_check(**kwargs):
+            order.append('risk')
+            raise RuntimeError()
+
+        def callback(**kwargs):
+            order.append('log')
+
+        errors = []
+        self.loop.set_exception_handler(lambda loop, context: errors.append(context))
+        self.addCleanup(self.loop.set_exception_handler, None)
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect(callback))
+        self.loop.run_until_complete(signal.connect(risk_check, priority=1, inline=True))
+
+        async def send():
+            await signal.send()
+            # already ran, before anything else was scheduled
+            self.assertEqual(order, ['risk'])
+
+        self.loop.run_until_complete(send())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(order, ['risk', 'log'])
+        self.assertIsInstance(errors[0]['exception'], RuntimeError)
+
+        delivery = signal.deliver()
+        self.loop.run_until_complete(delivery.wait())
+        self.assertIsInstance(dict(zip(delivery.callbacks, delivery.results()))[risk_check],
+                              RuntimeError)
+
+        async def coroutine_callback(**kwargs):
+            pass
+
+        self.assertRaises(ValueError, self.loop.run_until_complete,
+                          signal.connect(coroutine_callback, inline=True))
+
+    def test_pattern(self):
+        callback = FunctionMock()
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect(callback, pattern='orders.eu.*'))
+
+        count = self.loop.run_until_complete(signal.send(key='orders.eu.fr'))
+        self.assertEqual(count, 1)
+        self.loop.run_until_complete(asyncio.sleep(0))
+        callback.assert_called_once_with(signal=signal, senders=set(), keys={'orders.eu.fr'})
+
+        self.assertEqual(self.loop.run_until_complete(signal.send(key='orders.us.ny')), 0)
+        self.assertEqual(self.loop.run_until_complete(signal.send(key='orders.eu')), 0)
+        self.assertEqual(self.loop.run_until_complete(signal.send(key='orders.eu.fr.paris')), 0)
+        self.assertEqual(signal.interest(), (True, frozenset()))
+
+    def test_patterns_multi_segment(self):
+        callback = FunctionMock()
+        other = FunctionMock()
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect(callback, patterns=['orders.#', '*.eu.#']))
+        self.loop.run_until_complete(signal.connect(other, key='orders.eu.fr'))
+
+        # a callback matching several patterns and a key is called once
+        self.assertEqual(self.loop.run_until_complete(signal.send(key='orders.eu.fr')), 2)
+        self.assertEqual(self.loop.run_until_complete(signal.send(key='orders')), 1)
+        self.assertEqual(self.loop.run_until_complete(signal.send(key='trades.eu')), 1)
+        self.assertEqual(self.loop.run_until_complete(signal.send(key='trades.us')), 0)
+        self.assertEqual(self.loop.run_until_complete(signal.send(key=42)), 0)
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(callback.call_count, 3)
+
+    def test_disconnect_pattern(self):
+        callback = FunctionMock()
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect(callback, patterns=['a.*', 'b.#']))
+        self.assertEqual(self.loop.run_until_complete(signal.send(key='a.x')), 1)
+
+        self.loop.run_until_complete(signal.disconnect(callback, pattern='a.*'))
+        # the cached plan is not reused
+        self.assertEqual(self.loop.run_until_complete(signal.send(key='a.x')), 0)
+        self.assertEqual(self.loop.run_until_complete(signal.send(key='b.x.y')), 1)
+        self.assertEqual(len(signal._topics), 1)
+
+        self.loop.run_until_complete(signal.disconnect(callback))
+        self.assertEqual(self.loop.run_until_complete(signal.send(key='b.x.y')), 0)
+        self.assertEqual(len(signal._topics), 0)
+        self.assertEqual(signal._receivers, {})
+
+    def test_disconnect_many_pattern(self):
+        callback = FunctionMock()
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect(callback, pattern='orders.*'))
+        self.loop.run_until_complete(signal.disconnect_many([(callback, None, None)]))
+
+        self.assertEqual(self.loop.run_until_complete(signal.send(key='orders.eu')), 0)
+        self.assertEqual(len(signal._topics), 0)
+        self.assertEqual(signal._receivers, {})
+
+    def test_pattern_weak_callback(self):
+        callback = FunctionMock()
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect(callback, pattern='a.#'))
+        del callback
+        gc.collect()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(self.loop.run_until_complete(signal.send(key='a.b')), 0)
+        self.assertEqual(len(signal._topics), 0)
+
+    def test_where(self):
+        callback = FunctionMock()
+        other = FunctionMock()
+
+        signal = Signal(loop=self.loop, symbol=None, qty=0)
+        self.loop.run_until_complete(signal.connect(
+            callback, where={'symbol': {'AAPL', 'MSFT'}, 'qty': ('>', 100)}))
+        self.loop.run_until_complete(signal.connect(other))
+
+        async def send_all():
+            return [await signal.send(symbol='AAPL', qty=200),
+                    await signal.send(symbol='AAPL', qty=50),
+                    await signal.send(symbol='IBM', qty=200),
+                    signal.send_nowait(symbol='MSFT', qty=101),
+                    signal.send_nowait(symbol=['unhashable'], qty=101),
+                    signal.send_nowait(symbol='MSFT', qty=None)]
+
+        self.assertEqual(self.loop.run_until_complete(send_all()), [2, 1, 1, 2, 1, 1])
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(other.call_count, 6)
+        self.assertEqual([call[1]['qty'] for call in callback.call_args_list], [200, 101])
+
+    def test_where_operators(self):
+        values = []
+
+        def callback(**kwargs):
+            values.append(kwargs['qty'])
+
+        signal = Signal(loop=self.loop, qty=0)
+        self.loop.run_until_complete(signal.connect(
+            callback, key='a', where={'qty': ('not in', (3, 4))}))
+        self.loop.run_until_complete(signal.send_many(
+            [{'key': 'a', 'qty': qty} for qty in range(6)] + [{'key': 'b', 'qty': 0}]))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(values, [0, 1, 2, 5])
+
+        # connecting again replaces the conditions
+        self.loop.run_until_complete(signal.connect(callback, key='a', where={'qty': 3}))
+        del values[:]
+        self.loop.run_until_complete(signal.send_many(
+            [{'key': 'a', 'qty': qty} for qty in range(6)]))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(values, [3])
+        self.assertEqual(len(signal._filters), 1)
+
+        self.loop.run_until_complete(signal.disconnect(callback))
+        self.assertEqual(len(signal._filters), 0)
+        self.assertEqual(signal._filters._by_value, {})
+
+    def test_where_partial_disconnect(self):
+        callback = FunctionMock()
+
+        signal = Signal(loop=self.loop, value=None)
+        self.loop.run_until_complete(signal.connect(callback, key='a', where={'value': 1}))
+        self.loop.run_until_complete(signal.disconnect(callback, key='a'))
+        self.assertEqual(len(signal._filters), 0)
+        self.assertEqual(signal._receivers, {})
+
+        self.loop.run_until_complete(signal.connect(callback, keys=['a', 'b'],
+                                                    where={'value': ('>', 1)}))
+        self.loop.run_until_complete(signal.disconnect_many([(callback, None, ['a', 'b'])]))
+        self.assertEqual(len(signal._filters), 0)
+        self.assertEqual(signal._receivers, {})
+
+        self.loop.run_until_complete(signal.connect(callback, key='a', where={'value': 1}))
+        self.loop.run_until_complete(signal.disconnect_many([(callback, None, None)]))
+        self.assertEqual(len(signal._filters), 0)
+
+        self.loop.run_until_complete(signal.connect(callback, key='a', where={'value': 1}))
+        self.assertEqual(len(signal._filters), 1)
+        self.assertEqual(self.loop.run_until_complete(signal.send(key='a', value=1)), 1)
+
+    def test_where_threadsafe(self):
+        values = []
+
+        def callback(**kwargs):
+            values.append(kwargs['value'])
+
+        signal = Signal(loop=self.loop, value=None)
+        self.loop.run_until_complete(signal.connect(callback, where={'value': ('in', [1, 2])}))
+
+        thread = threading.Thread(target=lambda: [signal.send_threadsafe(value=value)
+                                                  for value in range(4)])
+        thread.start()
+        thread.join()
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertEqual(values, [1, 2])
+
+    def test_where_wrong(self):
+        signal = Signal(loop=self.loop, value=None)
+        self.assertRaises(ValueError, self.loop.run_until_complete,
+                          signal.connect(FunctionMock(), where={'other': 1}))
+        self.assertRaises(ValueError, self.loop.run_until_complete,
+                          signal.connect(FunctionMock(), where={'value': ('~', 1)}))
+        self.assertRaises(ValueError, Signal, loop=self.loop, where=None)
+
+    def test_failing_tap(self):
+        callback = FunctionMock()
+        errors = []
+        self.loop.set_exception_handler(lambda loop, context: errors.append(context))
+        self.addCleanup(self.loop.set_exception_handler, None)
+
+        def tap(senders, keys, kwargs):
+            raise RuntimeError()
+
+        tapped = []
+        signal = Signal(loop=self.loop, value=None)
+        signal.add_tap(tap)
+        signal.add_tap(lambda senders, keys, kwargs: tapped.append(kwargs['value']))
+        self.loop.run_until_complete(signal.connect(callback))
+
+        self.assertEqual(self.loop.run_until_complete(signal.send(value=1)), 1)
+        self.loop.run_until_complete(signal.send_many([{'value': 2}]))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(callback.call_count, 2)
+        self.assertEqual(tapped, [1, 2])
+        self.assertEqual(len(errors), 2)
+
+    def test_registry_snapshots(self):
+        callback1 = FunctionMock()
+        callback2 = FunctionMock()
+        key = 'some-key'
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect(callback1, key=key))
+
+        snapshot_all = signal._all
+        snapshot_key = signal._by_keys[key]
+        self.assertIsInstance(snapshot_key, tuple)
+
+        self.loop.run_until_complete(signal.connect(callback2))
+        self.loop.run_until_complete(signal.connect(callback2, key=key))
+        self.loop.run_until_complete(signal.disconnect(callback1, key=key))
+
+        # earlier snapshots are never mutated, new ones replace them
+        self.assertEqual(len(snapshot_all), 0)
+        self.assertEqual(len(snapshot_key), 1)
+        self.assertEqual(len(signal._all), 1)
+        self.assertEqual(len(signal._by_keys[key]), 1)
+        self.assertIsNot(signal._by_keys[key], snapshot_key)
+
+    def test_plan_cache(self):
+        callback1 = FunctionMock()
+        callback2 = FunctionMock()
+        key = 'some-key'
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect(callback1, key=key))
+
+        self.assertEqual(signal.send_nowait(key=key), 1)
+        self.assertEqual(signal.send_nowait(key=key), 1)
+        self.assertEqual(signal.send_nowait(keys=[key]), 1)
+        self.assertEqual(signal.cache_info(), (2, 1, 128, 1))
+
+        # connecting invalidates the cached resolution
+        self.loop.run_until_complete(signal.connect(callback2, key=key))
+        self.assertEqual(signal.send_nowait(key=key), 2)
+        self.assertEqual(signal.cache_info().misses, 2)
+
+        # and so does disconnecting
+        self.loop.run_until_complete(signal.disconnect(callback1))
+        self.assertEqual(signal.send_nowait(key=key), 1)
+        self.assertEqual(signal.send_nowait(key=key), 1)
+        self.assertEqual(signal.cache_info(), (3, 3, 128, 1))
+
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(callback1.call_count, 4)
+        self.assertEqual(callback2.call_count, 3)
+
+        signal.cache_clear()
+        self.assertEqual(signal.cache_info(), (0, 0, 128, 0))
+
+    def test_plan_cache_lru(self):
+        callback = FunctionMock()
+
+        signal = Signal(loop=self.loop, cache_size=2)
+        self.loop.run_until_complete(signal.connect(callback, keys=['a', 'b', 'c']))
+
+        signal.send_nowait(key='a')
+        signal.send_nowait(key='b')
+        signal.send_nowait(key='a')
+        signal.send_nowait(key='c')
+        self.assertEqual(signal.cache_info(), (1, 3, 2, 2))
+
+        # 'b' was the least recently used resolution
+        signal.send_nowait(key='a')
+        signal.send_nowait(key='b')
+        self.assertEqual(signal.cache_info(), (2, 4, 2, 2))
+
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+    def test_plan_cache_disabled(self):
+        callback = FunctionMock()
+
+        signal = Signal(loop=self.loop, cache_size=0)
+        self.loop.run_until_complete(signal.connect(callback))
+
+        signal.send_nowait()
+        signal.send_nowait()
+        self.assertEqual(signal.cache_info(), (0, 2, 0, 0))
+
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(callback.call_count, 2)
+
+    def test_plan_cache_weakref(self):
+        callback = FunctionMock()
+        key = 'some-key'
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect(callback, key=key))
+        self.assertEqual(signal.send_nowait(key=key), 1)
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        # the cache must not keep the callback alive
+        del(callback)
+        gc.collect()
+
+        self.assertEqual(signal.send_nowait(key=key), 0)
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(len(signal._by_keys), 0)
+
+    def test_weakref_pruned_without_send(self):
+        callback1 = FunctionMock()
+        callback2 = FunctionMock()
+        sender = object()
+
+        signal = Signal(loop=self.loop)
+        tasks = [self.loop.create_task(signal.connect(callback1, sender=sender, key='rare')),
+                 self.loop.create_task(signal.connect(callback2))]
+        self.loop.run_until_complete(asyncio.wait(tasks))
+
+        del(callback1)
+        del(callback2)
+        gc.collect()
+
+        # no send is needed, the collection schedules the cleanup
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        self.assertEqual(len(signal._all), 0)
+        self.assertEqual(len(signal._by_keys), 0)
+        self.assertEqual(len(signal._by_senders), 0)
+
+    def test_weakref_churn_memory(self):
+        signal = Signal(loop=self.loop)
+
+        async def churn(count):
+            for i in range(count):
+                def callback(**kwargs):
+                    pass
+
+                await signal.connect(callback, key=i)
+                del(callback)
+
+        self.loop.run_until_complete(churn(1000))
+        gc.collect()
+        objects_before = len(gc.get_objects())
+
+        self.loop.run_until_complete(churn(1000000))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        gc.collect()
+
+        self.assertEqual(len(signal._all), 0)
+        self.assertEqual(len(signal._by_keys), 0)
+        self.assertLess(len(gc.get_objects()) - objects_before, 1000)
+
+    def test_send_nowait(self):
+        callback = FunctionMock()
+        coro_callback = CoroutineMock()
+        key = 'some-key'
+        sender = object()
+
+        signal = Signal(loop=self.loop, arg1=1)
+
+        tasks = [self.loop.create_task(signal.connect(callback, key=key)),
+                 self.loop.create_task(signal.connect(coro_callback, sender=sender))]
+        self.loop.run_until_complete(asyncio.wait(tasks))
+
+        # called from synchronous code, nothing runs until the loop does
+        self.assertEqual(signal.send_nowait(), 0)
+        self.assertEqual(signal.send_nowait(key=key, arg1=2), 1)
+        self.assertEqual(signal.send_nowait(key=key, sender=sender), 2)
+        self.assertFalse(callback.called)
+        self.assertEqual(coro_callback.await_count, 0)
+
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        self.assertEqual(callback.call_count, 2)
+        callback.assert_any_call(signal=signal, senders=set(), keys={key}, arg1=2)
+        coro_callback.assert_called_once_with(signal=signal, senders={sender}, keys={key},
+                                              arg1=1)
+
+    def test_send_nowait_from_loop_callback(self):
+        callback = FunctionMock()
+        results = []
+
+        signal = Signal(loop=self.loop)
+        self.loop.run_until_complete(signal.connect(callback))
+
+        def data_received():
+            results.append(signal.send_nowait())
+
+        self.loop.call_soon(data_received)
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+
+        self.assertEqual(results, [1])
+        self.assertEqual(callback.call_count, 1)
+
+    def test_send_nowait_with_args_wrong(self):
+        signal = Signal(loop=self.loop, arg1=1)
+        self.assertRaises(ValueError, signal.send_nowait, wrong_arg=2)
+
     def test_restricted_keywords(self):
         keywords = ('callback', 'key', 'keys', 'sender', 'senders', 'weak')
 
@@ -0,0 +1,142 @@
+import unittest
+import asyncio
+import os
+import threading
+
+from ..dispatcher import Signal
+from ..executors import ThreadPool, ProcessPool
+
+
+class TestThreadPool(unittest.TestCase):
+
+    def test_pool_info(self):
+        release = threading.Event()
+        pool = ThreadPool(max_workers=1, max_queue=2)
+        self.addCleanup(pool.shutdown)
+
+        first = pool.submit(release.wait)
+        # wait for the worker to pick up the first call
+        while pool.queue_depth:
+            release.wait(0.001)
+        self.assertFalse(pool.full())
+
+        second = pool.submit(lambda: 2)
+        third = pool.submit(lambda: 3)
+        self.assertTrue(pool.full())
+        self.assertEqual(pool.queue_depth, 2)
+
+        release.set()
+        self.assertTrue(first.result(timeout=1))
+        self.assertEqual(second.result(timeout=1), 2)
+        self.assertEqual(third.result(timeout=1), 3)
+
+        info = pool.pool_info()
+        self.assertEqual(info.workers, 1)
+        self.assertEqual(info.submitted, 3)
+        self.assertEqual(info.completed, 3)
+        self.assertEqual(info.queue_depth, 0)
+        self.assertEqual(info.peak_queue_depth, 2)
+        self.assertEqual(info.max_queue, 2)
+        self.assertGreater(info.wait_time, 0)
+        self.assertGreater(info.run_time, 0)
+
+    def test_exception(self):
+        pool = ThreadPool(max_workers=1)
+        self.addCleanup(pool.shutdown)
+
+        def fail():
+            raise RuntimeError()
+
+        self.assertRaises(RuntimeError, pool.submit(fail).result, 1)
+        self.assertEqual(pool.pool_info().completed, 1)
+
+    def test_max_queue_wrong(self):
+        self.assertRaises(ValueError, ThreadPool, max_queue=0)
+
+
+def square(signal, senders, keys, value):
+    if value < 0:
+        raise ValueError(value)
+    return os.getpid(), signal, keys, value * value
+
+
+class TestProcessPool(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def test_signal(self):
+        pool = ProcessPool(max_workers=2, batch_size=10)
+        self.addCleanup(pool.shutdown)
+
+        signal = Signal(loop=self.loop, executor=pool, value=0)
+        self.loop.run_until_complete(signal.connect(square, key='square'))
+
+        deliveries = [signal.deliver(key='square', value=i) for i in range(25)]
+        # filtered out, never shipped to a worker
+        self.assertEqual(len(signal.deliver(key='other', value=1)), 0)
+
+        async def wait():
+            return [(await delivery.wait(timeout=10))[0] for delivery in deliveries]
+
+        results = self.loop.run_until_complete(wait())
+        self.assertEqual([value for _, _, _, value in results], [i * i for i in range(25)])
+        self.assertNotIn(os.getpid(), {pid for pid, _, _, _ in results})
+        self.assertEqual({signal for _, signal, _, _ in results}, {None})
+        self.assertEqual({frozenset(keys) for _, _, keys, _ in results}, {frozenset(['square'])})
+
+        # two full batches and the remainder when the loop ran
+        self.assertEqual(pool.batches, 3)
+        info = pool.pool_info()
+        self.assertEqual(info.submitted, 25)
+        self.assertEqual(info.completed, 25)
+        self.assertEqual(info.queue_depth, 0)
+        self.assertEqual(info.peak_queue_depth, 25)
+
+    def test_exception(self):
+        pool = ProcessPool(max_workers=1)
+        self.addCleanup(pool.shutdown)
+
+        signal = Signal(loop=self.loop, value=0)
+        self.loop.run_until_complete(signal.connect(square, executor=pool))
+
+        failed = signal.deliver(value=-1)
+        succeeded = signal.deliver(value=2)
+        self.loop.run_until_complete(failed.wait(timeout=10))
+        self.loop.run_until_complete(succeeded.wait(timeout=10))
+        self.assertIsInstance(failed.results()[0], ValueError)
+        self.assertEqual(succeeded.results()[0][-1], 4)
+        self.assertEqual(pool.batches, 1)
+
+    def test_unpicklable_kwargs(self):
+        pool = ProcessPool(max_workers=1)
+        self.addCleanup(pool.shutdown)
+
+        signal = Signal(loop=self.loop, value=0)
+        self.loop.run_until_complete(signal.connect(square, executor=pool))
+
+        deliveries = [signal.deliver(value=value) for value in (1, 2, threading.Lock(), 3)]
+        for delivery in deliveries:
+            self.loop.run_until_complete(delivery.wait(timeout=10))
+
+        # only the call that could not be pickled fails, the others are shipped in one batch
+        results = [delivery.results()[0] for delivery in deliveries]
+        self.assertIsInstance(results[2], TypeError)
+        self.assertEqual([result[-1] for result in results[:2] + results[3:]], [1, 4, 9])
+        self.assertEqual(pool.batches, 1)
+
+    def test_not_picklable(self):
+        pool = ProcessPool(max_workers=1)
+        self.addCleanup(pool.shutdown)
+
+        def local(**kwargs):
+            pass
+
+        signal = Signal(loop=self.loop)
+        self.assertRaises(ValueError, self.loop.run_until_complete,
+                          signal.connect(local, executor=pool))
+
+    def test_wrong(self):
+        self.assertRaises(ValueError, ProcessPool, batch_size=0)
+        self.assertRaises(ValueError, ProcessPool, max_queue=0)
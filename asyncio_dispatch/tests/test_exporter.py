@@ -0,0 +1,132 @@
+import unittest
+import asyncio
+import gc
+
+from .helpers import FunctionMock
+from ..dispatcher import Signal
+from ..exporter import SignalRegistry, MetricsServer, render, default_registry
+
+
+class TestSignalRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def test_register(self):
+        registry = SignalRegistry()
+        signal = registry.register('orders', Signal(loop=self.loop))
+        self.assertIs(registry['orders'], signal)
+        self.assertIs(registry.register('orders', signal), signal)
+        self.assertRaises(ValueError, registry.register, 'orders', Signal(loop=self.loop))
+
+        registry.unregister('orders')
+        registry.unregister('orders')
+        self.assertNotIn('orders', registry)
+
+    def test_weak(self):
+        registry = SignalRegistry()
+        registry.register('orders', Signal(loop=self.loop))
+        gc.collect()
+        self.assertEqual(len(registry), 0)
+        self.assertEqual(registry.items(), [])
+
+
+class TestRender(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def test_render(self):
+        callback = FunctionMock()
+        registry = SignalRegistry()
+        signal = registry.register('orders', Signal(loop=self.loop, metrics=True))
+        plain = registry.register('plain "one"\n', Signal(loop=self.loop))
+        self.loop.run_until_complete(signal.connect(callback, key='a'))
+        self.loop.run_until_complete(plain.connect(callback))
+        self.loop.run_until_complete(signal.send(key='a'))
+        self.loop.run_until_complete(signal.send(key='b'))
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        lines = render(registry).splitlines()
+        self.assertIn('# TYPE asyncio_dispatch_sends_total counter', lines)
+        self.assertIn('asyncio_dispatch_sends_total{signal="orders"} 2', lines)
+        self.assertIn('asyncio_dispatch_scheduled_total{signal="orders"} 1', lines)
+        self.assertIn('asyncio_dispatch_registry_size{index="keys",signal="orders"} 1', lines)
+        self.assertIn('asyncio_dispatch_registry_size{index="all",signal="plain \\"one\\"\\n"} 1',
+                      lines)
+        self.assertIn('asyncio_dispatch_fan_out_bucket{le="0",signal="orders"} 1', lines)
+        self.assertIn('asyncio_dispatch_fan_out_bucket{le="+Inf",signal="orders"} 2', lines)
+        self.assertIn('asyncio_dispatch_fan_out_count{signal="orders"} 2', lines)
+        self.assertIn('asyncio_dispatch_latency_seconds_count{kind="sync",signal="orders"} 1',
+                      lines)
+        self.assertIn('asyncio_dispatch_duration_seconds_bucket{kind="coroutine",le="+Inf",'
+                      'signal="orders"} 0', lines)
+        # only signals with metrics report counters
+        self.assertFalse([line for line in lines
+                          if line.startswith('asyncio_dispatch_sends_total{signal="plain')])
+
+    def test_default_registry(self):
+        signal = default_registry.register('test_default_registry', Signal(loop=self.loop))
+        self.addCleanup(default_registry.unregister, 'test_default_registry')
+        self.assertIn('signal="test_default_registry"', render())
+        del signal
+
+
+class TestMetricsServer(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    async def get(self, port, request):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(request)
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.partition(b'\r\n\r\n')
+        return head.split(b'\r\n'), body
+
+    def test_scrape(self):
+        registry = SignalRegistry()
+        signal = registry.register('orders', Signal(loop=self.loop, metrics=True))
+        server = MetricsServer(registry)
+
+        async def scrape():
+            (host, port), = await server.start()
+            await signal.send()
+            try:
+                return [
+                    await self.get(port, b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n'),
+                    await self.get(port, b'HEAD /metrics HTTP/1.1\r\n\r\n'),
+                    await self.get(port, b'GET /other HTTP/1.1\r\n\r\n'),
+                    await self.get(port, b'POST /metrics HTTP/1.1\r\n\r\n'),
+                ]
+            finally:
+                await server.close()
+
+        ok, head, missing, post = self.loop.run_until_complete(scrape())
+        self.assertEqual(ok[0][0], b'HTTP/1.1 200 OK')
+        self.assertIn(b'Content-Type: text/plain; version=0.0.4; charset=utf-8', ok[0])
+        self.assertIn('Content-Length: {}'.format(len(ok[1])).encode('ascii'), ok[0])
+        self.assertIn(b'asyncio_dispatch_sends_total{signal="orders"} 1\n', ok[1])
+        self.assertEqual(head[0][0], b'HTTP/1.1 200 OK')
+        self.assertEqual(head[1], b'')
+        self.assertEqual(missing[0][0], b'HTTP/1.1 404 Not Found')
+        self.assertEqual(post[0][0], b'HTTP/1.1 405 Method Not Allowed')
+        self.assertEqual(server.requests, 4)
+
+    def test_start_twice(self):
+        server = MetricsServer(SignalRegistry())
+
+        async def start_twice():
+            await server.start()
+            try:
+                with self.assertRaises(ValueError):
+                    await server.start()
+            finally:
+                await server.close()
+                await server.close()
+
+        self.loop.run_until_complete(start_twice())
@@ -0,0 +1,68 @@
+import unittest
+
+from ..filters import Filter, FilterIndex
+
+
+class TestFilter(unittest.TestCase):
+
+    def test_conditions(self):
+        filter_ = Filter({'symbol': 'AAPL', 'qty': ('>=', 10), 'side': ('!=', 'sell')})
+        self.assertEqual(filter_.field, 'symbol')
+        self.assertTrue(filter_({'symbol': 'AAPL', 'qty': 10, 'side': 'buy'}))
+        self.assertFalse(filter_({'symbol': 'AAPL', 'qty': 9, 'side': 'buy'}))
+        self.assertFalse(filter_({'symbol': 'AAPL', 'qty': 10, 'side': 'sell'}))
+        self.assertFalse(filter_({'symbol': 'IBM', 'qty': 10, 'side': 'buy'}))
+        self.assertFalse(filter_({'symbol': 'AAPL', 'qty': None, 'side': 'buy'}))
+
+    def test_unhashable_operand(self):
+        filter_ = Filter({'value': ('==', [1, 2])})
+        self.assertIsNone(filter_.field)
+        self.assertTrue(filter_({'value': [1, 2]}))
+        self.assertFalse(filter_({'value': [1]}))
+
+    def test_in_operand(self):
+        filter_ = Filter({'symbol': ('in', ['AAPL', 'MSFT'])})
+        self.assertEqual(filter_.values, frozenset(['AAPL', 'MSFT']))
+        self.assertTrue(filter_({'symbol': 'MSFT'}))
+
+        # a substring of a string operand, a key of a mapping operand
+        filter_ = Filter({'symbol': ('in', 'ABCD'), 'side': ('in', {'buy': 1})})
+        self.assertIsNone(filter_.field)
+        self.assertTrue(filter_({'symbol': 'AB', 'side': 'buy'}))
+        self.assertFalse(filter_({'symbol': 'AC', 'side': 'buy'}))
+        self.assertFalse(filter_({'symbol': 'AB', 'side': 1}))
+
+        index = FilterIndex()
+        index.add('a', filter_)
+        self.assertEqual(index.match({'symbol': 'BCD', 'side': 'buy'}), {'a'})
+
+    def test_unknown_field(self):
+        self.assertRaises(ValueError, Filter, {'other': 1}, {'value': None})
+
+
+class TestFilterIndex(unittest.TestCase):
+
+    def test_match(self):
+        index = FilterIndex()
+        index.add('a', Filter({'symbol': {'AAPL', 'MSFT'}}))
+        index.add('b', Filter({'symbol': 'AAPL', 'qty': ('<', 5)}))
+        index.add('c', Filter({'qty': ('<', 5)}))
+        self.assertEqual(len(index), 3)
+
+        self.assertEqual(index.match({'symbol': 'AAPL', 'qty': 1}), {'a', 'b', 'c'})
+        self.assertEqual(index.match({'symbol': 'AAPL', 'qty': 9}), {'a'})
+        self.assertEqual(index.match({'symbol': 'MSFT', 'qty': 9}), {'a'})
+        self.assertEqual(index.match({'symbol': 'IBM', 'qty': 1}), {'c'})
+        self.assertEqual(index.match({'symbol': {}, 'qty': 9}), set())
+
+    def test_replace_discard(self):
+        index = FilterIndex()
+        index.add('a', Filter({'symbol': 'AAPL'}))
+        index.add('a', Filter({'symbol': 'IBM'}))
+        self.assertEqual(index.match({'symbol': 'AAPL'}), set())
+        self.assertEqual(index.match({'symbol': 'IBM'}), {'a'})
+
+        index.discard('a')
+        index.discard('a')
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index._by_value, {})
@@ -0,0 +1,122 @@
+import unittest
+import asyncio
+import gc
+import time
+import concurrent.futures
+
+from .helpers import FunctionMock
+from ..dispatcher import Signal
+from ..metrics import Histogram
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_observe(self):
+        histogram = Histogram((1, 2, 4))
+        for value in (0, 1, 2, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.sum, 16)
+        self.assertEqual(histogram.cumulative(),
+                         [(1, 2), (2, 3), (4, 4), (float('inf'), 5)])
+        self.assertEqual(histogram.quantile(0.5), 2)
+        self.assertEqual(histogram.quantile(1), float('inf'))
+        self.assertIsNone(Histogram((1,)).quantile(0.5))
+
+
+class TestSignalMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def test_disabled(self):
+        self.assertIsNone(Signal(loop=self.loop).metrics)
+
+    def test_sends(self):
+        callbacks = [FunctionMock() for _ in range(3)]
+
+        signal = Signal(loop=self.loop, metrics=True)
+        for callback in callbacks:
+            self.loop.run_until_complete(signal.connect(callback, key='a'))
+        self.loop.run_until_complete(signal.connect(callbacks[0], sender=self))
+
+        async def send_all():
+            await signal.send(key='a')
+            signal.send_nowait(key='b')
+            await signal.send_many([{'key': 'a'}, {'sender': self}])
+            await asyncio.sleep(0)
+
+        self.loop.run_until_complete(send_all())
+        metrics = signal.metrics
+        self.assertEqual(metrics.sends, 4)
+        self.assertEqual(metrics.scheduled, 7)
+        self.assertEqual(metrics.fan_out.counts[:5], [1, 1, 0, 2, 0])
+        self.assertGreater(metrics.send_rate(), 0)
+        self.assertEqual(metrics.send_rate(), 0)
+        self.assertEqual(metrics.registry_sizes(), {
+            'receivers': 3, 'all': 0, 'senders': 1, 'keys': 1, 'patterns': 0})
+
+        self.assertEqual(metrics.latency['sync'].count, 7)
+        self.assertEqual(metrics.duration['sync'].count, 7)
+        self.assertEqual(metrics.latency['coroutine'].count, 0)
+
+    def test_timing(self):
+        async def coroutine_callback(**kwargs):
+            await asyncio.sleep(0.02)
+
+        def blocking_callback(**kwargs):
+            time.sleep(0.02)
+
+        executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.addCleanup(executor.shutdown)
+        signal = Signal(loop=self.loop, metrics=True)
+        self.loop.run_until_complete(signal.connect(coroutine_callback))
+        self.loop.run_until_complete(signal.connect(blocking_callback, executor=executor))
+
+        delivery = signal.deliver()
+        self.loop.run_until_complete(delivery.wait())
+
+        metrics = signal.metrics
+        for kind in ('coroutine', 'executor'):
+            self.assertEqual(metrics.latency[kind].count, 1)
+            self.assertEqual(metrics.duration[kind].count, 1)
+            self.assertGreaterEqual(metrics.duration[kind].sum, 0.015)
+        self.assertEqual(metrics.snapshot()['sends'], 1)
+
+    def test_sample(self):
+        callbacks = [FunctionMock() for _ in range(8)]
+
+        signal = Signal(loop=self.loop, metrics=4)
+        for callback in callbacks:
+            self.loop.run_until_complete(signal.connect(callback))
+        self.loop.run_until_complete(signal.send())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(signal.metrics.scheduled, 8)
+        self.assertEqual(signal.metrics.duration['sync'].count, 2)
+        self.assertRaises(ValueError, Signal, loop=self.loop, metrics=-1)
+
+    def test_pruned(self):
+        callback = FunctionMock()
+
+        signal = Signal(loop=self.loop, metrics=True)
+        self.loop.run_until_complete(signal.connect(callback))
+        del callback
+        gc.collect()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(signal.metrics.pruned, 1)
+        self.assertEqual(signal.metrics.registry_sizes()['receivers'], 0)
+
+    def test_exception(self):
+        def failing(**kwargs):
+            raise RuntimeError()
+
+        errors = []
+        self.loop.set_exception_handler(lambda loop, context: errors.append(context))
+        signal = Signal(loop=self.loop, metrics=True)
+        self.loop.run_until_complete(signal.connect(failing))
+        self.loop.run_until_complete(signal.send())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(signal.metrics.duration['sync'].count, 1)
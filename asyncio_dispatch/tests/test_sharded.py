@@ -0,0 +1,127 @@
+import unittest
+import asyncio
+import threading
+
+from ..sharded import ShardedSignal
+
+
+class Recorder:
+    def __init__(self):
+        self.values = []
+        self.threads = set()
+
+    def __call__(self, signal, senders, keys, value):
+        self.values.append(value)
+        self.threads.add(threading.current_thread())
+
+
+class TestShardedSignal(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def wait_for(self, condition):
+        async def wait():
+            while not condition():
+                await asyncio.sleep(0.001)
+        self.loop.run_until_complete(asyncio.wait_for(wait(), 5))
+
+    def test_send(self):
+        signal = ShardedSignal(shards=3, value=None)
+        self.addCleanup(signal.close)
+        recorders = [Recorder() for _ in range(6)]
+
+        for shard, recorder in enumerate(recorders):
+            self.loop.run_until_complete(signal.connect(recorder, shard=shard % 3))
+
+        async def send():
+            for value in range(1000):
+                await signal.send(value=value)
+
+        self.loop.run_until_complete(send())
+        self.wait_for(lambda: all(len(recorder.values) == 1000 for recorder in recorders))
+
+        threads = set()
+        for recorder in recorders:
+            # every callback runs on the loop of its shard and sees the events in order
+            self.assertEqual(recorder.values, list(range(1000)))
+            self.assertEqual(len(recorder.threads), 1)
+            threads |= recorder.threads
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_filters_and_disconnect(self):
+        signal = ShardedSignal(shards=2, value=None)
+        self.addCleanup(signal.close)
+        keyed = Recorder()
+        everything = Recorder()
+
+        self.loop.run_until_complete(signal.connect(keyed, key='key', weak=False))
+        self.loop.run_until_complete(signal.connect(everything, weak=False))
+
+        signal.send_threadsafe(key='key', value=1)
+        signal.send_threadsafe(key='other', value=2)
+        # the callbacks may run on different shards
+        self.wait_for(lambda: len(everything.values) == 2 and keyed.values)
+        self.assertEqual(keyed.values, [1])
+
+        self.loop.run_until_complete(signal.disconnect(keyed, key='key', weak=False))
+        signal.send_threadsafe(key='key', value=3)
+        self.wait_for(lambda: len(everything.values) == 3)
+        self.assertEqual(keyed.values, [1])
+
+    def test_shard_of(self):
+        signal = ShardedSignal(shards=4)
+        self.addCleanup(signal.close)
+        recorder = Recorder()
+
+        self.assertEqual(len(signal), 4)
+        self.assertEqual(signal.shard_of(recorder), signal.shard_of(recorder))
+        self.loop.run_until_complete(signal.connect(recorder))
+        shard = signal.signals[signal.shard_of(recorder)]
+        self.assertEqual(len(shard._receivers), 1)
+
+    def test_shard_of_spreads(self):
+        for shards in (2, 4, 8, 16):
+            signal = ShardedSignal(shards=shards)
+            self.addCleanup(signal.close)
+
+            def make():
+                def callback(**kwargs):
+                    pass
+                return callback
+
+            callbacks = [make() for _ in range(200)]
+            used = {signal.shard_of(callback) for callback in callbacks}
+            self.assertGreater(len(used), shards // 2)
+
+            self.loop.run_until_complete(asyncio.wait(
+                [self.loop.create_task(signal.connect(callback)) for callback in callbacks]))
+            self.assertGreater(len([shard for shard in signal.signals if shard._receivers]), 1)
+
+    def test_connect_options(self):
+        values = []
+
+        def callback(signal, senders, keys, value):
+            values.append(value)
+
+        signal = ShardedSignal(shards=2, value=None)
+        self.addCleanup(signal.close)
+        self.loop.run_until_complete(signal.connect(callback, pattern='orders.*',
+                                                    where={'value': ('>', 1)}))
+        for value in range(4):
+            signal.send_threadsafe(key='orders.eu', value=value)
+        signal.send_threadsafe(key='trades.eu', value=5)
+        self.wait_for(lambda: len(values) == 2)
+        self.assertEqual(values, [2, 3])
+
+        self.loop.run_until_complete(signal.disconnect(callback, pattern='orders.*'))
+        self.assertEqual(sum(len(shard._receivers) for shard in signal.signals), 0)
+
+    def test_wrong(self):
+        self.assertRaises(ValueError, ShardedSignal, shards=0)
+
+        signal = ShardedSignal(shards=1)
+        self.addCleanup(signal.close)
+        self.assertRaises(ValueError, signal.send_threadsafe, value=1)
@@ -0,0 +1,144 @@
+import unittest
+import asyncio
+
+from .helpers import FunctionMock
+from .. import shm
+from ..dispatcher import Signal
+from ..shm import RingPublisher, RingSubscriber
+
+
+class TestRing(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.signal = Signal(loop=self.loop, value=None)
+
+    def run_until(self, condition):
+        async def wait():
+            while not condition():
+                await asyncio.sleep(0.001)
+        self.loop.run_until_complete(asyncio.wait_for(wait(), 5))
+
+    def make_publisher(self, **kwargs):
+        publisher = RingPublisher(self.signal, **kwargs)
+        self.addCleanup(publisher.close)
+        return publisher
+
+    def make_subscriber(self, publisher, consumer, **kwargs):
+        signal = Signal(loop=self.loop, value=None)
+        subscriber = RingSubscriber(signal, publisher.name, consumer, **kwargs)
+        self.addCleanup(subscriber.close)
+        return signal, subscriber
+
+    def test_fan_out(self):
+        publisher = self.make_publisher(size=4096)
+        subscribers = [self.make_subscriber(publisher, consumer, poll_interval=10)
+                       for consumer in range(3)]
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        received = []
+        for signal, subscriber in subscribers:
+            values = []
+            received.append(values)
+            self.loop.run_until_complete(signal.connect(
+                lambda values=values, **kwargs: values.append(kwargs['value']), weak=False))
+        keyed = FunctionMock()
+        self.loop.run_until_complete(subscribers[0][0].connect(keyed, key='x'))
+
+        # more data than the ring holds, all of it is read as it wraps around
+        async def send():
+            for value in range(500):
+                await self.signal.send(value=value)
+                if value % 50 == 0:
+                    await asyncio.sleep(0.001)
+            await self.signal.send(key='x', value=500)
+
+        self.loop.run_until_complete(send())
+        self.run_until(lambda: all(len(values) == 501 for values in received))
+
+        for values in received:
+            self.assertEqual(values, list(range(501)))
+        _, kwargs = keyed.call_args
+        self.assertEqual((kwargs['keys'], kwargs['value']), ({'x'}, 500))
+        self.assertEqual(publisher.lags(), {0: 0, 1: 0, 2: 0})
+        self.assertEqual([subscriber.overruns for _, subscriber in subscribers], [0, 0, 0])
+
+    def test_unpublishable(self):
+        errors = []
+        self.loop.set_exception_handler(lambda loop, context: errors.append(context))
+        publisher = self.make_publisher(size=256)
+        signal, subscriber = self.make_subscriber(publisher, 0, poll_interval=10)
+        remote = []
+        self.loop.run_until_complete(signal.connect(
+            lambda **kwargs: remote.append(kwargs['value']), weak=False))
+        local = FunctionMock()
+        self.loop.run_until_complete(self.signal.connect(local))
+
+        async def send():
+            await self.signal.send(value=lambda: None)
+            await self.signal.send(value='x' * 1024)
+            await self.signal.send(value=3)
+
+        self.loop.run_until_complete(send())
+        self.run_until(lambda: remote == [3])
+        self.assertEqual(local.call_count, 3)
+        self.assertEqual(publisher.dropped, 2)
+        self.assertEqual(len(errors), 2)
+
+    def test_lag_and_overrun(self):
+        publisher = self.make_publisher(size=1024)
+        signal, subscriber = self.make_subscriber(publisher, 0, poll_interval=10)
+        callback = FunctionMock()
+        self.loop.run_until_complete(signal.connect(callback))
+
+        # publishing without running the loop, so the subscriber can not keep up
+        for value in range(5):
+            publisher.publish(set(), {'value': value})
+        self.assertEqual(publisher.lags(), {0: 5})
+        self.assertEqual(subscriber.lag, 5)
+        self.assertEqual(subscriber.read(), 5)
+        self.assertEqual(publisher.lags(), {0: 0})
+
+        for value in range(100):
+            publisher.publish(set(), {'value': value})
+        self.assertEqual(subscriber.read(), 0)
+        self.assertEqual(subscriber.overruns, 1)
+        self.assertEqual(subscriber.lag, 0)
+
+        publisher.publish(set(), {'value': 100})
+        self.assertEqual(subscriber.read(), 1)
+
+    def test_overrun_while_writing(self):
+        publisher = self.make_publisher(size=1024)
+        signal, subscriber = self.make_subscriber(publisher, 0, poll_interval=10)
+        callback = FunctionMock()
+        self.loop.run_until_complete(signal.connect(callback))
+
+        # almost a full lap ahead of the subscriber, which is at the start of the ring
+        publisher.publish(set(), {'value': 0})
+        size = publisher._write_pos
+        while publisher._write_pos + size <= 1024:
+            publisher.publish(set(), {'value': 0})
+
+        # the next record wraps and is being written over the first one
+        ring = publisher._ring
+        offset = publisher._write_pos % 1024
+        ring.put(shm._WRITE_END, publisher._write_pos + size + (1024 - offset) % 1024)
+        ring.buf[ring.data:ring.data + 8] = b'\x01' * 8
+
+        self.assertEqual(subscriber.read(), 0)
+        self.assertEqual(subscriber.overruns, 1)
+        callback.assert_not_called()
+
+        publisher.publish(set(), {'value': 1})
+        self.assertEqual(subscriber.read(), 1)
+
+    def test_wrong(self):
+        self.assertRaises(ValueError, RingPublisher, self.signal, size=100)
+        publisher = self.make_publisher(size=64, max_consumers=1)
+        self.make_subscriber(publisher, 0)
+
+        self.assertRaises(ValueError, self.make_subscriber, publisher, 0)
+        self.assertRaises(ValueError, self.make_subscriber, publisher, 1)
+        self.assertRaises(ValueError, publisher.publish, set(), {'value': 'x' * 100})
@@ -0,0 +1,69 @@
+import unittest
+
+from ..topics import TopicTrie
+
+
+class TestTopicTrie(unittest.TestCase):
+
+    def test_exact(self):
+        trie = TopicTrie()
+        trie.add('orders.eu.fr', 'a')
+        self.assertEqual(trie.match('orders.eu.fr'), ['a'])
+        self.assertEqual(trie.match('orders.eu'), [])
+        self.assertEqual(trie.match('orders.eu.fr.paris'), [])
+
+    def test_one_segment(self):
+        trie = TopicTrie()
+        trie.add('orders.*.fr', 'a')
+        trie.add('*', 'b')
+        self.assertEqual(trie.match('orders.eu.fr'), ['a'])
+        self.assertEqual(trie.match('orders.us.fr'), ['a'])
+        self.assertEqual(trie.match('orders.fr'), [])
+        self.assertEqual(trie.match('orders'), ['b'])
+
+    def test_many_segments(self):
+        trie = TopicTrie()
+        trie.add('orders.#', 'a')
+        trie.add('#.fr', 'b')
+        trie.add('#', 'c')
+        self.assertEqual(sorted(trie.match('orders')), ['a', 'c'])
+        self.assertEqual(sorted(trie.match('orders.eu.fr')), ['a', 'b', 'c'])
+        self.assertEqual(sorted(trie.match('fr')), ['b', 'c'])
+        self.assertEqual(trie.match('trades.eu'), ['c'])
+
+    def test_repeated_many_segments(self):
+        trie = TopicTrie()
+        trie.add('#.#.x', 'a')
+        self.assertEqual(trie.match('a.b.c.x'), ['a'])
+        self.assertEqual(trie.match('x'), ['a'])
+
+    def test_key(self):
+        trie = TopicTrie(key=len)
+        trie.add('a.#', 'ccc')
+        trie.add('a.#', 'a')
+        trie.add('a.#', 'bb')
+        trie.add('a.#', 'b')
+        trie.add('a.*', 'dd')
+        self.assertEqual(sorted(trie.match_groups('a.x')), [['a', 'b', 'bb', 'ccc'], ['dd']])
+
+        trie.discard('a.#', 'bb')
+        self.assertEqual(trie.match_groups('a'), [['a', 'b', 'ccc']])
+
+    def test_discard(self):
+        trie = TopicTrie()
+        trie.add('a.*.c', 'x')
+        trie.add('a.*.c', 'y')
+        trie.add('a.*.c', 'y')
+        self.assertEqual(len(trie), 2)
+
+        trie.discard('a.*.c', 'x')
+        trie.discard('a.*.c', 'x')
+        trie.discard('a.b', 'y')
+        self.assertEqual(len(trie), 1)
+        self.assertEqual(trie.match('a.b.c'), ['y'])
+
+        trie.discard('a.*.c', 'y')
+        self.assertEqual(len(trie), 0)
+        self.assertEqual(trie.match('a.b.c'), [])
+        # empty nodes are removed
+        self.assertEqual(trie._root.children, {})
@@ -0,0 +1,130 @@
+'''
+Hierarchical topics for :class:`asyncio_dispatch.Signal`
+
+A topic is a string of segments separated by dots, such as ``'orders.eu.fr'``. A pattern is a
+topic in which a segment may be a wildcard: ``*`` matches exactly one segment and ``#`` matches
+any number of segments, including none. ``'orders.*.fr'`` matches ``'orders.eu.fr'``,
+``'orders.#'`` matches ``'orders'``, ``'orders.eu'`` and ``'orders.eu.fr'``.
+'''
+
+
+class _Node:
+    __slots__ = ('children', 'receivers', 'ordered')
+
+    def __init__(self):
+        self.children = {}
+        self.receivers = set()
+        # the receivers in the order of the key of the trie
+        self.ordered = []
+
+
+class TopicTrie:
+    '''
+    An index of patterns by segment. Matching a topic visits one node per segment for every
+    pattern prefix that can still match, so its cost depends on the depth of the topic and the
+    wildcards on the way, not on the number of patterns.
+    '''
+
+    def __init__(self, key=None):
+        '''
+        :param key: a function of a receiver. The receivers of a pattern are kept in ascending
+            order of it, and in the order they were added if ``None`` or equal.
+        '''
+        self._root = _Node()
+        self._size = 0
+        self._key = key
+
+    def __len__(self):
+        '''
+        The number of (pattern, receiver) subscriptions in the trie
+        '''
+        return self._size
+
+    def add(self, pattern, receiver):
+        '''
+        Subscribes ``receiver`` to ``pattern``.
+        '''
+        node = self._root
+        for segment in pattern.split('.'):
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[segment] = _Node()
+            node = child
+        if receiver not in node.receivers:
+            node.receivers.add(receiver)
+            ordered = node.ordered
+            index = len(ordered)
+            if index and self._key is not None:
+                rank = self._key(receiver)
+                while index and self._key(ordered[index - 1]) > rank:
+                    index -= 1
+            ordered.insert(index, receiver)
+            self._size += 1
+
+    def discard(self, pattern, receiver):
+        '''
+        Unsubscribes ``receiver`` from ``pattern`` and removes the nodes left empty.
+        '''
+        path = [self._root]
+        for segment in pattern.split('.'):
+            node = path[-1].children.get(segment)
+            if node is None:
+                return
+            path.append(node)
+
+        node = path[-1]
+        if receiver not in node.receivers:
+            return
+        node.receivers.discard(receiver)
+        node.ordered.remove(receiver)
+        self._size -= 1
+
+        segments = pattern.split('.')
+        for depth in range(len(segments), 0, -1):
+            node = path[depth]
+            if node.receivers or node.children:
+                break
+            del path[depth - 1].children[segments[depth - 1]]
+
+    def match(self, topic):
+        '''
+        :Returns: a list of the receivers subscribed to a pattern that matches ``topic``. A
+            receiver subscribed to several matching patterns is listed once per pattern.
+        '''
+        return [receiver for receivers in self.match_groups(topic) for receiver in receivers]
+
+    def match_groups(self, topic):
+        '''
+        :Returns: a list of the receivers of each pattern that matches ``topic``, every one a
+            list ordered by the ``key`` of the trie that must not be modified
+        '''
+        segments = topic.split('.')
+        depth = len(segments)
+        found = []
+        stack = [(self._root, 0)]
+        seen = set()
+
+        while stack:
+            node, index = stack.pop()
+
+            many = node.children.get('#')
+            if many is not None:
+                # '#' swallows any number of the remaining segments
+                for rest in range(index, depth + 1):
+                    if (id(many), rest) not in seen:
+                        seen.add((id(many), rest))
+                        stack.append((many, rest))
+
+            if index == depth:
+                if node.ordered:
+                    found.append(node.ordered)
+                continue
+
+            child = node.children.get(segments[index])
+            if child is not None:
+                stack.append((child, index + 1))
+            one = node.children.get('*')
+            if one is not None:
+                stack.append((one, index + 1))
+
+        return found
@@ -0,0 +1,65 @@
+'''
+Mass subscription with :meth:`asyncio_dispatch.Signal.connect_many` compared to calling
+:meth:`asyncio_dispatch.Signal.connect` in a loop.
+
+Each simulated client session subscribes one callback to ``--keys`` keys. Half of the keys are
+shared by every session, the other half are private to the session.
+
+Run with::
+
+    python -m benchmarks.bench_connect_many
+'''
+import argparse
+import asyncio
+import time
+
+from asyncio_dispatch import Signal
+
+
+class Session:
+    def on_event(self, **kwargs):
+        pass
+
+
+def session_keys(session_id, count):
+    shared = ['shared-{}'.format(i) for i in range(count // 2)]
+    private = ['session-{}-{}'.format(session_id, i) for i in range(count - len(shared))]
+    return shared + private
+
+
+async def looped(signal, sessions, count):
+    for session_id, session in enumerate(sessions):
+        for key in session_keys(session_id, count):
+            await signal.connect(session.on_event, key=key)
+
+
+async def bulk(signal, sessions, count):
+    for session_id, session in enumerate(sessions):
+        await signal.connect_many([(session.on_event, None, session_keys(session_id, count))])
+
+
+def run(name, loop, fn, sessions, count):
+    signal = Signal(loop=loop)
+    start = time.perf_counter()
+    loop.run_until_complete(fn(signal, sessions, count))
+    elapsed = time.perf_counter() - start
+    print('{:<10} {:>8.3f} s {:>8.2f} us/subscription {:>8d} keys'.format(
+        name, elapsed, elapsed / (len(sessions) * count) * 1e6, len(signal._by_keys)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sessions', type=int, default=50)
+    parser.add_argument('--keys', type=int, default=2000)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    sessions = [Session() for _ in range(args.sessions)]
+
+    run('connect', loop, looped, sessions, args.keys)
+    run('bulk', loop, bulk, sessions, args.keys)
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+'''
+Overhead of collecting dispatch metrics, see :mod:`asyncio_dispatch.metrics`.
+
+Sends ``--events`` events to ``--receivers`` synchronous and as many coroutine callbacks, with
+``metrics=False``, with ``metrics=True``, which times every callback, and with
+``metrics=--sample``, which times one callback out of ``--sample``. Reports the best time per
+send, until every callback has run, of ``--repeat`` interleaved runs.
+
+Run with::
+
+    python -m benchmarks.bench_metrics
+'''
+import argparse
+import asyncio
+import functools
+import time
+
+from asyncio_dispatch import Signal
+
+
+def receiver(**kwargs):
+    pass
+
+
+async def coroutine_receiver(**kwargs):
+    pass
+
+
+async def send_events(signal, events, batch):
+    for index in range(events):
+        signal.send_nowait(key='key', value=index)
+        if index % batch == 0:
+            # let the loop run the callbacks so the backlog stays bounded
+            await asyncio.sleep(0)
+    while signal._tasks:
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+def run(name, metrics, callbacks, events, batch):
+    loop = asyncio.new_event_loop()
+    signal = Signal(loop=loop, metrics=metrics, value=None)
+    for callback in callbacks:
+        loop.run_until_complete(signal.connect(callback, key='key'))
+
+    start = time.perf_counter()
+    loop.run_until_complete(send_events(signal, events, batch))
+    elapsed = time.perf_counter() - start
+    loop.close()
+
+    print('{:<10} {:>8.2f} us/send'.format(name, elapsed / events * 1e6))
+    if metrics is True:
+        for kind in ('sync', 'coroutine'):
+            print('{:<10} {:>8d} calls, p50 latency <= {} s, p99 latency <= {} s'.format(
+                kind, signal.metrics.latency[kind].count,
+                signal.metrics.latency[kind].quantile(0.5),
+                signal.metrics.latency[kind].quantile(0.99)))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--receivers', type=int, default=10)
+    parser.add_argument('--batch', type=int, default=10)
+    parser.add_argument('--sample', type=int, default=16)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # keep strong references, the signals only hold weak ones
+    callbacks = [functools.partial(receiver) for _ in range(args.receivers)]
+    callbacks += [functools.partial(coroutine_receiver) for _ in range(args.receivers)]
+
+    # the modes take turns so they see the same noise
+    results = {}
+    for _ in range(args.repeat):
+        for name, metrics in (('off', False), ('on', True), ('sampled', args.sample)):
+            elapsed = run(name, metrics, callbacks, args.events, args.batch)
+            results[name] = min(results.get(name, elapsed), elapsed)
+    for name in ('on', 'sampled'):
+        print('{:<10} {:>8.1f} % overhead'.format(name, (results[name] / results['off'] - 1) * 100))
+
+if __name__ == '__main__':
+    main()
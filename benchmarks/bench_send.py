@@ -0,0 +1,242 @@
+'''
+Per-send cost of :meth:`asyncio_dispatch.Signal.send`.
+
+Compares the native ``async def`` dispatch core against a faithful reconstruction of the
+previous ``@asyncio.coroutine`` / ``yield from`` implementation. For each variant the
+benchmark reports the wall time, the number of Python frames entered, how many of those frames
+belong to generator or coroutine objects, and the number of memory blocks allocated per ``send``.
+
+Run with::
+
+    python -m benchmarks.bench_send
+'''
+import argparse
+import asyncio
+import functools
+import inspect
+import sys
+import time
+import tracemalloc
+import types
+import weakref
+
+from asyncio_dispatch import Signal
+
+
+class _ContextManager:
+    # what ``with (yield from lock)`` used to return
+    def __init__(self, lock):
+        self._lock = lock
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        try:
+            self._lock.release()
+        finally:
+            self._lock = None
+
+
+@types.coroutine
+def _locked(lock):
+    # equivalent of the removed ``asyncio.Lock.__iter__``
+    yield from lock.acquire()
+    return _ContextManager(lock)
+
+
+class LegacySignal:
+    '''
+    The generator based send path as it existed before the native coroutine rewrite.
+    ``asyncio.coroutine`` wrapped generator functions with :func:`types.coroutine`, which is
+    what is used here so the benchmark still runs on interpreters where the decorator is gone.
+    '''
+
+    def __init__(self, loop, **kwargs):
+        self._loop = loop
+        self._default_kwargs = kwargs
+        self._by_senders = {}
+        self._by_keys = {}
+        self._all = set()
+        self._locks_senders = {}
+        self._locks_keys = {}
+        self._lock_all = asyncio.Lock()
+        self._lock_by_senders = asyncio.Lock()
+        self._lock_by_keys = asyncio.Lock()
+
+    @types.coroutine
+    def connect(self, callback, key=None):
+        weak_callback = yield from self._get_ref(callback)
+        if key is None:
+            with (yield from _locked(self._lock_all)):
+                self._all.add(weak_callback)
+        else:
+            if key not in self._by_keys:
+                self._by_keys[key] = set()
+            self._by_keys[key].add(weak_callback)
+
+    @types.coroutine
+    def send(self, key=None, **kwargs):
+        default_kwargs = self._default_kwargs.copy()
+        for keyword in kwargs:
+            if keyword not in default_kwargs:
+                raise ValueError('You can not add new kwargs to an existing signal.')
+        default_kwargs.update(kwargs)
+
+        senders = set()
+        keys = set()
+        if key is not None:
+            keys.add(key)
+
+        live_callbacks = set()
+        with (yield from _locked(self._lock_all)):
+            all_callbacks = yield from self._get_callbacks(self._all)
+        live_callbacks = live_callbacks | all_callbacks
+
+        key_callbacks = set()
+        for key in keys:
+            if key in self._by_keys:
+                key_lock = self._get_lock(self._locks_keys, key)
+                with (yield from _locked(key_lock)):
+                    new_key_callbacks = yield from self._get_callbacks(self._by_keys[key])
+                    key_callbacks = key_callbacks | new_key_callbacks
+        live_callbacks = live_callbacks | key_callbacks
+
+        for callback in live_callbacks:
+            yield from self._call_callback(callback, senders, keys, **default_kwargs)
+        return len(live_callbacks)
+
+    @types.coroutine
+    def _call_callback(self, callback, senders, keys, **kwargs):
+        fn = functools.partial(callback, signal=self, senders=senders, keys=keys, **kwargs)
+        if asyncio.iscoroutinefunction(callback):
+            self._loop.create_task(fn())
+        else:
+            self._loop.call_soon_threadsafe(fn)
+        yield from ()
+
+    @staticmethod
+    @types.coroutine
+    def _get_callbacks(collection):
+        live_callbacks = set()
+        for ref in collection:
+            callback = ref() if isinstance(ref, weakref.ref) else ref
+            if callback:
+                live_callbacks.add(callback)
+        yield from ()
+        return live_callbacks
+
+    @staticmethod
+    @types.coroutine
+    def _get_ref(callback):
+        yield from ()
+        return weakref.ref(callback)
+
+    @staticmethod
+    def _get_lock(map_, key):
+        if key not in map_:
+            map_[key] = asyncio.Lock()
+        return map_[key]
+
+
+def drive(coro):
+    '''
+    Run a coroutine that never suspends to completion without involving the event loop.
+    '''
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError('coroutine suspended')
+
+
+_SUSPENDABLE = inspect.CO_GENERATOR | inspect.CO_COROUTINE | inspect.CO_ITERABLE_COROUTINE
+
+
+def count_frames(fn):
+    frames = 0
+    suspendable = 0
+
+    def profiler(frame, event, arg):
+        nonlocal frames, suspendable
+        if event == 'call':
+            frames += 1
+            if frame.f_code.co_flags & _SUSPENDABLE:
+                suspendable += 1
+
+    sys.setprofile(profiler)
+    try:
+        fn()
+    finally:
+        sys.setprofile(None)
+    return frames, suspendable
+
+
+def count_allocations(fn, iterations):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for _ in range(iterations):
+            fn()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    return sum(stat.count_diff for stat in stats if stat.count_diff > 0) / iterations
+
+
+def run(name, signal, loop, iterations):
+    def send():
+        drive(signal.send(key='key', payload=1))
+
+    # warm up and make sure the ready queue does not grow unbounded while measuring
+    send()
+    loop.run_until_complete(asyncio.sleep(0))
+
+    frames, suspendable = count_frames(send)
+    loop.run_until_complete(asyncio.sleep(0))
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        send()
+    elapsed = time.perf_counter() - start
+    loop.run_until_complete(asyncio.sleep(0))
+
+    # allocations are measured without draining so the scheduled handles are counted too
+    blocks = count_allocations(send, min(iterations, 1000))
+    loop.run_until_complete(asyncio.sleep(0))
+
+    print('{:<8} {:>8.2f} us/send {:>4d} frames/send ({:>2d} generator/coroutine)'
+          ' {:>6.1f} blocks/send'.format(
+              name, elapsed / iterations * 1e6, frames, suspendable, blocks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--receivers', type=int, default=4)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    def receiver(**kwargs):
+        pass
+
+    # keep strong references, the signals only hold weak ones
+    receivers = [functools.partial(receiver) for _ in range(args.receivers)]
+
+    legacy = LegacySignal(loop, payload=None)
+    native = Signal(loop=loop, payload=None)
+    for i, callback in enumerate(receivers):
+        key = 'key' if i % 2 else None
+        drive(legacy.connect(callback, key=key))
+        drive(native.connect(callback, key=key))
+
+    run('legacy', legacy, loop, args.iterations)
+    run('native', native, loop, args.iterations)
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
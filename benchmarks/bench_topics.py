@@ -0,0 +1,122 @@
+'''
+Resolving wildcard topic subscriptions with the trie of :mod:`asyncio_dispatch.topics` compared
+to testing every pattern.
+
+``--subscriptions`` patterns are spread over ``--callbacks`` callbacks. Most patterns name a
+single topic such as ``orders.eu.17.fr``, one in ten ends with ``*`` and one in a hundred with
+``#``. The plan cache is disabled so every send resolves its callbacks.
+
+Run with::
+
+    python -m benchmarks.bench_topics
+'''
+import argparse
+import asyncio
+import functools
+import random
+import time
+
+from asyncio_dispatch import Signal
+
+
+REGIONS = ['eu', 'us', 'apac', 'latam']
+COUNTRIES = ['fr', 'de', 'uk', 'ny', 'ca', 'jp', 'br', 'mx']
+
+
+def receiver(**kwargs):
+    pass
+
+
+def make_pattern(index):
+    segments = ['orders', REGIONS[index % len(REGIONS)], str(index // 100),
+                COUNTRIES[index % len(COUNTRIES)]]
+    if index % 100 == 0:
+        segments[2:] = ['#']
+    elif index % 10 == 0:
+        segments[3] = '*'
+    return '.'.join(segments)
+
+
+def make_topics(count, subscriptions):
+    rng = random.Random(0)
+    return ['orders.{}.{}.{}'.format(rng.choice(REGIONS), rng.randrange(subscriptions // 100),
+                                     rng.choice(COUNTRIES))
+            for _ in range(count)]
+
+
+def segments_match(pattern, topic):
+    if not pattern:
+        return not topic
+    if pattern[0] == '#':
+        return any(segments_match(pattern[1:], topic[rest:]) for rest in range(len(topic) + 1))
+    if not topic:
+        return False
+    return pattern[0] in ('*', topic[0]) and segments_match(pattern[1:], topic[1:])
+
+
+def linear(subscriptions, topics):
+    # every pattern is tested against every topic
+    split = [(pattern.split('.'), callback) for pattern, callback in subscriptions]
+    start = time.perf_counter()
+    total = 0
+    for topic in topics:
+        segments = topic.split('.')
+        total += len({callback for pattern, callback in split
+                      if segments_match(pattern, segments)})
+    return time.perf_counter() - start, total
+
+
+def trie(loop, subscriptions, topics):
+    signal = Signal(loop=loop, cache_size=0)
+    by_callback = {}
+    for pattern, callback in subscriptions:
+        by_callback.setdefault(callback, []).append(pattern)
+
+    start = time.perf_counter()
+    for callback, patterns in by_callback.items():
+        loop.run_until_complete(signal.connect(callback, patterns=patterns))
+    print('{:<8} {:>8.3f} s to connect {:>8d} subscriptions'.format(
+        'trie', time.perf_counter() - start, len(signal._topics)))
+
+    async def send_all():
+        total = 0
+        for topic in topics:
+            total += await signal.send(key=topic)
+        return total
+
+    start = time.perf_counter()
+    total = loop.run_until_complete(send_all())
+    elapsed = time.perf_counter() - start
+    loop.run_until_complete(asyncio.sleep(0))
+    return elapsed, total
+
+
+def report(name, elapsed, total, events):
+    print('{:<8} {:>8.2f} us/send {:>8.2f} callbacks/send'.format(
+        name, elapsed / events * 1e6, total / events))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--subscriptions', type=int, default=1000000)
+    parser.add_argument('--callbacks', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--linear-events', type=int, default=3)
+    args = parser.parse_args()
+
+    # keep strong references, the signal only holds weak ones
+    callbacks = [functools.partial(receiver) for _ in range(args.callbacks)]
+    subscriptions = [(make_pattern(index), callbacks[index % len(callbacks)])
+                     for index in range(args.subscriptions)]
+    topics = make_topics(args.events, args.subscriptions)
+
+    loop = asyncio.new_event_loop()
+    report('trie', *trie(loop, subscriptions, topics), args.events)
+    loop.close()
+
+    events = min(args.linear_events, args.events)
+    report('linear', *linear(subscriptions, topics[:events]), events)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+'''
+Self-pipe writes caused by sending a signal with a large fan-out of synchronous callbacks.
+
+Every :meth:`asyncio.AbstractEventLoop.call_soon_threadsafe` writes a byte to the self-pipe of
+the loop, one ``send(2)`` system call, to wake it up. The benchmark counts those writes for
+
+* ``legacy``: one ``call_soon_threadsafe`` per callback, as the generator based
+  implementation did,
+* ``batched``: one ``call_soon_threadsafe`` per send for all of its callbacks,
+* ``native``: the current dispatcher, which uses ``call_soon`` when it runs on the loop,
+* ``threads``: :meth:`asyncio_dispatch.Signal.send_threadsafe` called from another thread,
+  which wakes the loop at most once per loop iteration.
+
+Run with::
+
+    python -m benchmarks.bench_wakeups
+'''
+import argparse
+import asyncio
+import functools
+import threading
+import time
+
+from asyncio_dispatch import Signal, dispatcher
+
+from .bench_send import LegacySignal
+
+
+def receiver(**kwargs):
+    pass
+
+
+def count_writes(loop):
+    writes = [0]
+    write_to_self = loop._write_to_self
+
+    def counting_write_to_self():
+        writes[0] += 1
+        write_to_self()
+
+    loop._write_to_self = counting_write_to_self
+    return writes
+
+
+async def send_events(signal, events):
+    for _ in range(events):
+        await signal.send(key='key')
+
+
+async def send_from_thread(signal, events):
+    def produce():
+        for _ in range(events):
+            signal.send_threadsafe(key='key')
+
+    thread = threading.Thread(target=produce)
+    thread.start()
+    while thread.is_alive():
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+def always_threadsafe(loop, callback, *args):
+    return loop.call_soon_threadsafe(callback, *args)
+
+
+def run(name, make_signal, send, receivers, events):
+    loop = asyncio.new_event_loop()
+    signal = make_signal(loop)
+    for callback in receivers:
+        loop.run_until_complete(signal.connect(callback, key='key'))
+
+    writes = count_writes(loop)
+    start = time.perf_counter()
+    loop.run_until_complete(send(signal, events))
+    loop.run_until_complete(asyncio.sleep(0))
+    elapsed = time.perf_counter() - start
+    loop.close()
+
+    print('{:<8} {:>10d} writes {:>10.3f} writes/send {:>8.2f} us/send'.format(
+        name, writes[0], writes[0] / events, elapsed / events * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--receivers', type=int, default=100)
+    args = parser.parse_args()
+
+    # keep strong references, the signals only hold weak ones
+    receivers = [functools.partial(receiver) for _ in range(args.receivers)]
+
+    run('legacy', LegacySignal, send_events, receivers, args.events)
+
+    call_soon = dispatcher._call_soon
+    dispatcher._call_soon = always_threadsafe
+    try:
+        run('batched', lambda loop: Signal(loop=loop), send_events, receivers, args.events)
+    finally:
+        dispatcher._call_soon = call_soon
+
+    run('native', lambda loop: Signal(loop=loop), send_events, receivers, args.events)
+    run('threads', lambda loop: Signal(loop=loop), send_from_thread, receivers, args.events)
+
+
+if __name__ == '__main__':
+    main()
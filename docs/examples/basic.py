@@ -2,8 +2,7 @@ import asyncio
 from asyncio_dispatch import Signal
 
 
-@asyncio.coroutine
-def callback(**kwargs):
+async def callback(**kwargs):
     print('callback was called!')
 
 
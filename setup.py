@@ -15,15 +15,21 @@ setup(
     # Metadata
     author="Mike Lenzen",
     author_email="lenzenmi@gmail.com",
-    description="asyncio_dispatch is a is a signal dispatcher for the asyncio event loop found in Python versions 3.4 and up.",
+    description="asyncio_dispatch is a is a signal dispatcher for the asyncio event loop found in Python versions 3.8 and up.",
     long_description=long_description,
     keywords="asyncio_dispatch asyncio dispatch signal event",
     url="https://github.com/lenzenmi/asyncio_dispatch/",
+    python_requires='>=3.8',
     classifiers=[
                  'License :: OSI Approved :: MIT License',
                  'Intended Audience :: Developers',
-                 'Programming Language :: Python :: 3.4',
-                 'Programming Language :: Python :: 3.5',
+                 'Programming Language :: Python :: 3',
+                 'Programming Language :: Python :: 3 :: Only',
+                 'Programming Language :: Python :: 3.8',
+                 'Programming Language :: Python :: 3.9',
+                 'Programming Language :: Python :: 3.10',
+                 'Programming Language :: Python :: 3.11',
+                 'Programming Language :: Python :: 3.12',
                  'Topic :: Software Development :: Libraries',
                  'Development Status :: 4 - Beta'
                  ]